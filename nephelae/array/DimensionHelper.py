@@ -224,6 +224,25 @@ class DimensionHelper:
         return tuple(res)
 
 
+    def to_unit_array(self, indexes):
+        """Vectorized conversion of (possibly fractional) indexes to units.
+
+        Parameters
+        ----------
+        indexes : numpy.array (N x D)
+            N sets of indexes in the D dimensions of self.
+
+        Returns
+        -------
+        numpy.array (N x D)
+        """
+        indexes = np.asarray(indexes, dtype=float).reshape(-1, len(self.dims))
+        res = np.empty(indexes.shape)
+        for d, dim in enumerate(self.dims):
+            res[:,d] = dim.toUnit(indexes[:,d])
+        return res
+
+
     def to_index(self, keys):
         
         if len(keys) != len(self.dims):
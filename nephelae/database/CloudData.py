@@ -2,12 +2,142 @@ import numpy as np
 from scipy import ndimage
 
 from nephelae.types import Bounds
+
+class CloudField:
+
+    """
+    CloudField
+
+    Labeled cloud elements of a ScaledArray. The array is thresholded and
+    labeled only once, and all per-cloud information is derived from this
+    single labeling :
+        - the slice of the array containing each cloud (find_objects),
+        - the labels touching the horizontal borders of the array (one set
+          operation on the array faces),
+        - the features of all the clouds (com, surface, bounding box...),
+          computed in a single pass on first request.
+
+    CloudData objects created by a CloudField are lightweight views on it, so
+    extracting all the clouds of an array is O(N_pixels) instead of
+    O(n_clouds x N_pixels).
+
+    Attributes
+    ----------
+    scArr : ScaledArray
+        Array the clouds were extracted from.
+
+    threshold : float
+        Values above threshold are part of a cloud.
+
+    connectivity : int
+        Pixels are connected if they are at most connectivity dimensions
+        apart (1 connects faces only, data.ndim also connects edges and
+        corners).
+
+    dataLabeled : numpy.array (int)
+        Labels of the clouds (0 is the background).
+
+    nbClouds : int
+        Number of labels.
+
+    objects : list(tuple(slice,...))
+        Slice of the array containing each cloud (index label - 1).
+
+    borderLabels : numpy.array (int)
+        Labels of the clouds touching the border of the array along the
+        first two (horizontal) dimensions.
+
+    Methods
+    -------
+    get_features() -> numpy.array:
+        Features of all clouds (see compute_label_features).
+
+    get_clouds(excludeBorders=True) -> list(CloudData):
+        CloudData views of the clouds.
+
+    label_at(coords) -> int:
+        Label at array indexes coords (0 if not in a cloud).
+
+    cloud_at(coords) -> CloudData or None:
+        Cloud containing array indexes coords.
+    """
+
+    def __init__(self, scArr, threshold=2e-4, connectivity=1):
+        self.scArr     = scArr
+        self.threshold = threshold
+        self.connectivity = connectivity
+        data_thresholded = (scArr.data > threshold) * scArr.data
+        self.dataLabeled, self.nbClouds = ndimage.label(data_thresholded,
+            ndimage.generate_binary_structure(scArr.data.ndim, connectivity))
+        self.objects = ndimage.find_objects(self.dataLabeled, self.nbClouds)
+
+        faces = []
+        for axis in range(min(2, self.dataLabeled.ndim)):
+            faces.append(np.take(self.dataLabeled, 0, axis=axis).ravel())
+            faces.append(np.take(self.dataLabeled, -1, axis=axis).ravel())
+        self.borderLabels = np.setdiff1d(np.concatenate(faces), [0])
+
+        self.features = None
+
+
+    def get_features(self):
+        if self.features is None:
+            # Imported here : nephelae.database must not depend on
+            # nephelae.mapping at import time.
+            from nephelae.mapping.MacroscopicFunctions import \
+                compute_label_features
+            self.features = compute_label_features(self.scArr.data,
+                self.dataLabeled, self.nbClouds, self.scArr.dimHelper,
+                self.objects)
+        return self.features
+
+
+    def touches_border(self, index):
+        return index in self.borderLabels
+
+
+    def get_cloud(self, index):
+        return CloudData(self.scArr, self.dataLabeled, index,
+                         self.objects[index - 1], self)
+
+
+    def get_clouds(self, excludeBorders=True):
+        indexes = np.arange(1, self.nbClouds + 1)
+        if excludeBorders:
+            indexes = np.setdiff1d(indexes, self.borderLabels)
+        return [self.get_cloud(int(i)) for i in indexes]
+
+
+    def label_at(self, coords):
+        return int(self.dataLabeled[tuple(coords)])
+
+
+    def cloud_at(self, coords):
+        index = self.label_at(coords)
+        if index == 0:
+            return None
+        return self.get_cloud(index)
+
+
 class CloudData:
-    
-    def __init__(self, scArr, dataLabeled, index):
+
+    """
+    CloudData
+
+    Single cloud element of a labeled ScaledArray. If created from a
+    CloudField (see CloudData.from_scaledArray), the cloud only holds its
+    label and slice in the field, and com, surface and bounding box are
+    read from the features computed once for all the clouds of the field.
+    Locations are computed only in the slice containing the cloud.
+    """
+
+    def __init__(self, scArr, dataLabeled, index, objectSlice=None,
+                 field=None):
         self.__scArr = scArr
         self.__dataLabeled = dataLabeled
         self.__index = index
+        self.__objectSlice = objectSlice
+        self.__field = field
 
         self.__locations = None
         self.__com = None
@@ -19,7 +149,7 @@ class CloudData:
         if self.__com is None:
             self.__compute_com()
         return self.__com
-    
+
     def get_surface(self):
         if self.__surface is None:
             self.__compute_surface()
@@ -35,23 +165,34 @@ class CloudData:
             self.__compute_bounding_box()
         return self.__boundingBox
 
+    def get_index(self):
+        return self.__index
+
+    def get_slice(self):
+        return self.__objectSlice
+
+    def get_field(self):
+        return self.__field
+
     def is_in_bounding_box(self, coords):
         return all(self.get_bounding_box()[i].isinside(coords[i]) for i in
                 range(len(coords)))
 
     @classmethod
-    def from_scaledArray(cls, scArr, threshold=2e-4):
-        data_thresholded = (scArr.data > threshold) * scArr.data
-        dataLabeled, number_of_elements = \
-        ndimage.measurements.label(data_thresholded)
-        return [CloudData(scArr, dataLabeled, i)
-                for i in range(1, number_of_elements+1)
-                if not i in dataLabeled[0, :]
-                and not i in dataLabeled[-1, :]
-                and not i in dataLabeled[:, 0]
-                and not i in dataLabeled[:, -1]]
+    def from_scaledArray(cls, scArr, threshold=2e-4, connectivity=1):
+        return CloudField(scArr, threshold, connectivity).get_clouds(
+            excludeBorders=True)
+
+    def __features(self):
+        if self.__field is None:
+            return None
+        return self.__field.get_features()[self.__index - 1]
 
     def __compute_com(self):
+        features = self.__features()
+        if features is not None:
+            self.__com = tuple(features['com'].tolist())
+            return
         indices = tuple(np.array(self.get_locations()[i]) for i in
                 range(self.get_locations().shape[0]))
         data = self.__scArr.data[indices].ravel()
@@ -59,16 +200,31 @@ class CloudData:
             np.sum(self.get_locations()*data, axis=1)/np.sum(data)))
 
     def __compute_locations(self):
-        out = np.where(self.__dataLabeled == self.__index)
-        self.__locations = np.array([X for X in out])
+        if self.__objectSlice is None:
+            out = np.where(self.__dataLabeled == self.__index)
+            self.__locations = np.array([X for X in out])
+            return
+        # Searching only in the slice containing the cloud
+        out = np.where(self.__dataLabeled[self.__objectSlice] == self.__index)
+        self.__locations = np.array([X + s.start for X, s in
+            zip(out, self.__objectSlice)])
 
     def __compute_bounding_box(self):
-        mins = self.__scArr.dimHelper.to_unit(np.amin(self.get_locations(),
-            axis=1).tolist())
-        maxs = self.__scArr.dimHelper.to_unit(np.amax(self.get_locations(),
-            axis=1).tolist())
+        features = self.__features()
+        if features is not None:
+            mins = features['boxMin'].tolist()
+            maxs = features['boxMax'].tolist()
+        else:
+            mins = self.__scArr.dimHelper.to_unit(np.amin(self.get_locations(),
+                axis=1).tolist())
+            maxs = self.__scArr.dimHelper.to_unit(np.amax(self.get_locations(),
+                axis=1).tolist())
         self.__boundingBox = [Bounds(mins[i], maxs[i]) for i in range(len(mins))]
 
 
     def __compute_surface(self):
+        features = self.__features()
+        if features is not None:
+            self.__surface = int(features['volume'])
+            return
         self.__surface = self.get_locations().shape[1]
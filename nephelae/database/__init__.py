@@ -5,3 +5,4 @@ from .SpatializedDatabase import SpatializedDatabase
 from .NephelaeDataServer  import NephelaeDataServer
 from .NephelaeDataServer  import DatabasePlayer
 from .CloudData           import CloudData
+from .CloudData           import CloudField
@@ -1,35 +1,51 @@
-from scipy import ndimage
 import numpy as np
 
 from nephelae.array import ScaledArray
 
 from .FactoryBorder import FactoryBorder
-from .MacroscopicFunctions import compute_cross_section_border, threshold_array
+from .MacroscopicFunctions import compute_border_masks, compute_contours
 
 class BorderIncertitude(FactoryBorder):
-    def __init__(self, name, valueMap, stdMap):
+
+    """
+    BorderIncertitude
+
+    Inner and outer borders of the elements of a map, given the map
+    uncertainty : inner border of (value - factor*std > threshold) and outer
+    border of (value + factor*std > threshold). Both borders (and the raw
+    border, see self.all_borders) are computed in a single pass (see
+    compute_border_masks). If contours is True, borders are given as
+    contour polylines instead of boolean raster masks (see
+    compute_contours).
+    """
+
+    def __init__(self, name, valueMap, stdMap, factor=1, contours=False):
         super().__init__(name, threshold=valueMap.threshold)
         self.valueMap = valueMap
-        self.stdMap = stdMap
+        self.stdMap   = stdMap
+        self.factor   = factor
+        self.contours = contours
 
     def at_locations(self, arrays):
-        typ = np.int32
-        inner, outer = compute_cross_section_border(arrays[0],
-                arrays[1], factor=1, threshold=self.threshold)
-        thresholded_inner = threshold_array(inner, threshold=self.threshold)
-        thresholded_outer = threshold_array(outer, threshold=self.threshold)
-        eroded_inner = ndimage.binary_erosion(thresholded_inner).astype(typ)
-        eroded_outer = ndimage.binary_erosion(thresholded_outer).astype(typ)
-        border_inner = np.bitwise_xor(thresholded_inner, eroded_inner)
-        border_outer = np.bitwise_xor(thresholded_outer, eroded_outer)
-        inner_scarray = ScaledArray(border_inner, arrays[0].dimHelper,
-                arrays[0].interpolation)
-        outer_scarray = ScaledArray(border_outer, arrays[0].dimHelper,
-                arrays[0].interpolation)
-        return (inner_scarray, outer_scarray)
+        value, std = arrays[0].data, arrays[1].data
+        if self.contours:
+            return tuple(compute_contours(data, self.threshold,
+                         arrays[0].dimHelper) for data in
+                         (value - self.factor*std, value + self.factor*std))
+        borders = compute_border_masks(value, std, self.threshold, self.factor)
+        return tuple(ScaledArray(border, arrays[0].dimHelper,
+                     arrays[0].interpolation) for border in borders[0::2])
+
+    def all_borders(self, keys):
+        """Inner, raw and outer borders computed in the same pass."""
+        arrays = self.get_arrays(keys)
+        return tuple(ScaledArray(border, arrays[0].dimHelper,
+                     arrays[0].interpolation) for border in
+                     compute_border_masks(arrays[0].data, arrays[1].data,
+                                          self.threshold, self.factor))
 
     def resolution(self):
         return self.valueMap.resolution()
 
     def get_arrays(self, keys):
-        return (self.valueMap.__getitem__(keys), self.stdMap.__getitem__(keys))
+        return self.value_and_std(self.valueMap, self.stdMap, keys)
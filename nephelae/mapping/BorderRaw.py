@@ -1,22 +1,31 @@
-from scipy import ndimage
 import numpy as np
 
 from nephelae.array import ScaledArray
 
 from .FactoryBorder import FactoryBorder
-from .MacroscopicFunctions import threshold_array
+from .MacroscopicFunctions import compute_border_masks, compute_contours
 
 class BorderRaw(FactoryBorder):
-    def __init__(self, name, mapInterface):
+
+    """
+    BorderRaw
+
+    Border of the elements of a map (pixels above threshold with at least
+    one neighbour below threshold), as a boolean raster mask, or as contour
+    polylines (see compute_contours) if contours is True.
+    """
+
+    def __init__(self, name, mapInterface, contours=False):
         super().__init__(name, threshold=mapInterface.threshold)
         self.mapInterface = mapInterface
+        self.contours     = contours
 
     def at_locations(self, arrays):
-        raw_data = arrays.data
-        border = threshold_array(raw_data, threshold=self.threshold).astype(
-                np.int32)
-        eroded = ndimage.binary_erosion(border).astype(border.dtype)
-        border_raw = np.bitwise_xor(border, eroded)
+        if self.contours:
+            return compute_contours(arrays.data, self.threshold,
+                                    arrays.dimHelper)
+        border_raw = compute_border_masks(arrays.data,
+                                          threshold=self.threshold)
         raw_scarray = ScaledArray(border_raw, arrays.dimHelper,
                 arrays.interpolation)
         return raw_scarray
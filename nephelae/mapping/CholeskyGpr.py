@@ -0,0 +1,266 @@
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve, solve_triangular, LinAlgError
+
+
+class CholeskyGpr:
+
+    """
+    CholeskyGpr
+
+    Lean Gaussian Process Regression engine working directly on the Cholesky
+    factorization of the training covariance matrix. Replaces
+    sklearn.gaussian_process.GaussianProcessRegressor in GprPredictor (no
+    input validation, no kernel cloning, and non-zero process mean support).
+
+    The training covariance is factorized once in self.fit. The factorization
+    is then reused by all subsequent calls to self.predict (for example
+    predictions by blocks, or for several map requests), and mean and
+    variance are computed in a single pass from the same cross-covariance
+    matrix.
+
+    Multi-output processes (vector fields such as (UT,VT) wind) are handled
+    natively. If the kernel defines kernel.correlation, the covariance of
+    output channel c is written :
+        variance[c]*(C + noiseVariance[c]/variance[c]*I)
+    with C the correlation matrix shared by all channels. Channels with the
+    same noise to variance ratio share a single factorization and are
+    solved together (one multi right-hand side solve). The predicted mean
+    does not depend on the channel variance and the predictive variance of
+    each channel is a scaling of the one of its factorization group. (With
+    scalar kernel parameters, all channels share a single factorization).
+
+    Attributes
+    ----------
+    kernel : nephelae.mapping.NephKernel (or derived)
+        Kernel of the process. If the kernel does not define
+        kernel.correlation, kernel(X) must include the noise variance on its
+        diagonal, and kernel.diag(X) must return the prior variance of a
+        (noisy) sample.
+
+    mean : float or numpy.array (M)
+        Mean of the process. Taken from kernel.mean (if defined) on each
+        call to self.fit.
+
+    trainLocations : numpy.array (N x D)
+        Locations of the training samples of the last fit.
+
+    trainValues : numpy.array (N x M)
+        Values of the training samples of the last fit.
+
+    factors : list((factor, numpy.array, float or None),...)
+        Cholesky factorizations (as returned by scipy.linalg.cho_factor), the
+        output channels sharing each of them, and their noise to variance
+        ratio (None if the kernel has no correlation method).
+
+    factor : (numpy.array (N x N), bool)
+        First factorization of self.factors (the only one for single output
+        or scalar kernel parameters).
+
+    channelVariances : numpy.array (M) or None
+        Prior variance of each output channel (None if the kernel has no
+        correlation method).
+
+    alpha : numpy.array (N x M)
+        K^-1 (trainValues - mean), K being the training covariance (in
+        correlation form, K is the correlation plus the noise ratio).
+
+    varianceBlockSize : int
+        Number of locations processed at once when computing the predictive
+        variance (see self.predict_variance).
+
+    Methods
+    -------
+    fit(trainLocations, trainValues) -> self:
+        Factorizes the training covariance.
+
+    predict(locations, return_std=False) -> numpy.array or tuple:
+        Predicted mean (and std) at locations.
+
+    predict_variance(locations, Ks) -> numpy.array:
+        Diagonal of the predictive covariance at locations.
+    """
+
+    def __init__(self, kernel):
+        self.kernel         = kernel
+        self.mean           = getattr(kernel, 'mean', 0.0)
+        self.trainLocations = None
+        self.trainValues    = None
+        self.factors        = []
+        self.factor         = None
+        self.channelVariances = None
+        self.alpha          = None
+        self.varianceBlockSize = 1024
+
+
+    def fit(self, trainLocations, trainValues):
+
+        """Factorizes the training covariance matrix.
+
+        Parameters
+        ----------
+        trainLocations : numpy.array (N x D)
+            Locations of the training samples.
+
+        trainValues : numpy.array (N x M) or (N)
+            Values of the training samples.
+        """
+        self.mean           = getattr(self.kernel, 'mean', 0.0)
+        self.trainLocations = trainLocations
+        self.trainValues    = trainValues
+        centered = np.asarray(trainValues - self.mean, dtype=float)
+
+        if not hasattr(self.kernel, 'correlation'):
+            self.channelVariances = None
+            self.factors = [(CholeskyGpr.factorize(
+                self.kernel(trainLocations)), slice(None), None)]
+            self.factor  = self.factors[0][0]
+            self.alpha   = cho_solve(self.factor, centered, check_finite=False)
+            return self
+
+        values = centered.reshape(centered.shape[0], -1)
+        variances, noiseVariances = \
+            self.kernel.channel_parameters(values.shape[1])
+        ratios = noiseVariances / variances
+        groups = [(ratio, np.where(ratios == ratio)[0])
+                  for ratio in np.unique(ratios)]
+
+        C = self.kernel.correlation(trainLocations)
+        alpha = np.empty(values.shape)
+        self.factors = []
+        for index, (ratio, channels) in enumerate(groups):
+            # Correlation matrix is overwritten by the last factorization.
+            K = C if index == len(groups) - 1 else C.copy()
+            K[np.diag_indices_from(K)] += ratio
+            factor = CholeskyGpr.factorize(K)
+            alpha[:, channels] = cho_solve(factor, values[:, channels],
+                                           check_finite=False)
+            self.factors.append((factor, channels, ratio))
+        self.factor = self.factors[0][0]
+        self.channelVariances = np.array(variances)
+        self.alpha = alpha.reshape(centered.shape)
+        return self
+
+
+    def factorize(K):
+        """Lower Cholesky factorization of K (overwritten)."""
+        try:
+            return cho_factor(K, lower=True, overwrite_a=False,
+                              check_finite=False)
+        except LinAlgError:
+            # Numerically non positive definite covariance. Retrying with a
+            # small jitter on the diagonal.
+            K[np.diag_indices_from(K)] += 1.0e-10*np.mean(np.diag(K))
+            return cho_factor(K, lower=True, overwrite_a=True,
+                              check_finite=False)
+
+
+    def cross_covariance(self, locations):
+        """Covariance (or correlation if the kernel defines it) between
+        locations and the training locations."""
+        if self.channelVariances is None:
+            return self.kernel(locations, self.trainLocations)
+        return self.kernel.correlation(locations, self.trainLocations)
+
+
+    def predict(self, locations, return_std=False):
+
+        """Predicted mean (and std) at locations.
+
+        Parameters
+        ----------
+        locations : numpy.array (P x D)
+            Prediction locations.
+
+        return_std : bool
+            If True, also returns the predicted standard deviation.
+
+        Returns
+        -------
+        numpy.array (P x M) or (numpy.array (P x M), numpy.array (P or P x M))
+            Predicted mean, and predicted std if return_std is True. The std
+            is a (P x M) array only if output channels have different
+            variances.
+        """
+        Ks = self.cross_covariance(locations)
+        mean = self.mean + Ks @ self.alpha
+        if not return_std:
+            return mean
+
+        # Ks is not needed after this and is overwritten.
+        variance = self.predict_variance(locations, Ks, overwriteKs=True)
+        return mean, np.sqrt(variance, out=variance)
+
+
+    def predict_variance(self, locations, Ks=None, overwriteKs=False):
+
+        """Computes only the diagonal of the predictive covariance.
+
+        The variance at location i is :
+            kernel.diag(x_i) - |L^-1 Ks[i,:]^T|^2
+        with L the lower Cholesky factor of the training covariance. The
+        triangular solves are done by blocks of self.varianceBlockSize
+        locations and the squared norms are accumulated immediately, so the
+        full P x P predictive covariance is never formed. With overwriteKs
+        the solves are done in place in Ks (no memory allocation apart from
+        the output).
+
+        In correlation form, the variance is computed once per factorization
+        group and scaled by the variance of each channel of the group.
+
+        Parameters
+        ----------
+        locations : numpy.array (P x D)
+            Prediction locations.
+
+        Ks : numpy.array (P x N) or None
+            Cross-covariance between locations and training locations (as
+            given by self.cross_covariance). Computed if None.
+
+        overwriteKs : bool
+            If True, Ks content is destroyed.
+
+        Returns
+        -------
+        numpy.array (P) or (P x M)
+            Predictive variance at locations (clipped to be non-negative).
+            (P x M) if output channels have different variances.
+        """
+        if Ks is None:
+            Ks = self.cross_covariance(locations)
+            overwriteKs = True
+
+        if self.channelVariances is None:
+            prior = np.asarray(self.kernel.diag(locations), dtype=float).copy()
+            return self.solve_variance(self.factor, Ks, prior, overwriteKs)
+
+        variances = self.channelVariances
+        if len(self.factors) == 1 and np.all(variances == variances[0]):
+            ratio = self.factors[0][2]
+            unit = self.solve_variance(self.factor, Ks,
+                np.full(Ks.shape[0], 1.0 + ratio), overwriteKs)
+            unit *= variances[0]
+            return unit
+
+        res = np.empty((Ks.shape[0], len(variances)))
+        for index, (factor, channels, ratio) in enumerate(self.factors):
+            unit = self.solve_variance(factor, Ks,
+                np.full(Ks.shape[0], 1.0 + ratio),
+                overwriteKs and index == len(self.factors) - 1)
+            res[:, channels] = unit[:, np.newaxis] * variances[channels]
+        return res
+
+
+    def solve_variance(self, factor, Ks, prior, overwriteKs):
+        """prior - |L^-1 Ks^T|^2 by blocks of locations (prior is
+        overwritten with the result)."""
+        # Ks.T is Fortran-contiguous if Ks is C-contiguous. Column blocks of
+        # Ks.T are then contiguous and can be solved in place by LAPACK.
+        KsT = Ks.T
+        for start in range(0, KsT.shape[1], self.varianceBlockSize):
+            block = KsT[:, start:start + self.varianceBlockSize]
+            V = solve_triangular(factor[0], block, lower=True,
+                                 overwrite_b=overwriteKs, check_finite=False)
+            prior[start:start + self.varianceBlockSize] -= \
+                np.einsum('ij,ij->j', V, V)
+        np.maximum(prior, 0.0, out=prior)
+        return prior
@@ -0,0 +1,331 @@
+import threading
+import numpy as np
+from scipy import ndimage
+from scipy.optimize import linear_sum_assignment
+
+from .MacroscopicFunctions import threshold_array, compute_label_features
+
+
+class CloudTracker:
+
+    """
+    CloudTracker
+
+    Incremental tracking of cloud elements across successive map frames
+    (for example horizontal slices of a ValueMap requested at mission rate).
+
+    Each new frame is labeled once and the features of all its clouds are
+    computed in a single pass (see compute_label_features). The clouds of the
+    new frame are then associated to the open tracks by solving an
+    assignment problem (scipy.optimize.linear_sum_assignment) on one of the
+    following costs :
+        - 'distance' : distance between the center of mass of the cloud and
+          the last center of mass of the track advected by the wind
+          (self.windMap.get_wind()) over the elapsed time.
+        - 'overlap' : number of common pixels between the cloud and the
+          clouds of the previous frame shifted by the wind displacement
+          (frames must be on the same grid).
+    Clouds not associated to an open track start a new track. Tracks not
+    associated for more than maxMissedFrames frames are closed.
+
+    Splits and merges are detected from the pairs (track, cloud) which
+    satisfy the association criterion (distance below maxDistance or large
+    enough overlap) but were not assigned to each other. A new track close
+    to an associated track is a split of it ('splitFrom'). A track not
+    associated but close to a cloud of the frame merged into the track of
+    this cloud ('mergedInto'), and is closed.
+
+    Apart from the labeling of the frame, the association only depends on
+    the number of clouds, so the tracker can be fed continuously in
+    streaming mode. Closed tracks are kept in self.tracks (the oldest are
+    dropped if maxClosedTracks is set).
+
+    Attributes
+    ----------
+    windMap : WindMapConstant (or derived) or None
+        Gives the advection wind (wind is zero if None).
+
+    threshold : float
+        Values above threshold are part of a cloud.
+
+    mode : str ('distance' or 'overlap')
+        Association cost.
+
+    maxDistance : float
+        Maximum distance between an advected track and a cloud to be
+        associated (distance mode).
+
+    minOverlap : float
+        Minimum overlap between two clouds to be associated, as a fraction of
+        the smallest of them (overlap mode).
+
+    maxMissedFrames : int
+        Number of successive frames a track can stay without association
+        before being closed.
+
+    tracks : dict({int:dict})
+        Track table. Each track holds the time series 't', 'com',
+        'volume', 'boundingBox' (lists of the same length), the
+        'missedFrames' counter, the 'closed' flag, and the 'splitFrom' and
+        'mergedInto' track ids (None if the track did not start with a split
+        or end with a merge).
+
+    openTracks : list(int)
+        Ids of the tracks still open.
+
+    frameTracks : numpy.array (int)
+        Track id of each cloud (label - 1) of the last frame.
+
+    Methods
+    -------
+    add_frame(t, scaledArr) -> numpy.array:
+        Processes a new frame and returns the track id of each of its clouds.
+
+    update(t, keys) -> numpy.array:
+        Requests a new frame from self.map and processes it.
+
+    get_track(trackId) -> dict:
+        Time series of a track as numpy arrays.
+    """
+
+    def __init__(self, map=None, windMap=None, threshold=2e-4,
+                 mode='distance', maxDistance=500.0, minOverlap=0.1,
+                 maxMissedFrames=0, maxClosedTracks=None):
+
+        """
+        Parameters
+        ----------
+        map : MapInterface or None
+            Map from which frames are requested in self.update.
+
+        windMap, threshold, mode, maxDistance, minOverlap, maxMissedFrames :
+            See class attributes.
+
+        maxClosedTracks : int or None
+            Maximum number of closed tracks kept in the track table.
+            (None to keep all of them).
+        """
+        if mode not in ('distance', 'overlap'):
+            raise ValueError("Invalid tracking mode : " + str(mode))
+        self.map             = map
+        self.windMap         = windMap
+        self.threshold       = threshold
+        self.mode            = mode
+        self.maxDistance     = maxDistance
+        self.minOverlap      = minOverlap
+        self.maxMissedFrames = maxMissedFrames
+        self.maxClosedTracks = maxClosedTracks
+
+        self.tracks       = {}
+        self.openTracks   = []
+        self.closedTracks = []
+        self.nextId       = 0
+        self.frameTracks  = np.empty(0, dtype=int)
+        self.lastTime     = None
+        self.lastFrame    = None
+        self.lastLabeled  = None
+        self.lock         = threading.Lock()
+
+
+    def update(self, t, keys):
+        """Requests map[(t,) + keys] from self.map and processes it as a new
+        frame."""
+        return self.add_frame(t, self.map[(t,) + tuple(keys)])
+
+
+    def add_frame(self, t, scaledArr):
+
+        """Processes a new frame.
+
+        Parameters
+        ----------
+        t : float
+            Time of the frame.
+
+        scaledArr : nephelae.array.ScaledArray
+            Frame data (2D or 3D, first two dimensions being x and y).
+
+        Returns
+        -------
+        numpy.array (int)
+            Track id of each cloud of the frame (index is label - 1).
+        """
+        labeled, nbClouds = ndimage.label(threshold_array(scaledArr.data,
+                                                          self.threshold))
+        features = compute_label_features(scaledArr.data, labeled, nbClouds,
+                                          scaledArr.dimHelper)
+
+        with self.lock:
+            if self.mode == 'overlap':
+                pairs, links = self.associate_overlap(t, scaledArr, labeled,
+                                                      features)
+            else:
+                pairs, links = self.associate_distance(t, features)
+
+            frameTracks = np.full(nbClouds, -1, dtype=int)
+            for trackId, cloud in pairs:
+                frameTracks[cloud] = trackId
+            matched = set(frameTracks.tolist())
+            for trackId in self.openTracks:
+                if trackId not in matched:
+                    self.tracks[trackId]['missedFrames'] += 1
+            newClouds = np.where(frameTracks < 0)[0]
+            for cloud in newClouds:
+                frameTracks[cloud] = self.new_track()
+
+            # Splits and merges (links not assigned to each other)
+            newClouds = set(newClouds.tolist())
+            for trackId, cloud in links:
+                if frameTracks[cloud] == trackId:
+                    continue
+                if cloud in newClouds and trackId in matched:
+                    self.tracks[frameTracks[cloud]]['splitFrom'] = int(trackId)
+                elif trackId not in matched and cloud not in newClouds and \
+                     self.tracks[trackId]['mergedInto'] is None:
+                    self.tracks[trackId]['mergedInto'] = int(frameTracks[cloud])
+                    self.tracks[trackId]['missedFrames'] = \
+                        self.maxMissedFrames + 1
+
+            for cloud, trackId in enumerate(frameTracks):
+                self.append_to_track(trackId, t, features[cloud])
+            self.close_tracks()
+
+            self.frameTracks = frameTracks
+            self.lastTime    = t
+            self.lastFrame   = scaledArr
+            self.lastLabeled = labeled
+            return frameTracks
+
+
+    def wind_displacement(self, dt, nbDims):
+        """Displacement of the air mass in dt seconds (zero outside of the
+        first two (horizontal) dimensions)."""
+        displacement = np.zeros(nbDims)
+        if self.windMap is not None:
+            displacement[:2] = np.asarray(self.windMap.get_wind())[:2]*dt
+        return displacement
+
+
+    def associate_distance(self, t, features):
+        """Associates the clouds of the new frame to the open tracks using
+        the distance to the advected track centers of mass. Returns the
+        associated (trackId, cloud) pairs and all the pairs closer than
+        self.maxDistance."""
+        if len(self.openTracks) == 0 or len(features) == 0:
+            return [], []
+        nbDims = features['com'].shape[1]
+        predicted = np.array([self.tracks[i]['com'][-1] +
+            self.wind_displacement(t - self.tracks[i]['t'][-1], nbDims)
+            for i in self.openTracks])
+        cost = np.linalg.norm(predicted[:,np.newaxis,:] -
+                              features['com'][np.newaxis,:,:], axis=2)
+        rows, cols = linear_sum_assignment(cost)
+        pairs = [(self.openTracks[r], c) for r, c in zip(rows, cols)
+                 if cost[r,c] <= self.maxDistance]
+        links = [(self.openTracks[r], c)
+                 for r, c in zip(*np.nonzero(cost <= self.maxDistance))]
+        return pairs, links
+
+
+    def associate_overlap(self, t, scaledArr, labeled, features):
+        """Associates the clouds of the new frame to the clouds of the
+        previous frame shifted by the wind displacement, using the number of
+        common pixels. Returns the associated (trackId, cloud) pairs and all
+        the pairs with a large enough overlap."""
+        if self.lastLabeled is None or len(features) == 0 or \
+           len(self.frameTracks) == 0:
+            return [], []
+        if self.lastLabeled.shape != labeled.shape or \
+           scaledArr.dimHelper.to_unit([0]*labeled.ndim) != \
+           self.lastFrame.dimHelper.to_unit([0]*labeled.ndim):
+            raise ValueError("Overlap tracking needs frames on the same grid.")
+
+        pixelSize = np.array([dim.toUnit(1) - dim.toUnit(0)
+                              for dim in scaledArr.dimHelper.dims])
+        offset = np.round(self.wind_displacement(t - self.lastTime,
+                          labeled.ndim) / pixelSize).astype(int)
+        previous = CloudTracker.shift_labels(self.lastLabeled, offset)
+
+        # Overlap counts of all (previous, current) label pairs in one pass
+        both = (previous > 0) & (labeled > 0)
+        nbPrevious = len(self.frameTracks)
+        pairIndexes = (previous[both] - 1)*len(features) + labeled[both] - 1
+        overlap = np.bincount(pairIndexes, minlength=nbPrevious*len(features))
+        overlap = overlap.reshape(nbPrevious, len(features))
+
+        previousVolumes = np.array([self.tracks[i]['volume'][-1]
+                                    for i in self.frameTracks])
+        minVolumes = np.minimum(previousVolumes[:,np.newaxis],
+                                features['volume'][np.newaxis,:])
+        linked = (overlap > 0) & (overlap >= self.minOverlap*minVolumes) & \
+                 np.isin(self.frameTracks, self.openTracks)[:,np.newaxis]
+        rows, cols = linear_sum_assignment(-overlap)
+        pairs = [(self.frameTracks[r], c) for r, c in zip(rows, cols)
+                 if linked[r,c]]
+        links = [(self.frameTracks[r], c) for r, c in zip(*np.nonzero(linked))]
+        return pairs, links
+
+
+    def shift_labels(labeled, offset):
+        """Shifts a labeled array by an integer number of pixels (areas
+        shifted in from outside the array are set to 0)."""
+        res = np.zeros_like(labeled)
+        src, dst = [], []
+        for size, o in zip(labeled.shape, offset):
+            if abs(o) >= size:
+                return res
+            src.append(slice(max(0, -o), size - max(0, o)))
+            dst.append(slice(max(0, o), size - max(0, -o)))
+        res[tuple(dst)] = labeled[tuple(src)]
+        return res
+
+
+    def new_track(self):
+        trackId = self.nextId
+        self.nextId += 1
+        self.tracks[trackId] = {'t':[], 'com':[], 'volume':[],
+                                'boundingBox':[], 'missedFrames':0,
+                                'closed':False, 'splitFrom':None,
+                                'mergedInto':None}
+        self.openTracks.append(trackId)
+        return trackId
+
+
+    def append_to_track(self, trackId, t, features):
+        track = self.tracks[trackId]
+        track['t'].append(t)
+        track['com'].append(features['com'].copy())
+        track['volume'].append(int(features['volume']))
+        track['boundingBox'].append(np.stack([features['boxMin'],
+                                              features['boxMax']], axis=-1))
+        track['missedFrames'] = 0
+
+
+    def close_tracks(self):
+        """Closes the tracks missed for more than self.maxMissedFrames
+        frames."""
+        stillOpen = []
+        for trackId in self.openTracks:
+            if self.tracks[trackId]['missedFrames'] > self.maxMissedFrames:
+                self.tracks[trackId]['closed'] = True
+                self.closedTracks.append(trackId)
+            else:
+                stillOpen.append(trackId)
+        self.openTracks = stillOpen
+        if self.maxClosedTracks is not None:
+            while len(self.closedTracks) > self.maxClosedTracks:
+                del self.tracks[self.closedTracks.pop(0)]
+
+
+    def get_track(self, trackId):
+        """Time series of a track ('boundingBox' is a (T x D x 2) array of
+        (min, max) bounds)."""
+        with self.lock:
+            track = self.tracks[trackId]
+            return {'t'           : np.array(track['t']),
+                    'com'         : np.array(track['com']),
+                    'volume'      : np.array(track['volume']),
+                    'boundingBox' : np.array(track['boundingBox']),
+                    'closed'      : track['closed'],
+                    'splitFrom'   : track['splitFrom'],
+                    'mergedInto'  : track['mergedInto']}
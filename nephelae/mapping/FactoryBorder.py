@@ -1,12 +1,51 @@
 import abc
+import threading
+from collections import OrderedDict
 
 from .MapInterface import MapInterface
+from .MapCache     import MapCache
 
 class FactoryBorder(MapInterface):
 
-    def __init__(self, name, threshold=0, sampleSize=1):
+    """
+    FactoryBorder
+
+    Base class of the maps derived from other maps (parent maps), such as
+    cloud borders.
+
+    Derived maps are cached along with the parent arrays they were computed
+    from. A cached result is reused only if self.get_arrays returns the very
+    same parent arrays (the parent maps returned their own cached arrays),
+    so a derived map is recomputed exactly when one of its parents was
+    recomputed.
+
+    /!\ Sub-classes must implement get_arrays(keys) (parent arrays for keys)
+    and at_locations(arrays) (derived map from the parent arrays).
+
+    Attributes
+    ----------
+    cacheSize : int
+        Maximum number of derived maps kept in cache.
+
+    derivedCache : collections.OrderedDict({tuple:(tuple, any)})
+        Parent arrays and derived maps keyed by normalized keys, ordered
+        from least to most recently used.
+
+    Methods
+    -------
+    get_arrays_and_derived(keys) -> (parent arrays, derived map):
+        Parent arrays and derived map for keys.
+
+    value_and_std(valueMap, stdMap, keys) -> (ScaledArray, ScaledArray):
+        Parent value and std arrays, from a single fit if possible.
+    """
+
+    def __init__(self, name, threshold=0, sampleSize=1, cacheSize=8):
         super().__init__(name, threshold)
-        self.sampleSize = sampleSize
+        self.sampleSize   = sampleSize
+        self.cacheSize    = cacheSize
+        self.derivedCache = OrderedDict()
+        self.cacheLock    = threading.Lock()
 
     @abc.abstractmethod
     def get_arrays(self, keys):
@@ -14,16 +53,50 @@ class FactoryBorder(MapInterface):
 
     def sample_size(self):
         return self.sampleSize
-    
+
     def shape(self):
         return (None, None, None, None)
 
     def span(self):
         return (None, None, None, None)
-    
+
     def bounds(self):
         return (None, None, None, None)
 
+    def same_arrays(arrays0, arrays1):
+        """Checks if two sets of parent arrays are the same objects"""
+        if not isinstance(arrays0, tuple) or not isinstance(arrays1, tuple):
+            return arrays0 is arrays1
+        return len(arrays0) == len(arrays1) and \
+               all(a0 is a1 for a0, a1 in zip(arrays0, arrays1))
+
+    def value_and_std(self, valueMap, stdMap, keys):
+        """Value and std arrays. Computed from a single GPR fit (composite
+        request) when both maps come from the same GprPredictor."""
+        gpr = getattr(valueMap, 'gpr', None)
+        if gpr is not None and gpr is getattr(stdMap, 'gpr', None):
+            return tuple(gpr.get_maps(keys))
+        return (valueMap.__getitem__(keys), stdMap.__getitem__(keys))
+
+    def get_arrays_and_derived(self, keys):
+        """Returns the parent arrays and the derived map for keys. The derived
+        map is taken from the cache if computed from the same parent
+        arrays."""
+        arrays  = self.get_arrays(keys)
+        entryId = MapCache.normalize_keys(keys)
+        with self.cacheLock:
+            entry = self.derivedCache.get(entryId, None)
+            if entry is not None and FactoryBorder.same_arrays(entry[0], arrays):
+                self.derivedCache.move_to_end(entryId)
+                return arrays, entry[1]
+
+        derived = self.at_locations(arrays)
+        with self.cacheLock:
+            self.derivedCache[entryId] = (arrays, derived)
+            self.derivedCache.move_to_end(entryId)
+            while len(self.derivedCache) > self.cacheSize:
+                self.derivedCache.popitem(last=False)
+        return arrays, derived
+
     def __getitem__(self, keys):
-        arrays = self.get_arrays(keys)
-        return self.at_locations(arrays)
+        return self.get_arrays_and_derived(keys)[1]
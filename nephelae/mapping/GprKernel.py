@@ -4,7 +4,7 @@ import numpy.fft as npfft
 import pickle
 import sklearn.gaussian_process.kernels as gpk
 from   scipy.spatial.distance import cdist
-from   copy import deepcopy
+from   copy import copy, deepcopy
 
 from nephelae.types import DeepcopyGuard
 
@@ -23,8 +23,9 @@ class NephKernel(gpk.Kernel):
     kernel is :
         variance*exp(-0.5*|(x-y)/lengthScales|^2) + diag(noiseVariance)
 
-    /!\ Hyper parameters optimization HAS NOT BEEN TESTED
-    When using with GaussianProcessRegressor, set optimizer=None
+    /!\ Hyper parameters optimization by scikit-learn HAS NOT BEEN TESTED
+    When using with GaussianProcessRegressor, set optimizer=None. Use
+    nephelae.mapping.KernelOptimizer instead.
     
     Attributes
     ----------
@@ -82,23 +83,69 @@ class NephKernel(gpk.Kernel):
                 'shallowParameters': self.shallowParameters}
 
 
+    def with_parameters(self, **params):
+        """Returns a copy of self with some parameters changed (for example
+        lengthScales, variance or noiseVariance). Shallow parameters (such
+        as a wind map) are shared with self."""
+        res = copy(self)
+        for key, value in params.items():
+            setattr(res, key, value)
+        return res
+
+
     def __call__(self, X, Y=None):
         """See sklearn.gaussian_process.kernels for details
         https://scikit-learn.org/stable/modules/classes.html#module-sklearn.gaussian_process
             TODO : a doc...
+
+        Computed as variance*self.correlation(X,Y) (+ noiseVariance on the
+        diagonal if Y is X). Only defined for a single output variance. For
+        a multi-output kernel (self.variance is an array), use
+        self.correlation and self.channel_parameters (see CholeskyGpr).
         """
 
         if Y is None:
             Y = X
 
+        variance = np.asarray(self.variance)
+        if variance.size != 1:
+            raise ValueError("Kernel with one variance per output cannot be "
+                             "evaluated directly. Use kernel.correlation.")
+        res = self.correlation(X, Y)
+        res *= float(variance)
+        if Y is X:
+            res[np.diag_indices_from(res)] += float(np.asarray(
+                self.noiseVariance).ravel()[0])
+        return res
+
+
+    def correlation(self, X, Y=None):
+        """Correlation between the process at locations X and Y, without
+        variance nor noise :
+            exp(-0.5*|(x-y)/lengthScales|^2)
+        Shared by all output channels (see self.channel_parameters).
+        """
+        if Y is None:
+            Y = X
         distMat = cdist(X / self.lengthScales,
                         Y / self.lengthScales,
-                        metric='sqeuclidian')
-        if Y is X:
-            return self.variance*np.exp(-0.5*distMat)\
-                   + np.diag([self.noiseVariance]*X.shape[0])
-        else:
-            return self.variance*np.exp(-0.5*distMat)
+                        metric='sqeuclidean')
+        return np.exp(-0.5*distMat, out=distMat)
+
+
+    def channel_parameters(self, nbChannels):
+        """Variance and noise variance of each of nbChannels output channels
+        (broadcast from scalar parameters if needed).
+
+        Returns
+        -------
+        (numpy.array (nbChannels), numpy.array (nbChannels))
+        """
+        variance      = np.broadcast_to(np.asarray(self.variance,
+                                        dtype=float).ravel(), (nbChannels,))
+        noiseVariance = np.broadcast_to(np.asarray(self.noiseVariance,
+                                        dtype=float).ravel(), (nbChannels,))
+        return variance, noiseVariance
 
 
     def diag(self, X):
@@ -106,6 +153,8 @@ class NephKernel(gpk.Kernel):
         https://scikit-learn.org/stable/modules/classes.html#module-sklearn.gaussian_process
             TODO : a doc...
         """
+        if np.isscalar(self.variance) and np.isscalar(self.noiseVariance):
+            return np.full(X.shape[0], self.variance + self.noiseVariance)
         return np.array([self.variance + self.noiseVariance]*X.shape[0])
 
 
@@ -149,7 +198,22 @@ class NephKernel(gpk.Kernel):
         This parameter is a trade-off performance versus-precision.
         TODO : (make this criterion configurable ?)
         """
-        return 3.0 * np.array(self.lengthScales)
+        return self.normalized_span() * np.array(self.lengthScales)
+
+
+    def normalized_span(self):
+        """Distance from which a sample contribution is deemed negligible,
+        in the space given by self.normalized_locations."""
+        return 3.0
+
+
+    def normalized_locations(self, X):
+        """Transforms locations in a space where the kernel only depends on
+        the euclidian distance between locations (distance is then in
+        number of length scales). Used to efficiently select relevant
+        samples with a k-d tree.
+        """
+        return X / self.lengthScales
 
 
 
@@ -185,7 +249,11 @@ class WindKernel(NephKernel):
     ----------
     wind : nephelae.mapping.WindMap
         A class able to return a wind estimation at a given location.
+        (Can be spatially varying, see nephelae.mapping.WindMapGrid).
 
+    windCache : (numpy.array, WindMap, numpy.array) or None
+        Last locations array given as Y to self.correlation, the wind map used
+        and the wind at these locations.
 
     """
 
@@ -202,6 +270,7 @@ class WindKernel(NephKernel):
         super().__init__(lengthScales, variance, noiseVariance,
                          shallowParameters)
         self.mean = mean
+        self.windCache = None
 
 
     def get_params(self, deep=True):
@@ -215,83 +284,89 @@ class WindKernel(NephKernel):
         return res
 
     
-    def __call__(self, X, Y=None):
+    def correlation(self, X, Y=None):
 
-        """See sklearn.gaussian_process.kernels for details
-        https://scikit-learn.org/stable/modules/classes.html#module-sklearn.gaussian_process
-            TODO : a doc...
+        """Same as NephKernel.correlation but with wind advection.
+
+        A pair of samples (X[i], Y[j]) is advected with the average of the
+        winds at their two locations, so the correlation stays symmetric
+        (K(X,Y) = K(Y,X)^T) with a spatially varying wind. The winds are
+        fetched with vectorized calls to self.windMap.at_locations, and the
+        wind at Y is reused while the same Y array is given (for example
+        training locations during a fit and the following predictions).
         """
 
         if Y is None:
             Y = X
 
-        # print("X shape: ", X.shape)
-        # print("Y shape: ", X.shape, end="\n\n")
-        
-        wind = self.windMap.at_locations(Y)
-
-        # print("Horizontal wind :", wind)
-        # print(Y)
-        # if self.windMap.name == 'H_Wind':
-        #     print("X shape:\n", X)
-        #     print("Y shape:\n", Y) 
-        #     print("Mean horizontal wind :", wind.mean(axis=0))
-        # print("self.variance :", self.variance)
-
-        # Far from most efficient but efficiency requires C++ implementation 
-        # (Or is it ? Yes. Yes it is. 40ns self time, cdist : 2ns, can be 6 times as fast)
-        # Take a look at a numba implementation, it could speed this up a lot)
-        t0,t1 = np.meshgrid(X[:,0], Y[:,0], indexing='ij', copy=False)
-        dt = t1 - t0
-        distMat = (dt / self.lengthScales[0])**2
-
-        # if self.windMap.name == 'H_Wind':
-        #     print("distMat0 :\n", [np.min(distMat.ravel()), np.max(distMat.ravel())])
-
-        x0,x1 = np.meshgrid(X[:,1],    Y[:,1], indexing='ij', copy=False)
-        x0,w1 = np.meshgrid(X[:,1], wind[:,0], indexing='ij', copy=False)
-        dx = x1 - (x0 + w1 * dt)
-        distMat = distMat + (dx / self.lengthScales[1])**2
-
-        # if self.windMap.name == 'H_Wind':
-        #     print("distMat1 :\n", [np.min(distMat.ravel()), np.max(distMat.ravel())])
-
-        x0,x1 = np.meshgrid(X[:,2],    Y[:,2], indexing='ij', copy=False)
-        x0,w1 = np.meshgrid(X[:,2], wind[:,1], indexing='ij', copy=False)
-        dx = x1 - (x0 + w1 * dt)
-        distMat = distMat + (dx / self.lengthScales[2])**2
-
-        # if self.windMap.name == 'H_Wind':
-        #     print("distMat2 :\n", [np.min(distMat.ravel()), np.max(distMat.ravel())])
-        
-        distMat = distMat + cdist((X[:,3] / self.lengthScales[3]).reshape(-1,1),
-                                  (Y[:,3] / self.lengthScales[3]).reshape(-1,1),
-                                  metric='sqeuclidean')
-
-        # if self.windMap.name == 'H_Wind':
-        #     print("distMat3 :\n", [np.min(distMat.ravel()), np.max(distMat.ravel())])
-
-        if Y is X:
-            return self.variance*np.exp(-0.5*distMat)\
-                   + np.diag([self.noiseVariance]*X.shape[0])
+        windY = self.wind_at(Y)
+        if X is Y:
+            windX = windY
         else:
-            return self.variance*np.exp(-0.5*distMat)
-
-        # print("Wind map :", self.windMap.name)
-        # if Y is X:
-        #     res = self.variance*np.exp(-0.5*distMat)\
-        #            + np.diag([self.noiseVariance]*X.shape[0])
-        #     # print("Y is X:\n", res)
-        # else:
-        #     res = self.variance*np.exp(-0.5*distMat)
-        #     # print("Y is no X:\n", res)
-
-        # if self.windMap.name == 'H_Wind':
-        #     print("res :\n", [np.min(res.ravel()), np.max(res.ravel())])
-
-        # if self.windMap.name == 'H_Wind':
-        #     print("Y is no X:\n", res)
-        # return res
+            windX = np.asarray(self.windMap.at_locations(X), dtype=float)
+
+        # Broadcasted (len(X) x len(Y)) operations, computed in place as much
+        # as possible to limit the number of temporary matrices.
+        # With dt = X[i,0] - Y[j,0] the advected distance is
+        # X[i,1] - (Y[j,1] + 0.5*(windX[i] + windY[j])*dt) (squared, sign
+        # does not matter).
+        dt = np.subtract.outer(X[:,0], Y[:,0])
+        distMat = (dt / self.lengthScales[0])**2
+        dt *= 0.5
+
+        for dim in (1, 2):
+            dx = np.subtract.outer(X[:,dim], Y[:,dim])
+            dx -= windY[:,dim-1] * dt
+            dx -= windX[:,dim-1,np.newaxis] * dt
+            dx /= self.lengthScales[dim]
+            dx **= 2
+            distMat += dx
+        del dt
+
+        dz = np.subtract.outer(X[:,3], Y[:,3])
+        dz /= self.lengthScales[3]
+        dz **= 2
+        distMat += dz
+        del dz
+
+        distMat *= -0.5
+        return np.exp(distMat, out=distMat)
+
+
+    def wind_at(self, Y):
+        """Returns the wind at Y locations (cached for the last Y array)"""
+        cached = self.windCache
+        if cached is not None and cached[0] is Y and cached[1] is self.windMap:
+            return cached[2]
+        wind = np.asarray(self.windMap.at_locations(Y), dtype=float)
+        self.windCache = (Y, self.windMap, wind)
+        return wind
+
+
+    def normalized_span(self):
+        """Same as NephKernel.normalized_span, with a margin accounting for
+        the spatial variations of the wind. (Normalized locations are
+        computed with the average wind, see self.normalized_locations)."""
+        if not hasattr(self.windMap, 'get_wind_deviation'):
+            return super().normalized_span()
+        deviation = np.asarray(self.windMap.get_wind_deviation())
+        margin = 3.0 * self.lengthScales[0] * np.max(
+            deviation / np.array(self.lengthScales[1:3]))
+        return super().normalized_span() + margin
+
+
+    def normalized_locations(self, X):
+        """Same as NephKernel.normalized_locations, but locations are
+        expressed in a frame moving with the wind. In this frame
+        the (x,y) distance between two locations is the wind-advected
+        distance used in self.__call__. (The average wind is used if the
+        wind is not uniform).
+        """
+        wind = self.windMap.get_wind()
+        res = np.array(X, dtype=float)
+        res[:,1] = res[:,1] - wind[0]*res[:,0]
+        res[:,2] = res[:,2] - wind[1]*res[:,0]
+        return res / self.lengthScales
 
 
 
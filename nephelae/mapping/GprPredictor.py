@@ -1,20 +1,25 @@
 import numpy as np
 import threading
-from sklearn.gaussian_process import GaussianProcessRegressor
+from scipy.spatial import cKDTree
 
 from nephelae.array import ScaledArray
 from nephelae.types import Bounds
 from nephelae.mapping import MapInterface
 
+from .MapCache    import MapCache
+from .CholeskyGpr import CholeskyGpr
+
 class GprPredictor(MapInterface):
 
     """
     GprPredictor
 
     Computes dense maps using sparse samples, using Gaussian Process Regression.
-    Base on scikit-learn GPR library.
+    GPR computations are done by a nephelae.mapping.CholeskyGpr engine.
+    (Kernels are still compatible with scikit-learn GPR library).
 
-    /!\ Kernel parameters optimisation is not currently supported !
+    /!\ Kernel parameters are not optimised during map computation. Use a
+    nephelae.mapping.KernelOptimizer to tune them in background.
 
     Attributes
     ----------
@@ -28,16 +33,42 @@ class GprPredictor(MapInterface):
         Kernel used in GPR. See here for more details :
         https://scikit-learn.org/stable/modules/classes.html#module-sklearn.gaussian_process
 
-    gprProc : sklearn.gaussian_process.GaussianProcessRegressor
-        Class doing the GPR computation. (Not used here. Trouble updating
-        data inside this class. Is re-build each time. TODO : debug this)
+    gprProc : nephelae.mapping.CholeskyGpr
+        Last fitted GPR engine. Each map computation (or group of requests,
+        see self.compute_many) creates and fits its own engine, so several
+        maps can be computed concurrently from different threads.
 
     lock : threading.Lock
-        Simple mutex to allow only one map computation at a time in
-        self.compute_maps method. self.compute_maps will return None if busy.
+        Mutex protecting the state shared between concurrent map
+        computations (self.dataRange, self.kernel replacement).
+
+    cache : nephelae.mapping.MapCache
+        LRU cache of computed (Values, Stds) maps couples keyed by map keys.
+        An entry is invalidated when a new sample is notified by
+        self.dataview inside the region from which the entry was computed.
+
+    predictionBlockSize : int
+        Maximum number of locations predicted at once. Bounds the memory
+        used by a prediction on large (batch) requests.
+
+    prefilterSamples : bool
+        If True, training samples and query locations are selected with
+        k-d trees in the kernel normalized space before each fit (see
+        self.select_samples). If False, all fetched samples are used.
+
+    prefilterStats : dict
+        Statistics about the last sample selection (number of fetched and
+        kept samples, of query and predicted locations, estimated speedup).
 
-    cache : couple
-        Contains computed Values and Stds maps of given keys.
+    maxBatchSize : int
+        Default maximum number of requests fitted together in
+        self.compute_many.
+
+    maxBatchSpan : float
+        Maximum extent of the union training window of a group of requests
+        in self.compute_many, as a multiple of the training window of the
+        first request of the group (in each dimension). Bounds the number of
+        samples of a group fit (O(n^3)).
 
     Methods
     -------
@@ -48,13 +79,25 @@ class GprPredictor(MapInterface):
         When requesting a dense map, each location must be the position of
         on pixel of the requested map.
 
+    add_sample(sample):
+        Callback called by self.dataview on a new sample. Invalidates
+        cached maps depending on this sample.
+
+    compute_many(keysList, maxBatchSize, computeStd):
+        Computes several maps at once, sharing the fetch of training data
+        and the GPR fit between requests with overlapping data windows.
+
+    get_maps(keys) -> (ScaledArray, ScaledArray):
+        Values and stds maps computed from a single fit.
+
     See nephelae.mapping.MapInterface for other methods.
     """
 
     # def __init__(self, name, database, databaseTags, kernel,
     #         dataRange=(Bounds(0, 0),), updateRange=True, threshold=0):
     def __init__(self, name, dataview, kernel,
-                 dataRange=(Bounds(0, 0),), updateRange=True, threshold=0):
+                 dataRange=(Bounds(0, 0),), updateRange=True, threshold=0,
+                 cacheSize=16, cacheTolerance=None):
 
         """
         name : str
@@ -68,23 +111,34 @@ class GprPredictor(MapInterface):
 
         kernel : sklearn.gaussian_process.kernel.Kernel derived type
             Kernel used in GPR.
+
+        cacheSize : int
+            Maximum number of (Values, Stds) maps couples kept in self.cache.
+
+        cacheTolerance : tuple(float,...) or None
+            If not None, cached maps are reused for keys differing by less
+            than cacheTolerance in each dimension (see MapCache).
         """
         super().__init__(name, threshold=threshold)
         # self.database       = database
         # self.databaseTags   = databaseTags
         self.dataview       = dataview
         self.kernel         = kernel
-        self.gprProc = GaussianProcessRegressor(self.kernel,
-                alpha=0.0,
-                optimizer=None,
-                copy_X_train=False)
-        self.cache          = None
-        self.keys           = None
-        self.locationsLock  = threading.Lock()
-        self.getItemLock    = threading.Lock()
+        self.gprProc        = CholeskyGpr(self.kernel)
+        self.cache          = MapCache(cacheSize, cacheTolerance)
+        self.lock           = threading.Lock()
         self.computeStd     = False
         self.updateRange    = updateRange
         self.dataRange      = dataRange
+        self.predictionBlockSize = 8192
+        self.prefilterSamples    = True
+        self.prefilterStats      = {}
+        self.maxBatchSize        = 8
+        self.maxBatchSpan        = 2.0
+
+        # Getting notified of new samples for cache invalidation
+        if hasattr(self.dataview, 'attach_observer'):
+            self.dataview.attach_observer(self)
 
     
     def at_locations(self, locations, locBounds=None):
@@ -119,131 +173,349 @@ class GprPredictor(MapInterface):
         Note : This method probably needs more refining.
         (TODO : investigate this)
         """
-        with self.locationsLock:
-            if locBounds is None:
-                kernelSpan = self.kernel.span()
-                locBounds = Bounds.from_array(locations.T)
-                
-                locBounds[0].min = locBounds[0].min - kernelSpan[0]
-                locBounds[0].max = locBounds[0].max + kernelSpan[0]
-                
-                locBounds[1].min = locBounds[1].min - kernelSpan[1]
-                locBounds[1].max = locBounds[1].max + kernelSpan[1]
-                
-                locBounds[2].min = locBounds[2].min - kernelSpan[2]
-                locBounds[2].max = locBounds[2].max + kernelSpan[2]
-                
-                locBounds[3].min = locBounds[3].min - kernelSpan[3]
-                locBounds[3].max = locBounds[3].max + kernelSpan[3]
-            
-            # samples = [entry.data for entry in \
-            #         self.database[self.databaseTags]\
-            #         (assumePositiveTime=False)\
-            #         [locBounds[0].min:locBounds[0].max,
-            #         locBounds[1].min:locBounds[1].max,
-            #         locBounds[2].min:locBounds[2].max,
-            #         locBounds[3].min:locBounds[3].max]]
-            samples = self.dataview[locBounds[0].min:locBounds[0].max,
-                                    locBounds[1].min:locBounds[1].max,
-                                    locBounds[2].min:locBounds[2].max,
-                                    locBounds[3].min:locBounds[3].max]
-            
-            if len(samples) < 1:
-                 return (np.ones((locations.shape[0], 1))*self.kernel.mean,
-                        np.ones(locations.shape[0])*self.kernel.variance)
+        if locBounds is None:
+            locBounds = self.location_bounds(locations)
+        return self.compute_predictions(locations, locBounds)
+
+
+    def location_bounds(self, locations):
+        """Bounds of the region from which training samples are fetched to
+        predict values at locations (locations bounds enlarged by the kernel
+        span)."""
+        kernelSpan = self.kernel.span()
+        mins = np.min(locations, axis=0)
+        maxs = np.max(locations, axis=0)
+        return [Bounds(m - s, M + s) for m, M, s in zip(mins, maxs, kernelSpan)]
+
 
+    def fetch_samples(self, locBounds):
+        """Fetch training samples from self.dataview inside locBounds.
+
+        Returns
+        -------
+        (numpy.array (N x 4), numpy.array (N x M)) or None
+            Training locations and training values. None if no sample was
+            found in locBounds.
+        """
+        samples = self.dataview[locBounds[0].min:locBounds[0].max,
+                                locBounds[1].min:locBounds[1].max,
+                                locBounds[2].min:locBounds[2].max,
+                                locBounds[3].min:locBounds[3].max]
+        if len(samples) < 1:
+            return None
+
+        trainLocations =\
+            np.array([[s.position.t,\
+            s.position.x,\
+            s.position.y,\
+            s.position.z]\
+            for s in samples])
+
+        trainValues = np.array([s.data for s in samples]).squeeze()
+        if len(trainValues.shape) < 2:
+            trainValues = trainValues.reshape(-1,1)
+        return trainLocations, trainValues
+
+
+    def prior_prediction(self, locations):
+        """Prediction in the absence of data (kernel mean and variance).
+        Stds are a (N x M) array if the kernel has one variance per output
+        channel."""
+        std = np.sqrt(np.asarray(self.kernel.variance + 
+                                 self.kernel.noiseVariance, dtype=float))
+        if std.size == 1:
+            std = np.full(locations.shape[0], float(std.ravel()[0]))
+        else:
+            std = np.tile(std.ravel(), (locations.shape[0], 1))
+        return (np.ones((locations.shape[0], 1))*self.kernel.mean, std)
+
+
+    def compute_predictions(self, locations, locBounds, computeStd=None):
+        """Fetch samples inside locBounds, fit the GPR and predict values (and
+        stds if computeStd is True) at locations.
+
+        Is reentrant : the GPR engine is local to the call.
+
+        computeStd : bool or None
+            If None, self.computeStd is used.
+        """
+        samples = self.fetch_samples(locBounds)
+        if samples is None:
+            return self.prior_prediction(locations)
+
+        if self.prefilterSamples:
+            trainLocations, trainValues, selected = \
+                self.select_samples(samples[0], samples[1], locations)
+            if len(trainLocations) == 0:
+                return self.prior_prediction(locations)
+        else:
+            trainLocations, trainValues = samples
+            selected = self.select_locations_in_bounding_box(trainLocations,
+                                                             locations)
+
+        gprProc = CholeskyGpr(self.kernel).fit(trainLocations, trainValues)
+        self.gprProc = gprProc
+        val_return = self.predict(locations, selected, gprProc, computeStd)
+
+        if self.updateRange:
+            self.update_data_range(val_return[0])
+        return val_return
+
+
+    def fit_region(self, locBounds):
+        """Fits a GPR engine on the samples inside locBounds, to be used for
+        several predictions in this region (see
+        compute_cloud_metrics_adaptive). Returns None if there is no sample
+        in locBounds (prior everywhere)."""
+        samples = self.fetch_samples(locBounds)
+        if samples is None:
+            return None
+        return CholeskyGpr(self.kernel).fit(samples[0], samples[1])
+
+
+    def select_samples(self, trainLocations, trainValues, locations):
+
+        """Two-stage selection of the data relevant to a prediction.
+
+        Locations are first expressed in the kernel normalized space (see
+        NephKernel.normalized_locations) where the kernel value only depends
+        on the distance between two locations. (For a WindKernel, this is
+        the wind-advected distance).
+            - A k-d tree over the query locations drops the training samples
+              farther than the kernel span from every query location.
+            - A k-d tree over the remaining training samples gives the query
+              locations which have at least one sample within the kernel
+              span. Other locations are left to the prior.
+
+        Statistics about this selection are stored in self.prefilterStats.
+
+        Returns
+        -------
+        (numpy.array, numpy.array, numpy.array)
+            Selected training locations, training values and indexes of the
+            query locations to be predicted.
+        """
+        radius = self.kernel.normalized_span()
+        normalizedTrain = self.kernel.normalized_locations(trainLocations)
+        normalizedQuery = self.kernel.normalized_locations(locations)
+
+        distances, _ = cKDTree(normalizedQuery).query(normalizedTrain, k=1,
+            distance_upper_bound=radius)
+        keptSamples = np.isfinite(distances)
+
+        if np.any(keptSamples):
+            distances, _ = cKDTree(normalizedTrain[keptSamples]).query(
+                normalizedQuery, k=1, distance_upper_bound=radius)
+            selected = np.where(np.isfinite(distances))[0]
+        else:
+            selected = np.empty([0], dtype=int)
+
+        nFetched = float(trainLocations.shape[0])
+        nKept    = float(np.count_nonzero(keptSamples))
+        self.prefilterStats = {
+            'fetchedSamples'     : int(nFetched),
+            'keptSamples'        : int(nKept),
+            'queryLocations'     : locations.shape[0],
+            'predictedLocations' : len(selected)}
+        # Speedup estimated from the GPR complexity (O(n^3) fit and O(n^2)
+        # per predicted location) compared to a fit with all fetched samples
+        # and a prediction at every location.
+        if nKept > 0:
+            self.prefilterStats['estimatedSpeedup'] = \
+                (nFetched**3 + locations.shape[0]*nFetched**2) / \
+                (nKept**3 + len(selected)*nKept**2)
+
+        return trainLocations[keptSamples], trainValues[keptSamples], selected
+
+
+    def select_locations_in_bounding_box(self, trainLocations, locations):
+        """Returns indexes of locations inside the bounding box of the
+        training samples enlarged by the kernel span. The box is computed in
+        the kernel normalized space (see NephKernel.normalized_locations and
+        NephKernel.normalized_span), as in self.select_samples, so wind
+        advection and wind variations are accounted for the same way.
+        Used instead of self.select_samples if self.prefilterSamples is
+        False."""
+        radius = self.kernel.normalized_span()
+        normalizedTrain = self.kernel.normalized_locations(trainLocations)
+        normalizedQuery = self.kernel.normalized_locations(locations)
+        inside = np.all(
+            (normalizedQuery >= np.min(normalizedTrain, axis=0) - radius) &
+            (normalizedQuery <= np.max(normalizedTrain, axis=0) + radius),
+            axis=1)
+        return np.where(inside)[0]
+
+
+    def predict(self, locations, selected, gprProc=None, computeStd=None):
+        """Predict values at locations with an already fitted gprProc
+        (self.gprProc if None). Stds are computed if computeStd is True
+        (self.computeStd if None).
+
+        Only the selected locations are predicted, others are set to the
+        prior. Predictions are done by blocks of at most
+        self.predictionBlockSize locations to keep the memory usage bounded
+        on large (batch) requests.
+        """
+        if gprProc is None:
+            gprProc = self.gprProc
+        if computeStd is None:
+            computeStd = self.computeStd
+        val_res, std_res = self.prior_prediction(locations)
+        if val_res.shape[1] != gprProc.trainValues.shape[-1]:
+            val_res = np.ones((locations.shape[0],
+                gprProc.trainValues.shape[-1]))*self.kernel.mean
+        for start in range(0, len(selected), self.predictionBlockSize):
+            block = selected[start:start + self.predictionBlockSize]
+            computed_locations = gprProc.predict(
+                    locations[block], return_std=computeStd)
+            if computeStd:
+                val_res[block] = computed_locations[0].reshape(len(block), -1)
+                # Stds are either one per location (shared by all outputs)
+                # or one per location and output channel.
+                std = computed_locations[1]
+                if std.ndim < std_res.ndim:
+                    std = std[:, np.newaxis]
+                std_res[block] = std
             else:
-                
-                trainLocations =\
-                    np.array([[s.position.t,\
-                    s.position.x,\
-                    s.position.y,\
-                    s.position.z]\
-                    for s in samples])
-
-                trainValues = np.array([s.data for s in samples]).squeeze()
-                if len(trainValues.shape) < 2:
-                    trainValues = trainValues.reshape(-1,1)
-                
-                boundingBox = (np.min(trainLocations, axis=0), 
-                    np.max(trainLocations, axis=0))
-
-                dt = boundingBox[1][0] - boundingBox[0][0]
-                
-                wind = self.kernel.windMap.get_wind()
-
-                dx, dy = dt*wind
-
-                boundingBox[0][1] = min(boundingBox[0][1], boundingBox[0][1] +
-                        dx)
-                boundingBox[1][1] = max(boundingBox[1][1], boundingBox[1][1] +
-                        dx)
-
-                boundingBox[0][2] = min(boundingBox[0][2], boundingBox[0][2] +
-                        dy)
-                boundingBox[1][2] = max(boundingBox[1][2], boundingBox[1][2] +
-                        dy)
-
-                same_locations = np.where(np.logical_and(
-                    np.logical_and(
-                        np.logical_and(
-                            locations[:,0] >= boundingBox[0][0] - kernelSpan[0],
-                            locations[:,0] <= boundingBox[1][0] + kernelSpan[0]),
-                        np.logical_and(
-                            locations[:,1] >= boundingBox[0][1] - kernelSpan[1],
-                            locations[:,1] <= boundingBox[1][1] + kernelSpan[1])),
-                    np.logical_and(
-                        np.logical_and(
-                            locations[:,2] >= boundingBox[0][2] - kernelSpan[2],
-                            locations[:,2] <= boundingBox[1][2] + kernelSpan[2]),
-                        np.logical_and(
-                            locations[:,3] >= boundingBox[0][3] - kernelSpan[3],
-                            locations[:,3] <= boundingBox[1][3] + kernelSpan[3])
-                    )))[0]
-                
-                selected_locations = locations[same_locations]
-                self.gprProc.fit(trainLocations, trainValues)
-                computed_locations = self.gprProc.predict(
-                        selected_locations, return_std=self.computeStd)
-                
-                if self.computeStd:
-                    val_res = np.ones((locations.shape[0], 1))*self.kernel.mean
-                    std_res = \
-                    np.ones(locations.shape[0])*np.sqrt(self.kernel.variance + 
-                            self.kernel.noiseVariance)
-                    np.put(val_res, same_locations, computed_locations[0])
-                    np.put(std_res, same_locations, computed_locations[1])
-                    val_return = (val_res, std_res)
-                else:
-                    res = np.ones((locations.shape[0], 1))*self.kernel.mean
-                    np.put(res, same_locations, computed_locations)
-                    val_return = (res, None)
-                
-                if self.updateRange:
-                    tmp = val_return[0]
-                
-                    Min = tmp.min(axis=0)
-                    Max = tmp.max(axis=0)
-                
-                    if np.isscalar(Min):
-                        Min = [Min]
-                        Max = [Max]
-                
-                    if len(Min) != len(self.dataRange):
-                        self.dataRange = tuple(Bounds(m, M) for m,M in
-                                zip(Min,Max))
-                    else:
-                        for b,m,M in zip(self.dataRange, Min, Max):
-                            b.update(m)
-                            b.update(M)
-                
-                return val_return
+                val_res[block] = computed_locations.reshape(len(block), -1)
+        
+        if computeStd:
+            return (val_res, std_res)
+        else:
+            return (val_res, None)
 
-    def check_cache(self, keys):
-        return (self.cache is not None) and keys == self.keys
 
-    def set_keys(self, keys):
-        self.keys = keys
+    def update_data_range(self, values):
+        Min = values.min(axis=0)
+        Max = values.max(axis=0)
+    
+        if np.isscalar(Min):
+            Min = [Min]
+            Max = [Max]
+    
+        with self.lock:
+            if len(Min) != len(self.dataRange):
+                self.dataRange = tuple(Bounds(m, M) for m,M in
+                        zip(Min,Max))
+            else:
+                for b,m,M in zip(self.dataRange, Min, Max):
+                    b.update(m)
+                    b.update(M)
+
+
+    def compute_many(self, keysList, maxBatchSize=None, computeStd=None):
+        """Computes several maps at once (for example successive time slices
+        of a same region for a video).
+
+        Consecutive requests are grouped as long as their training data
+        windows overlap the one of the first request of the group, and the
+        union of the windows of the group stays smaller than
+        self.maxBatchSpan times the window of the first request. Training
+        samples of a group are fetched once and the GPR is fitted once for
+        the whole group. Predictions for all the requests of a group are then
+        made together.
+
+        Parameters
+        ----------
+        keysList : list(tuple(float, slice,...), ...)
+            List of keys, as in self.__getitem__.
+
+        maxBatchSize : int or None
+            Maximum number of requests in a group. If None,
+            self.maxBatchSize is used.
+
+        computeStd : bool or None
+            Computes stds along with values. If None, self.computeStd is
+            used.
+
+        Returns
+        -------
+        list((ScaledArray, ScaledArray or None), ...)
+            Value and std maps for each keys of keysList. Stds are None if
+            computeStd is False.
+        """
+        if computeStd is None:
+            computeStd = self.computeStd
+        if maxBatchSize is None:
+            maxBatchSize = self.maxBatchSize
+        version = self.cache.version
+        output  = [self.cache.get(keys) for keys in keysList]
+        if computeStd:
+            output = [None if pred is None or pred[1] is None else pred
+                      for pred in output]
+
+        requests = []
+        for index, keys in enumerate(keysList):
+            if output[index] is not None:
+                continue
+            locations, dims, shape = self.compute_locations(keys)
+            requests.append((locations, dims, shape,
+                             self.location_bounds(locations), index))
+
+        groups = []
+        for request in requests:
+            if groups and len(groups[-1]) < maxBatchSize and\
+               all(b0.overlaps(b1) for b0, b1 in zip(groups[-1][0][3],
+                                                     request[3])) and\
+               self.batch_span_ok(groups[-1] + [request]):
+                groups[-1].append(request)
+            else:
+                groups.append([request])
+
+        for group in groups:
+            locBounds = GprPredictor.union_bounds(group)
+            locations = np.concatenate([r[0] for r in group], axis=0)
+            pred = self.compute_predictions(locations, locBounds, computeStd)
+            start = 0
+            for request in group:
+                stop = start + request[0].shape[0]
+                output[request[4]] = self.prediction_to_arrays(
+                    request[2], request[1], (pred[0][start:stop],
+                    None if pred[1] is None else pred[1][start:stop]))
+                self.cache.insert(keysList[request[4]],
+                                  output[request[4]], request[3], version)
+                start = stop
+        return output
+
+
+    def union_bounds(group):
+        """Union of the training windows of a group of requests."""
+        return [Bounds(min(r[3][i].min for r in group),
+                       max(r[3][i].max for r in group))
+                for i in range(len(group[0][3]))]
+
+
+    def batch_span_ok(self, group):
+        """True if the union training window of group is at most
+        self.maxBatchSpan times the window of its first request in each
+        dimension."""
+        for union, first in zip(GprPredictor.union_bounds(group),
+                                group[0][3]):
+            if union.max - union.min > \
+               self.maxBatchSpan*(first.max - first.min):
+                return False
+        return True
+
+
+    def prediction_to_arrays(self, shape, dims, pred):
+        """Builds value and std ScaledArrays from a predicted couple
+        (as returned by self.at_locations)"""
+        valComputed = self.compute_scaled_array(shape, pred[0], dims)
+        if pred[1] is None:
+            return (valComputed, None)
+        stdComputed = self.compute_scaled_array(shape, pred[1], dims)
+        return (valComputed, stdComputed)
+
+
+    def add_sample(self, sample):
+        """Callback called by self.dataview when a new sample is available.
+        Invalidates the cached maps which depend on this sample."""
+        self.cache.invalidate((sample.position.t, sample.position.x,
+                               sample.position.y, sample.position.z))
+
+    def check_cache(self, keys):
+        pred = self.cache.get(keys)
+        return pred is not None and (pred[1] is not None or not self.computeStd)
     
     def shape(self):
         return (None, None, None, None)
@@ -264,34 +536,55 @@ class GprPredictor(MapInterface):
         return self.dataRange
 
     def get_std(self, keys):
-        self.update_cache(keys)
-        return self.cache[1]
+        return self.update_cache(keys, computeStd=True)[1]
 
     def get_value(self, keys):
-        self.update_cache(keys)
-        return self.cache[0]
-
-    def update_cache(self, keys):
-        with self.getItemLock:
-            if not self.check_cache(keys):
-                self.set_keys(keys)
-                locations, dims, shape = self.compute_locations(keys)
-                pred = self.at_locations(locations)
-                if self.computeStd:
-                    outputShape = list(shape)
-                    stdComputed = ScaledArray(pred[1].reshape(outputShape)
-                            .squeeze(), dims)
-                    if len(pred[0].shape) == 2:
-                        outputShape.append(pred[0].shape[1])
-                        valComputed = ScaledArray(pred[0].reshape(outputShape)
-                                .squeeze(), dims)
-                        self.cache = (valComputed, stdComputed)
-                else:
-                    self.cache = (self.compute_scaled_array(shape, pred[0],
-                        dims), None)
+        return self.update_cache(keys)[0]
+
+    def update_cache(self, keys, computeStd=None):
+        """Returns the (Values, Stds) maps couple for keys, computed if not in
+        self.cache. Stds are computed if computeStd is True (self.computeStd
+        if None). Can be called concurrently from several threads
+        (identical concurrent requests are de-duplicated by MapServer)."""
+        if computeStd is None:
+            computeStd = self.computeStd
+        pred = self.cache.get(keys)
+        if pred is None or (computeStd and pred[1] is None):
+            version = self.cache.version
+            locations, dims, shape = self.compute_locations(keys)
+            locBounds = self.location_bounds(locations)
+            pred = self.prediction_to_arrays(shape, dims,
+                self.compute_predictions(locations, locBounds, computeStd))
+            self.cache.insert(keys, pred, locBounds, version)
+        return pred
+
+    def get_maps(self, keys):
+        """Returns both (Values, Stds) maps for keys from a single GPR fit
+        and prediction, whatever the value of self.computeStd (composite
+        request, see BorderIncertitude)."""
+        return self.update_cache(keys, computeStd=True)
+
+    def set_kernel(self, kernel):
+        """Replaces the kernel used in GPR (for example with a kernel tuned
+        by a KernelOptimizer). Invalidates all cached maps. Maps being
+        computed during the change are returned but not cached."""
+        with self.lock:
+            self.kernel  = kernel
+            self.gprProc = CholeskyGpr(self.kernel)
+            self.cache.clear()
 
     def set_compute_std(self, state):
         self.computeStd = state
 
+    def get_values(self, keysList, maxBatchSize=None):
+        return [pred[0] for pred in self.compute_many(keysList, maxBatchSize)]
+
+    def get_stds(self, keysList, maxBatchSize=None):
+        return [pred[1] for pred in self.compute_many(keysList, maxBatchSize,
+                                                      computeStd=True)]
+
     def __getitem__(self, keys):
         return self.get_value(keys)
+
+    def get_many(self, keysList):
+        return self.get_values(keysList)
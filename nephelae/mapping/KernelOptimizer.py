@@ -0,0 +1,350 @@
+import threading
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from scipy.linalg import cho_factor, cho_solve, LinAlgError
+from scipy.optimize import minimize
+
+from nephelae.types import Bounds
+
+
+def negative_log_marginal_likelihood(theta, trainLocations, trainValues,
+                                     wind=None, nbChannels=1):
+
+    """Negative log marginal likelihood of a NephKernel/WindKernel GPR and
+    its analytic gradient.
+
+    The kernel of output channel c is :
+        variance[c]*exp(-0.5*|(x-y)/lengthScales|^2) + diag(noiseVariance[c])
+    where x and y are expressed in a frame moving with the wind if wind is
+    not None (WindKernel). The correlation is shared by all the channels. If
+    nbChannels is 1, all outputs share a single variance and noise variance
+    (and a single factorization).
+
+    Parameters
+    ----------
+    theta : numpy.array (D + 2*nbChannels)
+        Logarithm of the kernel parameters
+        [lengthScales[0], ..., lengthScales[D-1], variance[0], ...,
+         variance[nbChannels-1], noiseVariance[0], ...,
+         noiseVariance[nbChannels-1]].
+
+    trainLocations : numpy.array (N x D)
+        Locations (t,x,y,z) of the training samples.
+
+    trainValues : numpy.array (N x M)
+        Training values (kernel mean already subtracted).
+
+    wind : numpy.array (2) or None
+        Constant horizontal wind (for a WindKernel).
+
+    nbChannels : int
+        Number of variance parameters (1 or M).
+
+    Returns
+    -------
+    (float, numpy.array (D + 2*nbChannels))
+        Negative log marginal likelihood and its gradient relative to theta.
+    """
+    params        = np.exp(theta)
+    lengthScales  = params[:-2*nbChannels]
+    variances     = params[-2*nbChannels:-nbChannels]
+    noiseVariances = params[-nbChannels:]
+
+    X = np.array(trainLocations, dtype=float)
+    if wind is not None:
+        X[:,1] = X[:,1] - wind[0]*X[:,0]
+        X[:,2] = X[:,2] - wind[1]*X[:,0]
+    X = X / lengthScales
+
+    # Squared normalized distances in each dimension
+    sqDists = (X[:,np.newaxis,:] - X[np.newaxis,:,:])**2
+    C = np.exp(-0.5*np.sum(sqDists, axis=2))
+
+    nll  = 0.0
+    grad = np.zeros(theta.shape)
+    for c in range(nbChannels):
+        values = trainValues if nbChannels == 1 else trainValues[:,c:c+1]
+        K = variances[c]*C
+        K[np.diag_indices_from(K)] += noiseVariances[c]
+        try:
+            L = cho_factor(K, lower=True)
+        except LinAlgError:
+            return np.inf, np.zeros(theta.shape)
+
+        nOutputs = values.shape[1]
+        alpha = cho_solve(L, values)
+        nll += 0.5*np.sum(values*alpha) \
+             + nOutputs*np.sum(np.log(np.diag(L[0]))) \
+             + 0.5*nOutputs*X.shape[0]*np.log(2.0*np.pi)
+
+        W = nOutputs*cho_solve(L, np.eye(X.shape[0])) - alpha @ alpha.T
+        WC = variances[c]*W*C
+        for d in range(len(lengthScales)):
+            grad[d] += 0.5*np.sum(WC*sqDists[:,:,d])
+        grad[len(lengthScales) + c] = 0.5*np.sum(WC)
+        grad[len(lengthScales) + nbChannels + c] = \
+            0.5*noiseVariances[c]*np.trace(W)
+    return nll, grad
+
+
+def optimize_kernel_parameters(trainLocations, trainValues, lengthScales,
+                               variance, noiseVariance, mean=0.0, wind=None,
+                               scaleFactor=10.0, maxIter=50):
+
+    """Marginal likelihood optimization of NephKernel/WindKernel parameters.
+
+    Is a module level function to be executed in a separate process.
+
+    Parameters
+    ----------
+    trainLocations : numpy.array (N x D)
+        Locations of the training samples.
+
+    trainValues : numpy.array (N x M)
+        Training values.
+
+    lengthScales, variance, noiseVariance :
+        Initial kernel parameters. If variance or noiseVariance is an array
+        (multi-output kernel, see GprKernel.channel_parameters), one
+        variance and one noise variance are optimized per output channel.
+
+    mean : float or numpy.array (M)
+        Mean of the process (subtracted from training values).
+
+    wind : numpy.array (2) or None
+        Constant horizontal wind (for a WindKernel).
+
+    scaleFactor : float
+        Parameters are searched between initial value / scaleFactor and
+        initial value * scaleFactor.
+
+    maxIter : int
+        Maximum number of optimizer iterations.
+
+    Returns
+    -------
+    dict
+        Optimized 'lengthScales', 'variance' and 'noiseVariance' (lists if
+        optimized per channel), and 'initialNll', 'nll' (negative log
+        marginal likelihoods before and after optimization).
+    """
+    trainValues = np.array(trainValues, dtype=float).reshape(
+        trainLocations.shape[0], -1) - mean
+    perChannel = np.size(variance) > 1 or np.size(noiseVariance) > 1
+    nbChannels = trainValues.shape[1] if perChannel else 1
+    variances      = np.broadcast_to(np.asarray(variance, dtype=float).ravel(),
+                                     (nbChannels,))
+    noiseVariances = np.broadcast_to(np.asarray(noiseVariance,
+                                     dtype=float).ravel(), (nbChannels,))
+    theta0 = np.log(np.concatenate([np.array(lengthScales, dtype=float),
+                                    variances, noiseVariances]))
+    bounds = [(t - np.log(scaleFactor), t + np.log(scaleFactor))
+              for t in theta0]
+
+    initialNll, _ = negative_log_marginal_likelihood(theta0, trainLocations,
+                                                     trainValues, wind,
+                                                     nbChannels)
+    res = minimize(negative_log_marginal_likelihood, theta0,
+                   args=(trainLocations, trainValues, wind, nbChannels),
+                   jac=True, method='L-BFGS-B', bounds=bounds,
+                   options={'maxiter':maxIter})
+    params = np.exp(res.x)
+    variances      = params[-2*nbChannels:-nbChannels]
+    noiseVariances = params[-nbChannels:]
+    if not perChannel:
+        variances      = float(variances[0])
+        noiseVariances = float(noiseVariances[0])
+    else:
+        variances      = variances.tolist()
+        noiseVariances = noiseVariances.tolist()
+    return {'lengthScales'  : params[:-2*nbChannels].tolist(),
+            'variance'      : variances,
+            'noiseVariance' : noiseVariances,
+            'initialNll'    : float(initialNll),
+            'nll'           : float(res.fun)}
+
+
+class KernelOptimizer:
+
+    """
+    KernelOptimizer
+
+    Background hyperparameter optimization of the kernel of GprPredictor
+    instances.
+
+    Samples of a recent time window are fetched from the dataview of a
+    GprPredictor and the kernel parameters (length scales, variance and noise
+    variance) are fitted by maximizing the GPR marginal likelihood (with
+    analytic gradients) in a separate process. The tuned kernel is then
+    published atomically to the predictors (GprPredictor.set_kernel), so map
+    computations are never blocked by an optimization.
+
+    Attributes
+    ----------
+    predictors : list(nephelae.mapping.GprPredictor)
+        Predictors to which tuned kernels are published. Samples are fetched
+        from the dataview of the first one.
+
+    window : float
+        Length of the time window used for the optimization (in seconds).
+
+    period : float
+        Optimization period when started with self.start() (in seconds).
+
+    maxSamples : int
+        Maximum number of samples used in an optimization (evenly picked in
+        the window) to bound the O(N^3) cost of an iteration.
+
+    scaleFactor : float
+        Parameters are searched in [initial / scaleFactor,
+        initial * scaleFactor].
+
+    lastTime : float or None
+        Time of the last sample notified by the dataview. End of the window
+        used by self.submit by default.
+
+    lastResult : dict or None
+        Result of the last optimization (see optimize_kernel_parameters).
+
+    executor : concurrent.futures.Executor
+        Executor running the optimizations (a single process
+        ProcessPoolExecutor by default).
+    """
+
+    def __init__(self, gpr, window=600.0, period=60.0, maxSamples=500,
+                 scaleFactor=10.0, executor=None):
+
+        """
+        Parameters
+        ----------
+        gpr : nephelae.mapping.GprPredictor or list(GprPredictor,...)
+            Predictor(s) to be tuned. Samples are fetched from the dataview of
+            the first one.
+
+        window : float
+            Length of the time window used for optimization.
+
+        period : float
+            Optimization period when started with self.start().
+
+        maxSamples : int
+            Maximum number of samples used in an optimization.
+
+        scaleFactor : float
+            Bounds of the parameters search relative to initial values.
+
+        executor : concurrent.futures.Executor or None
+            Executor running the optimization. If None, a single process
+            ProcessPoolExecutor is created on first use.
+        """
+        if isinstance(gpr, (list, tuple)):
+            self.predictors = list(gpr)
+        else:
+            self.predictors = [gpr]
+        self.window      = window
+        self.period      = period
+        self.maxSamples  = maxSamples
+        self.scaleFactor = scaleFactor
+        self.executor    = executor
+        self.lastTime    = None
+        self.lastResult  = None
+        self.future      = None
+        self.running     = False
+        self.thread      = None
+        self.lock        = threading.Lock()
+
+        self.predictors[0].dataview.attach_observer(self)
+
+
+    def add_sample(self, sample):
+        """Callback called by the dataview on a new sample"""
+        if self.lastTime is None or sample.position.t > self.lastTime:
+            self.lastTime = sample.position.t
+
+
+    def submit(self, t1=None):
+
+        """Starts an optimization on the window [t1 - self.window, t1].
+
+        Returns immediately. Returns the concurrent.futures.Future of the
+        optimization, or None if an optimization is already running or if
+        there is no data.
+        """
+        with self.lock:
+            if self.future is not None and not self.future.done():
+                return None
+            if t1 is None:
+                t1 = self.lastTime
+            if t1 is None:
+                return None
+
+            gpr = self.predictors[0]
+            samples = gpr.fetch_samples([Bounds(t1 - self.window, t1),
+                Bounds(None, None), Bounds(None, None), Bounds(None, None)])
+            if samples is None:
+                return None
+            trainLocations, trainValues = samples
+            if trainLocations.shape[0] > self.maxSamples:
+                indexes = np.linspace(0, trainLocations.shape[0] - 1,
+                                      self.maxSamples).astype(int)
+                trainLocations = trainLocations[indexes]
+                trainValues    = trainValues[indexes]
+
+            kernel = gpr.kernel
+            wind = None
+            if hasattr(kernel, 'windMap'):
+                wind = np.array(kernel.windMap.get_wind(), dtype=float)
+
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=1)
+            self.future = self.executor.submit(optimize_kernel_parameters,
+                trainLocations, trainValues, kernel.lengthScales,
+                kernel.variance, kernel.noiseVariance,
+                getattr(kernel, 'mean', 0.0), wind, self.scaleFactor)
+            self.future.add_done_callback(self.publish)
+            return self.future
+
+
+    def publish(self, future):
+        """Publishes an optimization result to self.predictors"""
+        try:
+            result = future.result()
+        except Exception as e:
+            print("Warning : kernel optimization failed :", e)
+            return
+        self.lastResult = result
+        for gpr in self.predictors:
+            gpr.set_kernel(gpr.kernel.with_parameters(
+                lengthScales  = np.array(result['lengthScales']),
+                variance      = np.asarray(result['variance'])
+                                if isinstance(result['variance'], list)
+                                else result['variance'],
+                noiseVariance = np.asarray(result['noiseVariance'])
+                                if isinstance(result['noiseVariance'], list)
+                                else result['noiseVariance']))
+
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        self.thread.join()
+        self.thread = None
+
+
+    def run(self):
+        lastSubmit = 0.0
+        while self.running:
+            if time.time() - lastSubmit >= self.period:
+                if self.submit() is not None:
+                    lastSubmit = time.time()
+            time.sleep(0.1)
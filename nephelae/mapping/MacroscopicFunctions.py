@@ -1,7 +1,10 @@
 import numpy as np
 
 from nephelae.array import ScaledArray
+from nephelae.array import DimensionHelper
 from scipy import ndimage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 from nephelae.types import Bounds
 
@@ -42,18 +45,23 @@ def threshold_array(arr, threshold=2e-4):
     Returns
     ---------
     NumpyArray
-        Returns arr with binary values, depending of the threshold
+        Returns arr with binary values, depending of the threshold (arr can
+        be a stack of frames, see label_stack)
     """
     return (arr > threshold)
 
-def get_number_of_elements(scaledArr, threshold=2e-4):
+def get_number_of_elements(scaledArr, threshold=2e-4, connectivity=1):
     """
     Computes the number of elements displayed on a image, using a threshold.
 
     Parameters
     ---------
     scaledArr : ScaledArray
-        Contains the data of interest
+        Contains the data of interest (2D, 3D or 4D)
+    connectivity : int
+        Pixels are connected if they are at most connectivity dimensions
+        apart (see scipy.ndimage.generate_binary_structure). 1 connects
+        faces only, scaledArr.data.ndim connects faces, edges and corners.
     
     Returns
     ---------
@@ -62,7 +70,8 @@ def get_number_of_elements(scaledArr, threshold=2e-4):
         array labeled associated to the data.
     """
     arr = (scaledArr.data > threshold) * scaledArr.data
-    return ndimage.measurements.label(arr)
+    return ndimage.measurements.label(arr,
+        ndimage.generate_binary_structure(arr.ndim, connectivity))
 
 def compute_selected_element_com(coords, scaledArr, threshold):
     """
@@ -84,12 +93,8 @@ def compute_selected_element_com(coords, scaledArr, threshold):
     data_labeled, number_of_elements = get_number_of_elements(scaledArr,
             threshold)
     if is_in_element(coords, data_labeled):
-        out = np.where(data_labeled == data_labeled[coords])
-        locations = np.array([X for X in out])
-        indices = tuple(np.array(locations[i]) for i in
-                range(locations.shape[0]))
-        data = scaledArr.data[indices].ravel()
-        center_of_mass = np.sum(locations*data, axis=1)/np.sum(data)
+        center_of_mass = ndimage.center_of_mass(scaledArr.data, data_labeled,
+                data_labeled[coords])
         res = scaledArr.dimHelper.to_unit(center_of_mass)
     return res
 
@@ -116,8 +121,7 @@ def compute_selected_element_volume(coords, scaledArr, threshold=2e-4):
     data_labeled, number_of_elements = get_number_of_elements(scaledArr,
             threshold)
     if is_in_element(coords, data_labeled):
-        out = np.where(data_labeled == data_labeled[coords])
-        res = len(out[0])
+        res = int(np.count_nonzero(data_labeled == data_labeled[coords]))
     return res
 
 def compute_list_of_coms(scaledArr, threshold):
@@ -136,19 +140,8 @@ def compute_list_of_coms(scaledArr, threshold):
         Returns all tuples of coordinates of all the elements displayed on the
         map
     """
-    data_labeled, number_of_elements = get_number_of_elements(scaledArr,
-            threshold)
-    list_of_coms = []
-    for i in range(1, number_of_elements+1):
-        out = np.where(data_labeled == i)
-        locations = np.array([X for X in out])
-        indices = tuple(np.array(locations[i]) for i in
-                range(locations.shape[0]))
-        data = scaledArr.data[indices].ravel()
-        center_of_mass = np.sum(locations*data, axis=1)/np.sum(data)
-        res = scaledArr.dimHelper.to_unit(center_of_mass)
-        list_of_coms.append(res)
-    return list_of_coms
+    features = compute_cloud_features(scaledArr, threshold)
+    return [tuple(com) for com in features['com'].tolist()]
 
 def compute_cross_section_border(scaledArr_data, scaledArr_std, factor=1,
         threshold=2e-4):
@@ -178,6 +171,216 @@ def compute_cross_section_border(scaledArr_data, scaledArr_std, factor=1,
             scaledArr_std.data)
     return inner_border, outer_border
 
+def compute_border_masks(data, std=None, threshold=2e-4, factor=1):
+    """
+    Computes the raw, inner and outer borders of the elements of an array in
+    a single morphological pass, on boolean arrays.
+
+    The inner (data - factor*std > threshold), raw (data > threshold) and
+    outer (data + factor*std > threshold) masks are nested (std >= 0), so
+    they are the threshold sets of a single level array (number of masks a
+    pixel belongs to). The erosion of each mask is a threshold set of the
+    grey erosion of the level array, and the three borders (mask minus its
+    erosion) are obtained with a single grey erosion instead of one binary
+    erosion per mask. Erosion uses the same structuring element and border
+    condition than ndimage.binary_erosion (faces connectivity, outside of
+    the array is empty).
+
+    Parameters
+    ---------
+    data : NumpyArray
+        Values of the map.
+    std : NumpyArray or None
+        Standard deviation of the map values. If None, only the raw border
+        is computed.
+    threshold : number
+        Values above threshold are part of an element.
+    factor : number
+        Gives the confidence of the std (see compute_cross_section_border).
+
+    Returns
+    ---------
+    NumpyArray (bool) or (NumpyArray, NumpyArray, NumpyArray)
+        Raw border if std is None, (inner, raw, outer) borders otherwise.
+    """
+    levels = (data > threshold).view(np.uint8)
+    if std is not None:
+        levels = levels + (data - factor*std > threshold) \
+                        + (data + factor*std > threshold)
+    eroded = ndimage.grey_erosion(levels,
+        footprint=ndimage.generate_binary_structure(levels.ndim, 1),
+        mode='constant', cval=0)
+    if std is None:
+        return (levels > 0) & (eroded < 1)
+    return tuple((levels >= k) & (eroded < k) for k in (3, 2, 1))
+
+# Marching squares lookup table : edges crossed by the contour for each cell
+# configuration (bit 0 to 3 set if corner (i,j), (i+1,j), (i+1,j+1), (i,j+1)
+# is above level). Edges : 0 (i,j)-(i+1,j), 1 (i+1,j)-(i+1,j+1),
+# 2 (i,j+1)-(i+1,j+1), 3 (i,j)-(i,j+1). Saddle configurations 5 and 10 use
+# entries 16 and 17 when the cell center is above level.
+_marchingSegments = np.array([
+    [[-1,-1],[-1,-1]], [[ 0, 3],[-1,-1]], [[ 0, 1],[-1,-1]], [[ 1, 3],[-1,-1]],
+    [[ 1, 2],[-1,-1]], [[ 0, 3],[ 1, 2]], [[ 0, 2],[-1,-1]], [[ 2, 3],[-1,-1]],
+    [[ 2, 3],[-1,-1]], [[ 0, 2],[-1,-1]], [[ 0, 1],[ 2, 3]], [[ 1, 2],[-1,-1]],
+    [[ 1, 3],[-1,-1]], [[ 0, 1],[-1,-1]], [[ 0, 3],[-1,-1]], [[-1,-1],[-1,-1]],
+    [[ 0, 1],[ 2, 3]], [[ 0, 3],[ 1, 2]]])
+
+def marching_squares(data, level):
+    """
+    Vectorized marching squares : level crossings of the contour of a 2D
+    array, as line segments in (fractional) array indexes, with the index
+    of the grid edge crossed by each segment end point (an edge is shared
+    by at most two segments, see compute_contours).
+
+    Returns
+    ---------
+    (NumpyArray (S x 2 x 2), NumpyArray (int, S x 2))
+        Segments end points ((i0,j0),(i1,j1)) and crossed edges indexes.
+    """
+    if data.ndim != 2:
+        raise ValueError("Contours can only be computed on 2D arrays.")
+    a = data[:-1,:-1]
+    b = data[1:,:-1]
+    c = data[1:,1:]
+    d = data[:-1,1:]
+    cases = (a > level) + 2*(b > level) + 4*(c > level) + 8*(d > level)
+    saddles = (cases == 5) | (cases == 10)
+    if np.any(saddles):
+        center = 0.25*(a + b + c + d) > level
+        cases[saddles & center & (cases == 5)]  = 16
+        cases[saddles & center & (cases == 10)] = 17
+    cells = np.nonzero((cases != 0) & (cases != 15))
+    if len(cells[0]) == 0:
+        return np.empty((0,2,2)), np.empty((0,2), dtype=int)
+
+    i, j = [idx.astype(float) for idx in cells]
+    a, b, c, d = a[cells], b[cells], c[cells], d[cells]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Position of the level crossing on each edge (only used on crossed
+        # edges, where the two corner values differ).
+        edges = np.stack([
+            np.stack([i + (level - a) / (b - a), j], axis=-1),
+            np.stack([i + 1.0, j + (level - b) / (c - b)], axis=-1),
+            np.stack([i + (level - d) / (c - d), j + 1.0], axis=-1),
+            np.stack([i, j + (level - a) / (d - a)], axis=-1)], axis=1)
+    # Grid edges along i are numbered i*ny + j, grid edges along j are
+    # numbered nx*ny + i*ny + j.
+    nx, ny = data.shape
+    first = cells[0]*ny + cells[1]
+    edgeIds = np.stack([first, nx*ny + first + ny, first + 1, nx*ny + first],
+                       axis=1)
+
+    segments = []
+    ids      = []
+    table = _marchingSegments[cases[cells]]
+    for slot in range(2):
+        selected = np.nonzero(table[:,slot,0] >= 0)[0]
+        segments.append(np.stack([
+            edges[selected, table[selected,slot,0]],
+            edges[selected, table[selected,slot,1]]], axis=1))
+        ids.append(np.stack([
+            edgeIds[selected, table[selected,slot,0]],
+            edgeIds[selected, table[selected,slot,1]]], axis=1))
+    return np.concatenate(segments), np.concatenate(ids)
+
+def compute_contour_segments(data, level, dimHelper=None):
+    """
+    Contour of a 2D array at level, as a set of unconnected line segments
+    (see marching_squares). compute_contours gives the same contour as
+    polylines, which are about four times lighter.
+
+    Parameters
+    ---------
+    data : NumpyArray (2D)
+        Values of the map.
+    level : number
+        Contour level (for example the cloud threshold).
+    dimHelper : DimensionHelper or None
+        If not None, segments are given in map units. Otherwise they are
+        given as (fractional) array indexes.
+
+    Returns
+    ---------
+    NumpyArray (S x 2 x 2)
+        Segments end points ((x0,y0),(x1,y1)).
+    """
+    segments = marching_squares(data, level)[0]
+    if dimHelper is not None and len(segments) > 0:
+        segments = dimHelper.to_unit_array(
+            segments.reshape(-1,2)).reshape(segments.shape)
+    return segments
+
+def compute_contours(data, level, dimHelper=None):
+    """
+    Contour of a 2D array at level, as polylines (much lighter to transfer
+    and display than a raster border mask).
+
+    The segments given by marching_squares are linked through the grid
+    edges they share, so each vertex is stored once (the first vertex of a
+    closed polyline is repeated at its end). Polylines which are not closed
+    end on the border of the array.
+
+    Parameters
+    ---------
+    data : NumpyArray (2D)
+        Values of the map.
+    level : number
+        Contour level (for example the cloud threshold).
+    dimHelper : DimensionHelper or None
+        If not None, vertices are given in map units. Otherwise they are
+        given as (fractional) array indexes.
+
+    Returns
+    ---------
+    list(NumpyArray (float32, P x 2))
+        Vertices of each polyline.
+    """
+    segments, ids = marching_squares(data, level)
+    if len(segments) == 0:
+        return []
+    ids, nodes = np.unique(ids, return_inverse=True)
+    nodes = nodes.reshape(-1, 2)
+    vertices = np.empty((len(ids), 2))
+    vertices[nodes.ravel()] = segments.reshape(-1, 2)
+    if dimHelper is not None:
+        vertices = dimHelper.to_unit_array(vertices)
+    vertices = vertices.astype(np.float32)
+
+    # Segments incident to each vertex (at most 2, -1 if none).
+    incident = np.full((len(ids), 2), -1)
+    order = np.argsort(nodes.ravel(), kind='stable')
+    sortedNodes = nodes.ravel()[order]
+    isSecond = np.zeros(len(order), dtype=bool)
+    isSecond[1:] = sortedNodes[1:] == sortedNodes[:-1]
+    incident[sortedNodes, isSecond.astype(int)] = order // 2
+
+    # The walk is sequential : done on python lists (much faster than
+    # numpy scalar indexing).
+    nodeList     = nodes.tolist()
+    incidentList = incident.tolist()
+    used = [False]*len(nodeList)
+    def walk(node, segment):
+        path = [node]
+        while segment >= 0 and not used[segment]:
+            used[segment] = True
+            n0, n1 = nodeList[segment]
+            node = n1 if n0 == node else n0
+            path.append(node)
+            i0, i1 = incidentList[node]
+            segment = i1 if i0 == segment else i0
+        return vertices[path]
+
+    polylines = []
+    # Open polylines first (starting on the array border), then loops.
+    for node in np.nonzero(incident[:,1] < 0)[0].tolist():
+        if not used[incidentList[node][0]]:
+            polylines.append(walk(node, incidentList[node][0]))
+    for segment in range(len(nodeList)):
+        if not used[segment]:
+            polylines.append(walk(nodeList[segment][0], segment))
+    return polylines
+
 def compute_bounding_box(scaledArr, threshold):
     """
     Computes the bounds where an element is spotted. Returns the list of bounds
@@ -194,18 +397,567 @@ def compute_bounding_box(scaledArr, threshold):
         The list of bounds of elements in the ScaledArray.
         The length of the list is equal to number_of_elements.
     """
+    features = compute_cloud_features(scaledArr, threshold)
+    return [[Bounds(m, M) for m, M in zip(mins, maxs)] for mins, maxs in
+            zip(features['boxMin'].tolist(), features['boxMax'].tolist())]
+
+def cloud_features_dtype(nbDims):
+    """
+    numpy dtype of the arrays returned by compute_cloud_features.
+    """
+    return np.dtype([('label',      np.int64),
+                     ('volume',     np.int64),
+                     ('com',        np.float64, (nbDims,)),
+                     ('boxMin',     np.float64, (nbDims,)),
+                     ('boxMax',     np.float64, (nbDims,)),
+                     ('totalValue', np.float64),
+                     ('maxValue',   np.float64),
+                     ('base',       np.float64),
+                     ('top',        np.float64)])
+
+def compute_label_features(data, data_labeled, number_of_elements,
+        dimHelper=None, objects=None, altitudeDim=None):
+    """
+    Computes the features of all the labeled elements of an array in a
+    single pass over the array (no per-element scan of the whole array).
+
+    Parameters
+    ---------
+    data : NumpyArray
+        Values of the array (used as weights for the centers of mass).
+    data_labeled : NumpyArray (int)
+        Labels of the elements (0 is the background), as returned by
+        ndimage.label.
+    number_of_elements : int
+        Number of labels.
+    dimHelper : DimensionHelper or None
+        If not None, centers of mass and bounding boxes are converted to
+        units. Otherwise they are given as array indexes.
+    objects : list(tuple(slice,...)) or None
+        Result of ndimage.find_objects(data_labeled) if already computed.
+    altitudeDim : int or None
+        Index of the altitude dimension in data (for example 2 for a (x,y,z)
+        volume), used for cloud base and top. None if data has no altitude
+        dimension.
+
+    Returns
+    ---------
+    NumpyArray (structured, see cloud_features_dtype)
+        One element per label, with fields 'label', 'volume' (number of
+        pixels), 'com' (center of mass weighted by data), 'boxMin' and
+        'boxMax' (bounding box), 'totalValue' (sum of data), 'maxValue'
+        (max of data), 'base' and 'top' (altitude bounds, NaN if
+        altitudeDim is None).
+    """
+    nbDims = data.ndim
+    res = np.zeros(number_of_elements, dtype=cloud_features_dtype(nbDims))
+    if number_of_elements == 0:
+        return res
+
+    # Only labeled pixels are read (ndimage.maximum would sort the whole
+    # array, and stacks of frames are mostly background).
+    pixels  = np.flatnonzero(data_labeled)
+    labels  = data_labeled.ravel()[pixels]
+    weights = data.ravel()[pixels]
+    nbBins  = number_of_elements + 1
+    res['label']      = np.arange(1, nbBins)
+    res['volume']     = np.bincount(labels, minlength=nbBins)[1:]
+    res['totalValue'] = np.bincount(labels, weights=weights,
+                                    minlength=nbBins)[1:]
+    maxValue = np.full(nbBins, -np.inf)
+    np.maximum.at(maxValue, labels, weights)
+    res['maxValue']   = maxValue[1:]
+
+    total = np.where(res['totalValue'] != 0, res['totalValue'], 1.0)
+    com = np.empty((number_of_elements, nbDims))
+    coordinates = np.unravel_index(pixels, data.shape)
+    for d, coordinate in enumerate(coordinates):
+        com[:,d] = np.bincount(labels, weights=weights*coordinate,
+                               minlength=nbBins)[1:] / total
+
+    if objects is None:
+        boxMin, boxMax = label_bounding_boxes(labels, coordinates, nbBins)
+    else:
+        boxMin = np.array([[s.start for s in obj] for obj in objects],
+                          dtype=float)
+        boxMax = np.array([[s.stop - 1 for s in obj] for obj in objects],
+                          dtype=float)
+
+    if dimHelper is not None:
+        com    = dimHelper.to_unit_array(com)
+        boxMin = dimHelper.to_unit_array(boxMin)
+        boxMax = dimHelper.to_unit_array(boxMax)
+    res['com']    = com
+    res['boxMin'] = boxMin
+    res['boxMax'] = boxMax
+    set_base_and_top(res, altitudeDim)
+    return res
+
+def label_bounding_boxes(labels, coordinates, nbBins):
+    """
+    Bounding boxes (min and max array indexes) of labels given the labels
+    and the array indexes of the labeled pixels (unbuffered ufunc.at
+    reductions, no python loop over the labels as with
+    ndimage.find_objects).
+    """
+    boxMin = np.empty((nbBins - 1, len(coordinates)))
+    boxMax = np.empty((nbBins - 1, len(coordinates)))
+    for d, coordinate in enumerate(coordinates):
+        mins = np.full(nbBins, np.iinfo(np.int64).max)
+        maxs = np.full(nbBins, -1)
+        np.minimum.at(mins, labels, coordinate)
+        np.maximum.at(maxs, labels, coordinate)
+        boxMin[:,d] = mins[1:]
+        boxMax[:,d] = maxs[1:]
+    return boxMin, boxMax
+
+def set_base_and_top(features, altitudeDim):
+    """
+    Fills the 'base' and 'top' fields of cloud features from their bounding
+    boxes (NaN if altitudeDim is None).
+    """
+    if altitudeDim is None:
+        features['base'] = np.nan
+        features['top']  = np.nan
+    else:
+        features['base'] = features['boxMin'][:,altitudeDim]
+        features['top']  = features['boxMax'][:,altitudeDim]
+
+def compute_cloud_features(scaledArr, threshold=2e-4, connectivity=1,
+        altitudeDim=None):
+    """
+    Labels the elements of a ScaledArray above threshold and computes all
+    their features at once (see compute_label_features).
+
+    Parameters
+    ---------
+    scaledArr : ScaledArray
+        Contains the data of interest
+    threshold : number
+        Values above threshold are part of an element.
+    connectivity : int
+        See get_number_of_elements.
+    altitudeDim : int or None
+        Index of the altitude dimension in scaledArr (see
+        compute_label_features).
+
+    Returns
+    ---------
+    NumpyArray (structured, see cloud_features_dtype)
+        One element per cloud, with center of mass and bounding box in map
+        coordinates.
+    """
     data_labeled, number_of_elements = get_number_of_elements(scaledArr,
-            threshold)
-    list_of_boxes = []
-    for i in range(1, number_of_elements+1):
-        out = np.where(data_labeled == i)
-        locations = np.array([X for X in out])
-        mins = scaledArr.dimHelper.to_unit(np.amin(locations, axis=1).tolist())
-        maxs = scaledArr.dimHelper.to_unit(np.amax(locations, axis=1).tolist())
-        list_of_boxes.append([Bounds(mins[i], maxs[i]) for i in
-            range(len(mins))])
-    return list_of_boxes
-    
+            threshold, connectivity)
+    return compute_label_features(scaledArr.data, data_labeled,
+            number_of_elements, scaledArr.dimHelper, altitudeDim=altitudeDim)
+
+def label_stack(data, threshold=2e-4, connectivity=1, spaceTime=False):
+    """
+    Thresholds and labels a stack of frames (first dimension is the frame
+    index, for example a (T,X,Y) array) in a single call to ndimage.label.
+
+    Parameters
+    ---------
+    data : NumpyArray
+        Stack of frames.
+    threshold : number
+        Values above threshold are part of an element.
+    connectivity : int
+        Connectivity inside a frame (see get_number_of_elements). In space
+        time mode, frames are connected through their common faces only.
+    spaceTime : bool
+        If False, each frame is labeled independently (the structuring
+        element has no extent along the frame dimension). Labels are then
+        unique over the stack and ordered by frame. If True, the stack is
+        labeled as a single space time volume (an element persisting over
+        several frames gets a single label).
+
+    Returns
+    ---------
+    NdArray, Number :
+        Labeled stack and number of labels.
+    """
+    structure = np.zeros((3,)*data.ndim, dtype=bool)
+    structure[1] = ndimage.generate_binary_structure(data.ndim - 1,
+                                                     connectivity)
+    if spaceTime:
+        structure[(0,) + (1,)*(data.ndim - 1)] = True
+        structure[(2,) + (1,)*(data.ndim - 1)] = True
+    return ndimage.label(threshold_array(data, threshold), structure)
+
+def stack_features_dtype(nbDims):
+    """
+    numpy dtype of the arrays returned by compute_stack_features (fields of
+    cloud_features_dtype with the frame range of each element).
+    """
+    return np.dtype(cloud_features_dtype(nbDims).descr +
+                    [('firstFrame', np.int64), ('lastFrame', np.int64)])
+
+def compute_stack_features(stackArr, threshold=2e-4, connectivity=1,
+        spaceTime=False, altitudeDim=None):
+    """
+    Labels the elements of a stack of frames and computes the features of
+    all of them at once, without looping over the frames (see label_stack
+    and compute_label_features).
+
+    Parameters
+    ---------
+    stackArr : ScaledArray
+        Stack of frames on the same grid, the first dimension being time
+        (for example a (T,X,Y) array).
+    threshold : number
+        Values above threshold are part of an element.
+    connectivity, spaceTime :
+        See label_stack.
+    altitudeDim : int or None
+        Index of the altitude dimension in stackArr (see
+        compute_label_features).
+
+    Returns
+    ---------
+    NumpyArray (structured, see stack_features_dtype)
+        One element per label, with the frame range of the element
+        ('firstFrame' and 'lastFrame', equal if spaceTime is False). Center
+        of mass and bounding box include the time dimension (index 0).
+        If spaceTime is False, elements are sorted by frame and the features
+        of frame i are features[offsets[i]:offsets[i+1]] with
+        offsets = np.searchsorted(features['firstFrame'], np.arange(T + 1)).
+    """
+    data_labeled, number_of_elements = label_stack(stackArr.data,
+            threshold, connectivity, spaceTime)
+    features = compute_label_features(stackArr.data, data_labeled,
+            number_of_elements, stackArr.dimHelper, altitudeDim=altitudeDim)
+
+    res = np.empty(number_of_elements,
+                   dtype=stack_features_dtype(stackArr.data.ndim))
+    for name in features.dtype.names:
+        res[name] = features[name]
+    if spaceTime:
+        pixels = np.flatnonzero(data_labeled)
+        frames = np.unravel_index(pixels, data_labeled.shape)[0]
+        firstFrame, lastFrame = label_bounding_boxes(
+            data_labeled.ravel()[pixels], (frames,), number_of_elements + 1)
+        res['firstFrame'] = firstFrame[:,0]
+        res['lastFrame']  = lastFrame[:,0]
+    else:
+        # Labels are ordered by frame : number of labels up to each frame.
+        frameCounts = np.max(data_labeled.reshape(data_labeled.shape[0], -1),
+                             axis=1)
+        frameCounts = np.maximum.accumulate(frameCounts)
+        res['firstFrame'] = np.searchsorted(frameCounts, res['label'])
+        res['lastFrame']  = res['firstFrame']
+    return res
+
+def compute_cloud_metrics_adaptive(gpr, keys, threshold=2e-4, levels=3):
+    """
+    Computes the volume (or area), total value and center of mass of the
+    cloud in a region directly from the GPR posterior, without computing
+    the dense map at the kernel resolution.
+
+    The region is sampled on the same grid as a map request
+    (see MapInterface.compute_locations) and the GPR is fitted once on the
+    region. Grid nodes are first grouped in coarse cells of 2**levels nodes
+    along each dimension (cells on the region border are truncated), where
+    the posterior mean is evaluated at the cell center. As for
+    a border mask, a cell whose status (above threshold or not) differs
+    from one of its face neighbours is a border cell. Only border cells are
+    split in 2**D children evaluated at the next level, until cells are
+    single nodes. Other cells are accounted for with their number of nodes
+    and the value at their center. The number of evaluations then mostly
+    depends on the length of the cloud border instead of the size of the
+    region. With levels=0, all nodes are evaluated and the metrics are the
+    ones of the dense map.
+
+    /!\ Cloud parts smaller than a coarse cell and not touching a border
+    cell may be missed. levels must be chosen so that coarse cells are
+    small compared to the tracked cloud.
+
+    Parameters
+    ---------
+    gpr : GprPredictor
+        Estimator of the map (see GprPredictor.fit_region).
+    keys : tuple(float or slice,...)
+        Region of interest (t,x,y,z), like for a map request (for example a
+        box around a tracked cloud).
+    threshold : number
+        Values above threshold are part of the cloud.
+    levels : int
+        Number of refinement levels.
+
+    Returns
+    ---------
+    dict
+        'volume' (area or volume in map units), 'nbPixels' (volume in grid
+        nodes), 'totalValue' (integral of the values in the cloud, in value
+        x map units), 'com' (center of mass in the sliced dimensions, None
+        if no cloud), 'nbEvaluations' (number of posterior evaluations) and
+        'denseEvaluations' (number of nodes of the dense map of the region).
+    """
+    sliced = [i for i, k in enumerate(keys) if isinstance(k, slice)]
+    nbDims = len(sliced)
+    starts = np.array([keys[i].start for i in sliced], dtype=float)
+    sizes  = np.empty(nbDims, dtype=int)
+    steps  = np.empty(nbDims)
+    resolution = gpr.resolution()
+    for d, i in enumerate(sliced):
+        sizes[d], steps[d] = gpr.slice_grid(keys[i], resolution[i])
+    sizes = np.maximum(sizes, 1)
+    pixelMeasure = np.prod(np.where(steps > 0.0, steps,
+                                    np.asarray(resolution, dtype=float)[sliced]))
+
+    fixed = np.array([k.start if isinstance(k, slice) else k for k in keys],
+                     dtype=float)
+    locBounds = gpr.location_bounds(np.array([
+        [k.start if isinstance(k, slice) else k for k in keys],
+        [k.stop  if isinstance(k, slice) else k for k in keys]],
+        dtype=float))
+    gprProc = gpr.fit_region(locBounds)
+
+    def evaluate(nodes):
+        # nodes : (fractional) indexes in the grid of the region
+        if gprProc is None:
+            return np.full(nodes.shape[0], float(np.ravel(gpr.kernel.mean)[0]))
+        locations = np.tile(fixed, (nodes.shape[0], 1))
+        locations[:,sliced] = starts + nodes*steps
+        return np.asarray(gprProc.predict(locations)).reshape(
+            nodes.shape[0], -1)[:,0]
+
+    nbPixels = 0
+    total    = 0.0
+    moment   = np.zeros(nbDims)
+
+    cellSize = 2**levels
+    shape  = -(-sizes // cellSize)
+    cells  = np.stack([a.ravel() for a in np.meshgrid(
+        *[np.arange(n) for n in shape], indexing='ij')], axis=-1)
+    above  = np.zeros(shape, dtype=bool)
+    nbEvaluations = 0
+    children = np.array(np.meshgrid(*[[0, 1]]*nbDims,
+                                    indexing='ij')).reshape(nbDims, -1).T
+    for level in range(levels, -1, -1):
+        # Grid nodes covered by each cell (truncated on the region border)
+        first = cells*cellSize
+        last  = np.minimum(first + cellSize, sizes) - 1
+        centers = 0.5*(first + last)
+        values = evaluate(centers)
+        nbEvaluations += len(values)
+        status = values > threshold
+        above[tuple(cells.T)] = status
+
+        # Border cells : status differs from a face neighbour (neighbours
+        # not evaluated at this level have the status of their parent).
+        mixed = np.zeros(len(cells), dtype=bool)
+        if level > 0:
+            for d in range(nbDims):
+                for offset in (-1, 1):
+                    neighbours = cells.copy()
+                    neighbours[:,d] += offset
+                    valid = (neighbours[:,d] >= 0) & (neighbours[:,d] < shape[d])
+                    mixed[valid] |= \
+                        above[tuple(neighbours[valid].T)] != status[valid]
+
+        selection = status & ~mixed
+        counts  = np.prod(last - first + 1, axis=1)[selection]
+        weights = counts*values[selection]
+        nbPixels += int(np.sum(counts))
+        total    += np.sum(weights)
+        moment   += np.sum(weights[:,np.newaxis]*centers[selection], axis=0)
+        if level == 0:
+            break
+
+        # Splitting border cells into 2**D children
+        cellSize //= 2
+        shape = -(-sizes // cellSize)
+        for d in range(nbDims):
+            above = np.repeat(above, 2, axis=d)
+        above = above[tuple(slice(0, n) for n in shape)]
+        cells = (2*cells[mixed][:,np.newaxis,:] + children).reshape(-1, nbDims)
+        cells = cells[np.all(cells < shape, axis=1)]
+
+    return {'volume'           : nbPixels*pixelMeasure,
+            'nbPixels'         : nbPixels,
+            'totalValue'       : total*pixelMeasure,
+            'com'              : tuple(starts + steps*moment / total)
+                                 if total > 0.0 else None,
+            'nbEvaluations'    : nbEvaluations,
+            'denseEvaluations' : int(np.prod(sizes))}
+
+def map_chunks(map, keys, axis, chunkSpan):
+    """
+    Generator of the successive slabs of a map slice along one dimension.
+    Only one slab is computed at a time.
+
+    Slabs are cut at grid indexes of the whole slice (as computed by
+    map.compute_locations), so they partition the samples of map[keys]
+    exactly. (Requesting each slab with its own keys would give slab grids
+    which are not sub-grids of the whole slice). Slab values are computed
+    with map.at_locations.
+
+    Parameters
+    ---------
+    map : MapInterface
+        Map to request slabs from.
+    keys : tuple(float or slice,...)
+        Keys of the whole slice (like for map.__getitem__).
+    axis : int
+        Index of the chunked dimension in keys (must be a slice).
+    chunkSpan : float
+        Size of a slab along axis (in map units, at least two grid steps).
+
+    Returns
+    ---------
+    Generator of ScaledArray
+    """
+    axes = []
+    for key, res in zip(keys, map.resolution()):
+        if isinstance(key, slice):
+            size, step = map.slice_grid(key, res)
+            axes.append(key.start + step*np.arange(size))
+        else:
+            axes.append(np.array([key], dtype=float))
+
+    planes = axes[axis]
+    step = planes[1] - planes[0] if len(planes) > 1 else 0.0
+    nbPlanes = max(int(chunkSpan / step + 0.5) if step > 0.0 else 0, 2)
+    first = 0
+    while first < len(planes):
+        last = min(first + nbPlanes, len(planes))
+        if len(planes) - last < 2:
+            # Remainder too thin to be a slab : merged in this one.
+            last = len(planes)
+        chunkAxes = list(axes)
+        chunkAxes[axis] = planes[first:last]
+        locations = np.stack([g.ravel() for g in
+                              np.meshgrid(*chunkAxes, indexing='ij')], axis=-1)
+        dims = DimensionHelper()
+        for key, a in zip(keys, chunkAxes):
+            if isinstance(key, slice):
+                dims.add_dimension([a[0], a[-1]], 'linear', len(a))
+        shape = tuple(len(a) for a in chunkAxes)
+        yield map.compute_scaled_array(shape,
+            np.asarray(map.at_locations(locations)), dims)
+        first = last
+
+def boundary_label_pairs(previous, current, axis, connectivity):
+    """
+    Pairs of labels of two adjacent planes (last plane of a slab and first
+    plane of the next slab along axis) which are connected.
+
+    Parameters
+    ---------
+    previous, current : NumpyArray (int)
+        Labels of the two planes (0 is the background).
+    axis : int
+        Axis along which the planes are stacked (in the full volume).
+    connectivity : int
+        See get_number_of_elements.
+
+    Returns
+    ---------
+    NumpyArray (P x 2)
+        Unique connected label pairs (previous, current).
+    """
+    structure = ndimage.generate_binary_structure(previous.ndim + 1,
+                                                  connectivity)
+    offsets = np.argwhere(np.take(structure, 2, axis=axis)) - 1
+    pairs = []
+    for offset in offsets:
+        src, dst = [], []
+        for size, o in zip(previous.shape, offset):
+            src.append(slice(max(0, -o), size - max(0, o)))
+            dst.append(slice(max(0, o), size - max(0, -o)))
+        p = previous[tuple(src)]
+        c = current[tuple(dst)]
+        both = (p > 0) & (c > 0)
+        pairs.append(np.stack([p[both], c[both]], axis=-1))
+    if len(pairs) == 0:
+        return np.empty((0,2), dtype=int)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+def compute_cloud_features_chunked(chunks, axis, threshold=2e-4,
+        connectivity=1, altitudeDim=None):
+    """
+    Computes the features of the clouds of a large volume processed slab by
+    slab, without materializing the whole volume.
+
+    Each slab is labeled independently and its cloud features are computed
+    in a single pass (see compute_label_features). Labels touching across
+    two successive slabs are then merged (connected components of the graph
+    of connected label pairs, equivalent to a union-find), and the features
+    of the merged clouds are aggregated (volumes and total values are added,
+    centers of mass are weighted by total values, bounding boxes and max
+    values are combined). Only the last plane of the previous slab is kept
+    in memory.
+
+    Parameters
+    ---------
+    chunks : iterable of ScaledArray
+        Successive slabs of the volume along axis (for example given by
+        map_chunks).
+    axis : int
+        Index of the chunked dimension in the slab arrays.
+    threshold : number
+        Values above threshold are part of an element.
+    connectivity : int
+        See get_number_of_elements.
+    altitudeDim : int or None
+        See compute_label_features.
+
+    Returns
+    ---------
+    NumpyArray (structured, see cloud_features_dtype)
+        One element per cloud of the whole volume.
+    """
+    chunkFeatures = []
+    edges         = []
+    lastPlane     = None
+    nbLabels      = 0
+    for chunk in chunks:
+        labeled, number_of_elements = get_number_of_elements(chunk, threshold,
+                                                             connectivity)
+        features = compute_label_features(chunk.data, labeled,
+            number_of_elements, chunk.dimHelper)
+        globalLabels = np.where(labeled > 0, labeled + nbLabels, 0)
+        if lastPlane is not None:
+            edges.append(boundary_label_pairs(lastPlane,
+                np.take(globalLabels, 0, axis=axis), axis, connectivity))
+        lastPlane = np.take(globalLabels, -1, axis=axis)
+        chunkFeatures.append(features)
+        nbLabels += number_of_elements
+
+    if nbLabels == 0:
+        return np.zeros(0, dtype=cloud_features_dtype(0 if lastPlane is None
+                                                      else lastPlane.ndim + 1))
+    features = np.concatenate(chunkFeatures)
+    edges = np.concatenate(edges) - 1 if len(edges) > 0 \
+            else np.empty((0,2), dtype=int)
+    graph = coo_matrix((np.ones(len(edges)), (edges[:,0], edges[:,1])),
+                       shape=(nbLabels, nbLabels))
+    number_of_elements, roots = connected_components(graph, directed=False)
+
+    res = np.zeros(number_of_elements,
+                   dtype=cloud_features_dtype(features['com'].shape[1]))
+    res['label']      = np.arange(1, number_of_elements + 1)
+    res['volume']     = np.bincount(roots, weights=features['volume'],
+                                    minlength=number_of_elements)
+    res['totalValue'] = np.bincount(roots, weights=features['totalValue'],
+                                    minlength=number_of_elements)
+    total = np.where(res['totalValue'] != 0, res['totalValue'], 1.0)
+    com = np.empty(res['com'].shape)
+    for d in range(com.shape[1]):
+        com[:,d] = np.bincount(roots,
+            weights=features['com'][:,d]*features['totalValue'],
+            minlength=number_of_elements) / total
+    res['com'] = com
+    for field, reduction, init in [('boxMin', np.minimum, np.inf),
+                                   ('boxMax', np.maximum, -np.inf),
+                                   ('maxValue', np.maximum, -np.inf)]:
+        merged = np.full(res[field].shape, init)
+        reduction.at(merged, roots, features[field])
+        res[field] = merged
+    set_base_and_top(res, altitudeDim)
+    return res
 
 def is_in_element(coords, data_labeled):
     """
@@ -0,0 +1,201 @@
+import threading
+from collections import OrderedDict, deque
+
+
+class MapCache:
+
+    """
+    MapCache
+
+    Bounded LRU (Least Recently Used) cache of computed maps.
+
+    Entries are keyed by normalized map keys (the keys given to a
+    MapInterface.__getitem__ method). Each entry also holds the bounds of the
+    region of space-time from which the map was computed (for a GprPredictor,
+    the region in which training samples were fetched). An entry is
+    invalidated only when a new sample is inserted inside these bounds.
+
+    Attributes
+    ----------
+    maxSize : int
+        Maximum number of entries kept in the cache. When full, the least
+        recently used entry is dropped.
+
+    tolerance : tuple(float,...) or None
+        If not None, a request is allowed to reuse an entry with keys
+        differing by less than tolerance[i] in each dimension i (both for
+        scalar keys and for slice bounds). Useful for tracking displays where
+        successive requests are nearly identical. If None, only exact keys
+        are reused.
+
+    entries : collections.OrderedDict({tuple:(any, list(Bounds))})
+        Cached data and their bounds, ordered from least to most recently
+        used.
+
+    version : int
+        Incremented at each call to self.invalidate. Used to avoid caching
+        data computed while new samples were being inserted.
+
+    lock : threading.Lock
+        Mutex protecting self.entries (invalidation is usually called from
+        another thread than the one requesting maps).
+
+    Methods
+    -------
+    normalize_keys(keys) -> tuple:
+        Returns a hashable version of keys.
+
+    get(keys) -> any or None:
+        Returns cached data or None if not in the cache.
+
+    insert(keys, data, bounds, version=None) -> None:
+        Inserts new data in the cache.
+
+    invalidate(location) -> None:
+        Removes all entries with bounds containing location.
+
+    clear() -> None:
+        Removes all entries.
+    """
+
+    def __init__(self, maxSize=16, tolerance=None, historySize=1024):
+
+        """
+        Parameters
+        ----------
+        maxSize : int
+            Maximum number of entries in the cache.
+
+        tolerance : tuple(float,...) or None
+            Tolerance used to match nearly identical keys (see class
+            documentation). If None only identical keys are matched.
+
+        historySize : int
+            Number of last invalidated locations kept in memory to check
+            if data being inserted was not invalidated during its
+            computation.
+        """
+        self.maxSize   = maxSize
+        self.tolerance = tolerance
+        self.entries   = OrderedDict()
+        self.version   = 0
+        self.history   = deque(maxlen=historySize)
+        self.lock      = threading.Lock()
+
+
+    def normalize_keys(keys):
+        """Returns a hashable tuple from keys (slices are replaced by
+        (start,stop) tuples and scalars are cast to float). None (open
+        slice bounds) is kept as is."""
+        def to_float(value):
+            return None if value is None else float(value)
+        res = []
+        for key in keys:
+            if isinstance(key, slice):
+                res.append((to_float(key.start), to_float(key.stop)))
+            else:
+                res.append(to_float(key))
+        return tuple(res)
+
+
+    def keys_match(self, keys0, keys1):
+        """Checks if two normalized keys are equal up to self.tolerance"""
+        if len(keys0) != len(keys1):
+            return False
+        def match(value0, value1, tol):
+            if value0 is None or value1 is None:
+                return value0 is value1
+            return abs(value0 - value1) <= tol
+        for key0, key1, tol in zip(keys0, keys1, self.tolerance):
+            if isinstance(key0, tuple) != isinstance(key1, tuple):
+                return False
+            if isinstance(key0, tuple):
+                if not match(key0[0], key1[0], tol) or \
+                   not match(key0[1], key1[1], tol):
+                    return False
+            elif not match(key0, key1, tol):
+                return False
+        return True
+
+
+    def get(self, keys):
+        """Returns data cached for keys, None if not in the cache."""
+        keys = MapCache.normalize_keys(keys)
+        with self.lock:
+            if keys not in self.entries and self.tolerance is not None:
+                for cachedKeys in reversed(self.entries):
+                    if self.keys_match(cachedKeys, keys):
+                        keys = cachedKeys
+                        break
+            if keys not in self.entries:
+                return None
+            self.entries.move_to_end(keys)
+            return self.entries[keys][0]
+
+
+    def insert(self, keys, data, bounds, version=None):
+
+        """Inserts data in the cache.
+
+        Parameters
+        ----------
+        keys : tuple(int,float,slice,...)
+            Keys of the map.
+
+        data : any
+            Data to be cached.
+
+        bounds : list(nephelae.types.Bounds,...)
+            Region of space-time from which the data was computed. A new
+            sample inserted inside these bounds will invalidate the entry.
+
+        version : int or None
+            Value of self.version when the computation of data started. If
+            an invalidation inside bounds occurred since then, the data is
+            not cached. Ignored if None.
+        """
+        keys = MapCache.normalize_keys(keys)
+        with self.lock:
+            if version is not None and version != self.version:
+                if not self.history or self.history[0][0] > version + 1:
+                    # Invalidation history is too short to decide. Not caching.
+                    return
+                for v, location in self.history:
+                    if v > version and MapCache.is_inside(location, bounds):
+                        return
+            self.entries[keys] = (data, bounds)
+            self.entries.move_to_end(keys)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+
+
+    def is_inside(location, bounds):
+        return all(b.min <= l <= b.max for l, b in zip(location, bounds))
+
+
+    def invalidate(self, location):
+        """Removes all entries with bounds containing location.
+
+        Parameters
+        ----------
+        location : iterable(float,...)
+            Location of the new sample (t,x,y,z).
+        """
+        with self.lock:
+            self.version = self.version + 1
+            self.history.append((self.version, tuple(location)))
+            for keys in [k for k, entry in self.entries.items()
+                         if MapCache.is_inside(location, entry[1])]:
+                del self.entries[keys]
+
+
+    def clear(self):
+        """Removes all entries"""
+        with self.lock:
+            self.version = self.version + 1
+            self.history.clear()
+            self.entries.clear()
+
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,5 +1,5 @@
 import numpy as np
-from PIL import Image
+from scipy import ndimage
 
 from nephelae.types import Bounds
 
@@ -14,9 +14,34 @@ class MapComparator:
 
     The typical use case is to compare a MesoNH map (data from a mesonh
     dataset) and a ValueMap (data estimated with Gaussian Process Regression).
+
+    Slices of self.map2 are resampled on the grid of self.map1 slices with
+    scipy.ndimage.map_coordinates (any number of dimensions). Resampling
+    coordinates only depend on the shapes of the two slices and are cached,
+    so comparing many slices of the same size (for example a whole time
+    series, see self.compare_many) only costs the interpolation.
+
+    Attributes
+    ----------
+    order : int
+        Spline interpolation order used for resampling (3 is bicubic).
+
+    coordinatesCache : dict({tuple:numpy.array})
+        Resampling coordinates keyed by (shape1, shape2).
+
+    Methods
+    -------
+    __getitem__(keys) -> (numpy.array, numpy.array, numpy.array):
+        Slices of both maps and slice of map2 resampled on map1 grid.
+
+    compare_many(keysList, threshold=None) -> dict:
+        Error metrics (RMSE, bias, IoU of thresholded clouds) over many
+        slices.
     """
 
-    def __init__(self, map1, map2):
+    maxCoordinates = 16
+
+    def __init__(self, map1, map2, order=3):
 
         """
         /!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\
@@ -25,8 +50,10 @@ class MapComparator:
         /!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\/!\
         """
 
-        self.map1 = map1
-        self.map2 = map2
+        self.map1  = map1
+        self.map2  = map2
+        self.order = order
+        self.coordinatesCache = {}
 
 
     def __getitem__(self, keys):
@@ -35,12 +62,25 @@ class MapComparator:
         This is the main function which will be called to compare maps. It
         outputs a dictionary with several fields useful for display and
         evaluation.
-
-        /!\ Only compatible for 2D slices for now
         """
         # Getting a reference map slice
         self.slice1 = self.map1.__getitem__(keys)
+        self.bounds = self.slice1.bounds
+        self.newKeys, self.externalBounds = self.aligned_keys(keys,
+                                                              self.slice1)
+        self.slice2 = self.map2.__getitem__(self.newKeys)
+        self.data2resampled = self.resample(self.slice2.data,
+                                            self.slice1.shape)
+        return self.slice1.data, self.slice2.data, self.data2resampled
+
 
+    def aligned_keys(self, keys, slice1):
+
+        """
+        Keys to request data from self.map2 matching slice1, and outer bounds
+        of slice1. Does not modify the comparator (can be used for many
+        slices, see self.compare_many).
+        """
         # In the case of a MesonhMap, the bounds of the output might slightly
         # differ from the requested ones because the underlying data sampling
         # might not match the requested keys. (keys value between voxels of the
@@ -48,7 +88,7 @@ class MapComparator:
         # match the MesoNH sampling.
         # /!\ The bounds given match the position of the center of border
         # voxels. More on that below
-        self.bounds = self.slice1.bounds
+        bounds = slice1.bounds
 
         # Here new keys are calculated to request data from self.map2. For the
         # data to be comparable, slice2 must be resampled to match the
@@ -58,40 +98,123 @@ class MapComparator:
         # aligned : self.map1 and self.map2 scales are related to the center of
         # the voxels. So slice2 must be requested in a way that slice1 and
         # slice2 outer border fall on the same position.
-
-        self.newKeys = []
+        newKeys        = []
+        externalBounds = []
         i = 0
-        for key in keys:
+        for key, res1 in zip(keys, self.map1.resolution()):
             if isinstance(key, slice):
-                self.newKeys.append(
-                    slice(self.bounds[i].min, self.bounds[i].max))
+                newKeys.append(slice(bounds[i].min, bounds[i].max))
+                externalBounds.append(Bounds(bounds[i].min - res1 / 2.0,
+                                             bounds[i].max + res1 / 2.0))
                 i = i + 1
             else:
-                self.newKeys.append(key)
+                newKeys.append(key)
+        return newKeys, externalBounds
 
-        self.externalBounds = []
-        i = 0
-        for key, res1 in zip(keys,self.map1.resolution()):
-            if isinstance(key, slice):
-                self.externalBounds.append(
-                    Bounds(self.bounds[i].min - res1 / 2.0,
-                           self.bounds[i].max + res1 / 2.0))
-                i = i + 1
 
-        self.slice2 = self.map2.__getitem__(self.newKeys)
+    def resampling_coordinates(self, shape1, shape2):
 
-        # This is the part that does not allow anything else than 2D slices
-        self.data2resampled = np.array(
-            Image.fromarray(self.slice2.data.T).resize(
-            self.slice1.shape, Image.BICUBIC)).T
+        """
+        Coordinates in an array of shape2 of the centers of the voxels of an
+        array of shape1 covering the same area (outer borders aligned, like
+        an image resize). Cached.
+        """
+        key = (tuple(shape1), tuple(shape2))
+        coordinates = self.coordinatesCache.get(key, None)
+        if coordinates is None:
+            axes = [(np.arange(n1) + 0.5)*(n2 / n1) - 0.5
+                    for n1, n2 in zip(shape1, shape2)]
+            coordinates = np.array(np.meshgrid(*axes, indexing='ij'))
+            if len(self.coordinatesCache) >= self.maxCoordinates:
+                self.coordinatesCache.clear()
+            self.coordinatesCache[key] = coordinates
+        return coordinates
+
+
+    def resample(self, data2, shape1):
+        """Resamples data2 on a grid of shape shape1 (N-D)."""
+        if data2.shape == tuple(shape1):
+            return data2
+        if data2.ndim != len(shape1):
+            raise ValueError("Cannot resample a {}D slice on a {}D grid".format(
+                             data2.ndim, len(shape1)))
+        return ndimage.map_coordinates(data2,
+            self.resampling_coordinates(shape1, data2.shape),
+            order=self.order, mode='nearest')
+
+
+    def compare_many(self, keysList, threshold=None):
+
+        """
+        Compares the two maps over many slices at once (for example the
+        same area over a whole time series).
+
+        Slices of self.map2 are computed in a single batch if self.map2 has
+        a get_many method (see ValueMap.get_many).
+
+        Parameters
+        ----------
+        keysList : list(tuple(float or slice,...))
+            Keys of the slices to compare.
+
+        threshold : float or None
+            Threshold defining clouds for the IoU metric (self.map1.threshold
+            if None).
+
+        Returns
+        -------
+        dict({str:numpy.array or float})
+            'rmse', 'bias' (mean of map2 - map1) and 'iou' (intersection over
+            union of the cloud masks, NaN if both masks are empty) for each
+            slice, and 'rmseTotal', 'biasTotal', 'iouTotal' over all slices.
+        """
+        if threshold is None:
+            threshold = self.map1.threshold
+
+        slices1 = [self.map1.__getitem__(keys) for keys in keysList]
+        keys2   = [self.aligned_keys(keys, s1)[0]
+                   for keys, s1 in zip(keysList, slices1)]
+        if hasattr(self.map2, 'get_many'):
+            slices2 = self.map2.get_many(keys2)
+        else:
+            slices2 = [self.map2.__getitem__(keys) for keys in keys2]
+
+        return self.compare_slices(slices1, slices2, threshold)
+
+
+    def compare_slices(self, slices1, slices2, threshold):
+        """Error metrics between slices of self.map1 and slices of self.map2
+        (see self.compare_many)."""
+        nbSlices = len(slices1)
+        squaredErrors = np.empty(nbSlices)
+        errors        = np.empty(nbSlices)
+        sizes         = np.empty(nbSlices)
+        intersections = np.empty(nbSlices)
+        unions        = np.empty(nbSlices)
+        for i, (s1, s2) in enumerate(zip(slices1, slices2)):
+            data1 = np.asarray(s1.data)
+            data2 = self.resample(np.asarray(s2.data), data1.shape)
+            diff  = data2 - data1
+            squaredErrors[i] = np.sum(diff*diff)
+            errors[i]        = np.sum(diff)
+            sizes[i]         = diff.size
+            clouds1 = data1 > threshold
+            clouds2 = data2 > threshold
+            intersections[i] = np.count_nonzero(clouds1 & clouds2)
+            unions[i]        = np.count_nonzero(clouds1 | clouds2)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {'rmse'      : np.sqrt(squaredErrors / sizes),
+                    'bias'      : errors / sizes,
+                    'iou'       : intersections / unions,
+                    'rmseTotal' : np.sqrt(np.sum(squaredErrors) / np.sum(sizes)),
+                    'biasTotal' : np.sum(errors) / np.sum(sizes),
+                    'iouTotal'  : np.sum(intersections) / np.sum(unions)}
 
-        return self.slice1.data, self.slice2.data, self.data2resampled
 
-    
     def extent(self):
         res = []
         for bounds in self.externalBounds:
             res.append(bounds.min)
             res.append(bounds.max)
         return res
-
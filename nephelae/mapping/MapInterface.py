@@ -31,8 +31,14 @@ class MapInterface(abc.ABC):
 
     name : str
         A unique identifer for this map instance.
+
+    maxLocationTemplates : int (class attribute)
+        Maximum number of cached location grids per map instance (see
+        self.compute_locations).
     """
 
+    maxLocationTemplates = 16
+
     def __init__(self, name, threshold=0):
         """
         Parameters
@@ -157,33 +163,142 @@ class MapInterface(abc.ABC):
             Section of space selected with keys.
             (to be changed with a nephelae.array.ScaledArray ?).
         """
-        locations, dims, shape = compute_locations(keys)
+        locations, dims, shape = self.compute_locations(keys)
         pred = self.at_locations(locations)
-        return compute_scaled_array(shape, pred, dims)
+        return self.compute_scaled_array(shape, pred, dims)
+
+    def get_many(self, keysList):
+        """
+        Returns several slices of map data at once.
+
+        Default implementation calls self.__getitem__ for each keys.
+        Subclasses should reimplement this when maps can be computed more
+        efficiently together (see nephelae.mapping.GprPredictor).
+
+        Parameters
+        ----------
+        keysList : list(tuple(int,float,slice,...), ...)
+            List of keys, as in self.__getitem__.
+
+        Returns
+        -------
+        list(ScaledArray,...)
+            One map slice for each keys of keysList.
+        """
+        return [self[keys] for keys in keysList]
+
+    def get_time_series(self, keys, times):
+        """
+        Returns the same region of space at several times. (For example to
+        render a video of a map).
+
+        Parameters
+        ----------
+        keys : tuple(int,float,slice,...)
+            keys like for self.__getitem__. The first key (time) is ignored.
+
+        times : iterable(float,...)
+            Times at which the region is requested.
+
+        Returns
+        -------
+        list(ScaledArray,...)
+            One map slice for each time of times.
+        """
+        return self.get_many([(float(t),) + tuple(keys[1:]) for t in times])
 
     def compute_locations(self, keys):
-        params = []
-        for key, res in zip(keys, self.resolution()):
+        """
+        Locations of the samples of the map slice selected with keys.
+
+        Grids of locations only depend on the number of samples and the
+        spacing in each sliced dimension. Grids are computed relative to the
+        slice origin and cached (see self.location_template), so a request
+        only costs a broadcast addition of the slice origin.
+
+        Parameters
+        ----------
+        keys : (float,slice,...)
+            keys like for self.__getitem__.
+
+        Returns
+        -------
+        (numpy.array (N x D), nephelae.array.DimensionHelper, tuple(int,...))
+            Locations (in 'ij' order, last dimension varying the fastest,
+            Fortran ordered),
+            dimensions of the slice and shape of the grid (with 1 for the
+            non-sliced dimensions).
+        """
+        origin  = np.empty(len(keys))
+        gridKey = []
+        dims    = DimensionHelper()
+        for i, (key, res) in enumerate(zip(keys, self.resolution())):
             if isinstance(key, slice):
-                size = int((key.stop - key.start) / res + 0.5)
-                params.append(np.linspace(
-                    key.start, key.stop, size))
+                size, step = self.slice_grid(key, res)
+                origin[i] = key.start
+                gridKey.append((size, step))
+                dims.add_dimension([key.start, key.stop], 'linear', size)
             else:
-                params.append(key)
-
-        T,X,Y,Z = np.meshgrid(params[0], params[1], params[2], params[3],
-                              indexing='xy', copy=False)
-        locations = np.array([T.ravel(), X.ravel(), Y.ravel(), Z.ravel()]).T
-        dims = DimensionHelper()
-        # for param in params:
-        #     if np.array(param).shape:
-        #         dims.add_dimension(param, 'LUT')
-        for param, key in zip(params, keys):
-            if np.array(param).shape:
-                dims.add_dimension([key.start, key.stop], 'linear', len(param))
-        return locations, dims, T.shape
+                origin[i] = key
+                gridKey.append(None)
+        # Template is stored transposed so the translation is a row-wise
+        # addition (much faster than broadcasting on a last dimension of
+        # size 4). Locations are returned as a Fortran ordered N x D array
+        # (each coordinate is contiguous).
+        locations = (self.location_template(tuple(gridKey))
+                     + origin[:,np.newaxis]).T
+        shape = tuple(1 if k is None else k[0] for k in gridKey)
+        return locations, dims, shape
+
+    def slice_grid(self, key, resolution):
+        """
+        Number of samples and spacing of the grid of a sliced dimension
+        (samples are on both ends of the slice, spacing is close to
+        resolution). Used by self.compute_locations.
+        """
+        size = int((key.stop - key.start) / resolution + 0.5)
+        step = (key.stop - key.start) / (size - 1) if size > 1 else 0.0
+        return size, step
+
+    def location_template(self, gridKey):
+        """
+        Grid of locations relative to the origin of a slice (read-only,
+        cached). Returned transposed (D x N).
+
+        Parameters
+        ----------
+        gridKey : tuple((int,float) or None,...)
+            Number of samples and spacing in each sliced dimension (None for
+            the non-sliced dimensions).
+        """
+        templates = getattr(self, 'locationTemplates', None)
+        if templates is None:
+            templates = {}
+            self.locationTemplates = templates
+        template = templates.get(gridKey, None)
+        if template is not None:
+            return template
+
+        shape = tuple(1 if k is None else k[0] for k in gridKey)
+        template = np.zeros(shape + (len(gridKey),))
+        for d, k in enumerate(gridKey):
+            if k is not None:
+                axisShape = [1]*len(gridKey)
+                axisShape[d] = k[0]
+                template[...,d] = (np.arange(k[0])*k[1]).reshape(axisShape)
+        template = np.ascontiguousarray(template.reshape(-1, len(gridKey)).T)
+        template.flags.writeable = False
+
+        if len(templates) >= MapInterface.maxLocationTemplates:
+            templates.clear()
+        templates[gridKey] = template
+        return template
 
     def compute_scaled_array(self, shape, pred, dims):
+        """
+        Wraps predictions in a ScaledArray. The ScaledArray data is a view of
+        pred (no copy if pred is contiguous).
+        """
         outputShape = list(shape)
         if len(pred.shape) == 2:
             outputShape.append(pred.shape[1])
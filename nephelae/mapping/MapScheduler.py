@@ -0,0 +1,317 @@
+import threading
+import queue
+import time
+
+from .MapCache import MapCache
+
+
+class PrecomputedRegion:
+
+    """
+    PrecomputedRegion
+
+    A region of interest periodically recomputed by a MapScheduler.
+
+    Attributes
+    ----------
+    regionId : str
+        Unique identifier of the region.
+
+    mapId : str
+        Name of the map to compute in the MapServer.
+
+    keysGetter : callable() -> tuple(float, slice,...)
+        Returns the keys of the region at the time of the computation
+        (for example the slice around an aircraft, built with
+        nephelae_utils.analysis.keys_from_position).
+
+    period : float
+        Recomputation period of the region (in seconds).
+
+    priority : int
+        Regions with a higher priority are computed first.
+
+    deadline : float or None
+        Maximum delay (in seconds) between the scheduling of a computation
+        and its start. Late computations are dropped. No deadline if None.
+
+    nextTime : float
+        Next time (as given by time.time()) the region is to be scheduled.
+
+    pending : bool
+        True if a computation of this region is waiting or running.
+        Redundant requests are coalesced into this pending computation.
+
+    keys : tuple(float, slice,...) or None
+        Keys of the last computed map.
+
+    result : ScaledArray or None
+        Last computed map.
+
+    timestamp : float or None
+        Time at which self.result was computed.
+    """
+
+    def __init__(self, regionId, mapId, keysGetter, period, priority, deadline):
+        self.regionId   = regionId
+        self.mapId      = mapId
+        self.keysGetter = keysGetter
+        self.period     = period
+        self.priority   = priority
+        self.deadline   = deadline
+        self.nextTime   = 0.0
+        self.pending    = False
+        self.keys       = None
+        self.result     = None
+        self.timestamp  = None
+
+
+class MapScheduler:
+
+    """
+    MapScheduler
+
+    Background precomputation of maps around regions of interest (typically
+    the slice around each aircraft, or around each tracked cloud).
+
+    Registered regions are periodically scheduled and computed by a pool of
+    worker threads. Readers then get the freshest precomputed map instantly
+    with self.get(regionId). Since maps such as ValueMap and StdMap cache
+    their results, a direct request with the same keys is also immediate.
+
+    Scheduling rules :
+        - A region is never scheduled twice. A request for a region already
+          waiting or being computed is coalesced into the pending one.
+        - Waiting computations are started in decreasing priority order, then
+          in scheduling order.
+        - A computation not started before its deadline is dropped.
+        - Regions resolving to identical (mapId, keys) at the same time share
+          a single computation.
+
+    Attributes
+    ----------
+    mapServer : nephelae.mapping.MapServer
+        Server from which the maps are requested.
+
+    regions : dict({str:PrecomputedRegion})
+        Registered regions of interest.
+
+    nbWorkers : int
+        Number of worker threads.
+
+    granularity : float
+        Period of the scheduling loop (in seconds).
+
+    stats : dict({str:int})
+        Number of computed, dropped (deadline passed) and shared
+        (de-duplicated) computations, and number of failed computations.
+
+    Methods
+    -------
+    add_region(regionId, mapId, keysGetter, period, priority, deadline):
+        Registers a new region of interest.
+
+    remove_region(regionId):
+        Unregisters a region of interest.
+
+    request(regionId):
+        Schedules a region as soon as possible (coalesced if pending).
+
+    get(regionId) -> (keys, ScaledArray, timestamp) or None:
+        Returns last computed map of a region.
+
+    start(), stop():
+        Start and stop the background computations.
+    """
+
+    def __init__(self, mapServer, nbWorkers=2, granularity=0.05):
+
+        """
+        Parameters
+        ----------
+        mapServer : nephelae.mapping.MapServer
+            Server from which the maps are requested.
+
+        nbWorkers : int
+            Number of worker threads.
+
+        granularity : float
+            Period of the scheduling loop (in seconds).
+        """
+        self.mapServer   = mapServer
+        self.nbWorkers   = nbWorkers
+        self.granularity = granularity
+        self.regions     = {}
+        self.tasks       = queue.PriorityQueue()
+        self.inFlight    = {}
+        self.sequence    = 0
+        self.lock        = threading.Lock()
+        self.running     = False
+        self.threads     = []
+        self.stats       = {'computed':0, 'dropped':0, 'shared':0, 'failed':0}
+
+
+    def add_region(self, regionId, mapId, keysGetter, period=1.0, priority=0,
+                   deadline=None):
+
+        """Registers a new region of interest
+
+        Parameters
+        ----------
+        regionId : str
+            Unique identifier of the region. Replaces an existing region
+            with the same regionId.
+
+        mapId : str
+            Name of the map in self.mapServer.
+
+        keysGetter : callable() -> keys or tuple(float, slice,...)
+            Keys of the region. Is called each time the region is computed.
+            If keysGetter is not a callable, it is used as fixed keys.
+
+        period : float
+            Recomputation period (in seconds).
+
+        priority : int
+            Regions with a higher priority are computed first.
+
+        deadline : float or None
+            Maximum delay between scheduling and start of a computation.
+        """
+        if not callable(keysGetter):
+            keys = keysGetter
+            keysGetter = lambda: keys
+        with self.lock:
+            self.regions[regionId] = PrecomputedRegion(regionId, mapId,
+                keysGetter, period, priority, deadline)
+
+
+    def remove_region(self, regionId):
+        with self.lock:
+            del self.regions[regionId]
+
+
+    def request(self, regionId):
+        """Schedules a region as soon as possible"""
+        with self.lock:
+            self.schedule(self.regions[regionId], time.time())
+
+
+    def get(self, regionId):
+        """Returns (keys, map, timestamp) of the last computation of a
+        region, or None if not computed yet."""
+        with self.lock:
+            region = self.regions[regionId]
+            if region.result is None:
+                return None
+            return (region.keys, region.result, region.timestamp)
+
+
+    def schedule(self, region, now):
+        """Pushes a computation of region in the task queue.
+        /!\ self.lock must be held."""
+        if region.pending:
+            return
+        region.pending  = True
+        region.nextTime = now + region.period
+        self.sequence   = self.sequence + 1
+        deadline = None if region.deadline is None else now + region.deadline
+        self.tasks.put((-region.priority, now, self.sequence,
+                        region.regionId, deadline))
+
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.threads = [threading.Thread(target=self.run_scheduling)]
+        for i in range(self.nbWorkers):
+            self.threads.append(threading.Thread(target=self.run_worker))
+        for thread in self.threads:
+            thread.start()
+
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+
+    def run_scheduling(self):
+        while self.running:
+            now = time.time()
+            with self.lock:
+                for region in self.regions.values():
+                    if region.nextTime <= now:
+                        self.schedule(region, now)
+            time.sleep(self.granularity)
+
+
+    def run_worker(self):
+        while self.running:
+            try:
+                task = self.tasks.get(timeout=self.granularity)
+            except queue.Empty:
+                continue
+            self.process(task[3], task[4])
+
+
+    def process(self, regionId, deadline):
+        """Computes a region (or drop it if deadline is passed)."""
+        with self.lock:
+            region = self.regions.get(regionId, None)
+            if region is None:
+                return
+            if deadline is not None and time.time() > deadline:
+                region.pending = False
+                self.stats['dropped'] += 1
+                return
+            keysGetter = region.keysGetter
+
+        # User callback called without self.lock held (it may be slow or
+        # call back into the scheduler).
+        try:
+            keys = keysGetter()
+        except Exception as e:
+            print("Warning : keys of region", regionId, "failed :", e)
+            with self.lock:
+                region.pending = False
+                self.stats['failed'] += 1
+            return
+
+        with self.lock:
+            if self.regions.get(regionId, None) is not region:
+                # Region removed or replaced while getting its keys.
+                region.pending = False
+                return
+            requestId = (region.mapId, MapCache.normalize_keys(keys))
+            if requestId in self.inFlight:
+                # Identical request already being computed, result will be
+                # shared.
+                self.inFlight[requestId].append(region)
+                self.stats['shared'] += 1
+                return
+            self.inFlight[requestId] = [region]
+
+        try:
+            result = self.mapServer[region.mapId][keys]
+        except Exception as e:
+            print("Warning : precomputation of region", regionId,
+                  "failed :", e)
+            result = None
+
+        with self.lock:
+            timestamp = time.time()
+            for waitingRegion in self.inFlight.pop(requestId):
+                waitingRegion.pending = False
+                if result is not None:
+                    waitingRegion.keys      = keys
+                    waitingRegion.result    = result
+                    waitingRegion.timestamp = timestamp
+            if result is None:
+                self.stats['failed'] += 1
+            else:
+                self.stats['computed'] += 1
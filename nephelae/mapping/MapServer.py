@@ -1,6 +1,14 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
 from nephelae.types   import Bounds
 from nephelae.mapping import MapInterface
 
+from .MapCache     import MapCache
+from .MapScheduler import MapScheduler
+from .TilePyramid  import TilePyramid
+
 
 class MapServer:
 
@@ -13,6 +21,12 @@ class MapServer:
         - Create a set of MapInterface from a configuration file.
         - Single instance holding all the MapInterface
         - Mapping bounds.
+        - Background precomputation of regions of interest.
+        - Multi-resolution tiled access to maps (for GUI browsing).
+        - Request routing : maps are computed by per-map worker pools with a
+          concurrency limit, identical requests in flight are computed only
+          once, and clients can wait for a result with a timeout, either
+          synchronously (self.request) or from asyncio code (self.get).
 
     Attributes
     ----------
@@ -28,9 +42,55 @@ class MapServer:
     dataServer : nephelae.database.NephelaeDataServer
         Data server from which GprPredictor will fetch data for building maps.
         Can be None if no GprPredictor are used as maps.
+
+    scheduler : nephelae.mapping.MapScheduler
+        Background map precomputation around regions of interest (aircraft,
+        tracked clouds...). Must be started with self.scheduler.start().
+        Precomputed maps are read with self.get_precomputed(regionId).
+
+    tilePyramids : dict({str:nephelae.mapping.TilePyramid})
+        Tile pyramids of the maps served by tiles (see self.add_tile_pyramid
+        and self.get_tile).
+
+    maxConcurrency : int or dict({str:int})
+        Maximum number of concurrent computations for each map (size of the
+        per-map worker pools). Can be given per map name in a dict (maps not
+        in the dict get a single worker).
+
+    timeout : float or None
+        Default time (in seconds) a client waits for a map before a
+        TimeoutError is raised. (The computation itself is not cancelled and
+        its result can still be shared). No timeout if None.
+
+    executors : dict({str:concurrent.futures.ThreadPoolExecutor})
+        Worker pools, created on the first request to each map.
+
+    inFlight : dict({tuple:concurrent.futures.Future})
+        Requests being computed, keyed by (mapId, normalized keys).
+
+    stats : dict({str:int})
+        Number of submitted, shared (de-duplicated) and failed requests.
+
+    Methods
+    -------
+    submit(mapId, keys) -> concurrent.futures.Future:
+        Schedules the computation of a map slice.
+
+    submit_many(mapId, keysList) -> list(concurrent.futures.Future):
+        Schedules the computation of several map slices in batches.
+
+    request(mapId, keys, timeout) -> ScaledArray:
+        Blocking access to a map slice.
+
+    get(mapId, keys, timeout) -> ScaledArray:
+        Coroutine giving access to a map slice (await server.get(...)).
+
+    shutdown():
+        Stops the worker pools and the background precomputation.
     """
 
-    def __init__(self, configFile=None, mapSet=None, mapBounds=None, dataServer=None):
+    def __init__(self, configFile=None, mapSet=None, mapBounds=None, dataServer=None,
+                 maxConcurrency=2, timeout=None):
 
         """
         Parameters
@@ -56,6 +116,12 @@ class MapServer:
             Instance of a NephelaeDataServer from which GprPredictor will fetch
             data for building maps. Can be None if no GprPredictor are used as
             maps.
+
+        maxConcurrency : int or dict({str:int})
+            Maximum number of concurrent computations per map.
+
+        timeout : float or None
+            Default waiting time of self.request and self.get.
         """
         
         if configFile is None:
@@ -67,6 +133,15 @@ class MapServer:
             self.bounds     = None
             self.dataServer = dataServer
             self.build_from_file(configFile)
+        self.scheduler    = MapScheduler(self)
+        self.tilePyramids = {}
+
+        self.maxConcurrency = maxConcurrency
+        self.timeout        = timeout
+        self.executors      = {}
+        self.inFlight       = {}
+        self.routerLock     = threading.Lock()
+        self.stats          = {'submitted':0, 'shared':0, 'failed':0}
 
 
     def build_from_file(self, configFile):
@@ -78,6 +153,197 @@ class MapServer:
         return self.maps.keys()
 
 
+    def nb_workers(self, mapId):
+        """Maximum number of concurrent computations of a map"""
+        if isinstance(self.maxConcurrency, dict):
+            return self.maxConcurrency.get(mapId, 1)
+        return self.maxConcurrency
+
+
+    def executor(self, mapId):
+        """Worker pool of a map (created on first use).
+        /!\ self.routerLock must be held."""
+        if mapId not in self.executors:
+            self.executors[mapId] = ThreadPoolExecutor(
+                max_workers=self.nb_workers(mapId),
+                thread_name_prefix='MapServer_' + str(mapId))
+        return self.executors[mapId]
+
+
+    def submit(self, mapId, keys):
+
+        """Schedules the computation of a map slice in the map worker pool.
+
+        Returns immediately. If an identical request (same map, same keys
+        after cropping to self.bounds) is already being computed, its future
+        is returned instead of starting a new computation.
+
+        Parameters
+        ----------
+        mapId : str
+            Name of the map.
+
+        keys : tuple(float, slice,...)
+            Keys of the map slice, as in MapInterface.__getitem__.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future of the map slice (ScaledArray).
+        """
+        if mapId not in self.maps:
+            raise KeyError("No map named '" + str(mapId) + "' in MapServer")
+        keys = tuple(self.process_keys(keys))
+        requestId = (mapId, MapCache.normalize_keys(keys))
+        with self.routerLock:
+            future = self.inFlight.get(requestId, None)
+            if future is not None:
+                self.stats['shared'] += 1
+                return future
+            self.stats['submitted'] += 1
+            future = self.executor(mapId).submit(self.maps[mapId].__getitem__,
+                                                 keys)
+            self.inFlight[requestId] = future
+        future.add_done_callback(
+            lambda f: self.request_done(requestId, f))
+        return future
+
+
+    def submit_many(self, mapId, keysList):
+
+        """Schedules the computation of several map slices (for example a
+        time series) in the map worker pool.
+
+        Each slice is de-duplicated against the requests in flight, as in
+        self.submit. If the map has a get_many method (batch computation,
+        see ValueMap.get_many), the remaining slices are split in as many
+        contiguous batches as the map has workers, and each batch is
+        computed with a single call to get_many in the worker pool.
+
+        Returns
+        -------
+        list(concurrent.futures.Future)
+            Future of each map slice (ScaledArray).
+        """
+        if mapId not in self.maps:
+            raise KeyError("No map named '" + str(mapId) + "' in MapServer")
+        if not hasattr(self.maps[mapId], 'get_many'):
+            return [self.submit(mapId, keys) for keys in keysList]
+
+        futures = []
+        missing = []
+        with self.routerLock:
+            for keys in keysList:
+                keys = tuple(self.process_keys(keys))
+                requestId = (mapId, MapCache.normalize_keys(keys))
+                future = self.inFlight.get(requestId, None)
+                if future is not None:
+                    self.stats['shared'] += 1
+                else:
+                    self.stats['submitted'] += 1
+                    future = Future()
+                    future.set_running_or_notify_cancel()
+                    self.inFlight[requestId] = future
+                    missing.append((keys, requestId, future))
+                futures.append(future)
+
+            executor = self.executor(mapId)
+            nbBatches = min(self.nb_workers(mapId), len(missing))
+            batches = [missing[i*len(missing) // nbBatches:
+                               (i + 1)*len(missing) // nbBatches]
+                       for i in range(nbBatches)]
+            for batch in batches:
+                executor.submit(self.compute_batch, mapId, batch)
+        for keys, requestId, future in missing:
+            future.add_done_callback(
+                lambda f, r=requestId: self.request_done(r, f))
+        return futures
+
+
+    def compute_batch(self, mapId, batch):
+        """Computes a batch of requests of self.submit_many (in a worker)
+        and sets the result of their futures."""
+        try:
+            results = self.maps[mapId].get_many([b[0] for b in batch])
+        except Exception as e:
+            for keys, requestId, future in batch:
+                future.set_exception(e)
+            return
+        for (keys, requestId, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+    def request_done(self, requestId, future):
+        with self.routerLock:
+            if self.inFlight.get(requestId, None) is future:
+                del self.inFlight[requestId]
+            if not future.cancelled() and future.exception() is not None:
+                self.stats['failed'] += 1
+
+
+    def request(self, mapId, keys, timeout=None):
+        """Blocking access to a map slice, computed in the map worker pool
+        (shared with identical requests from other clients). Raises
+        concurrent.futures.TimeoutError after timeout seconds (self.timeout
+        if None)."""
+        if timeout is None:
+            timeout = self.timeout
+        return self.submit(mapId, keys).result(timeout)
+
+
+    async def get(self, mapId, keys, timeout=None):
+        """Coroutine returning a map slice without blocking the event loop
+        (map = await server.get(mapId, keys)). Raises asyncio.TimeoutError
+        after timeout seconds (self.timeout if None). A timeout or a
+        cancellation does not cancel the computation, which may be shared
+        with other clients."""
+        if timeout is None:
+            timeout = self.timeout
+        future = asyncio.wrap_future(self.submit(mapId, keys))
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+
+    def shutdown(self, wait=True):
+        """Stops the background precomputation and the worker pools."""
+        self.scheduler.stop()
+        with self.routerLock:
+            executors = list(self.executors.values())
+            self.executors = {}
+        for executor in executors:
+            executor.shutdown(wait=wait)
+
+
+    def add_precomputed_region(self, regionId, mapId, keysGetter, period=1.0,
+                               priority=0, deadline=None):
+        """Registers a region to be periodically computed in background.
+        See MapScheduler.add_region for details."""
+        self.scheduler.add_region(regionId, mapId, keysGetter, period,
+                                  priority, deadline)
+
+
+    def get_precomputed(self, regionId):
+        """Returns (keys, map, timestamp) of the freshest precomputed map of
+        a region (None if not computed yet)."""
+        return self.scheduler.get(regionId)
+
+
+    def add_tile_pyramid(self, mapId, **kwargs):
+        """Enables tiled access to a map. Keyword arguments are given to the
+        TilePyramid constructor (origin, tileSize, nbLevels...). The default
+        origin is the (x,y) corner of self.bounds if defined."""
+        if 'origin' not in kwargs and self.bounds is not None \
+           and self.bounds[1] is not None and self.bounds[2] is not None:
+            kwargs['origin'] = (self.bounds[1].min, self.bounds[2].min)
+        self.tilePyramids[mapId] = TilePyramid(self.maps[mapId], **kwargs)
+        return self.tilePyramids[mapId]
+
+
+    def get_tile(self, mapId, t, z, level, i, j):
+        """Returns tile (i,j) of level of a map at time t and altitude z.
+        See TilePyramid.get_tile for details."""
+        return self.tilePyramids[mapId].get_tile(t, z, level, i, j)
+
+
     def __getitem__(self, mapId):
         class MapReader:
             """
@@ -85,14 +351,18 @@ class MapServer:
 
             This class is only for syntactic sugar. This is to be able to call
             directly MapServer['map'][keys] but by cropping keys according to
-            MapServer.bounds.
+            MapServer.bounds. Requests are routed through the MapServer worker
+            pools (see MapServer.request).
 
             """
             def __init__(self, mapServer, mapId):
                 self.mapServer = mapServer
                 self.mapId     = mapId
             def __getitem__(self, keys):
-                return self.mapServer.maps[self.mapId][self.mapServer.process_keys(keys)]
+                return self.mapServer.request(self.mapId, keys)
+            def get_many(self, keysList):
+                futures = self.mapServer.submit_many(self.mapId, keysList)
+                return [f.result(self.mapServer.timeout) for f in futures]
         return MapReader(self, mapId)
 
 
@@ -107,6 +377,9 @@ class MapServer:
                 key = min(key, dim.max)
             return key
 
+        if self.bounds is None:
+            return keys
+
         keys = list(keys)
         while len(keys) < len(self.bounds):
             keys.append(slice(None))
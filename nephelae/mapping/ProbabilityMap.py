@@ -0,0 +1,81 @@
+import numpy as np
+from scipy.special import ndtr
+
+from nephelae.array import ScaledArray
+
+from .FactoryBorder import FactoryBorder
+from .MacroscopicFunctions import compute_contours
+
+class ProbabilityMap(FactoryBorder):
+
+    """
+    ProbabilityMap
+
+    Probability of cloud presence P(value > threshold) at each pixel, given
+    the GPR predictive distribution N(value, std^2) :
+        P = Phi((value - threshold) / std)
+    with Phi the standard normal cumulative distribution function
+    (scipy.special.ndtr, vectorized). Pixels with a zero std have a
+    probability of 0 or 1.
+
+    The probability map is computed from the value and std maps of a single
+    GPR fit (see GprPredictor.get_maps) and cached like other derived maps
+    (see FactoryBorder), so the region where the presence probability is
+    above any confidence level is then obtained without new request. For
+    example {P > Phi(1)} is the area inside the inner border of
+    BorderIncertitude (factor=1) and {P > Phi(-1)} the area inside its outer
+    border.
+
+    Attributes
+    ----------
+    valueMap : ValueMap
+        Map of the predicted values.
+
+    stdMap : StdMap
+        Map of the predicted standard deviations.
+
+    Methods
+    -------
+    confidence_mask(keys, confidence) -> ScaledArray:
+        Pixels where the presence probability is above confidence.
+
+    contours(keys, confidence) -> list(numpy.array):
+        Contour polylines of the presence probability at confidence.
+    """
+
+    def __init__(self, name, valueMap, stdMap, threshold=None, cacheSize=8):
+        if threshold is None:
+            threshold = valueMap.threshold
+        super().__init__(name, threshold=threshold, cacheSize=cacheSize)
+        self.valueMap = valueMap
+        self.stdMap   = stdMap
+
+    def at_locations(self, arrays):
+        value, std = arrays[0].data, arrays[1].data
+        with np.errstate(divide='ignore', invalid='ignore'):
+            probability = ndtr((value - self.threshold) / std)
+        zeroStd = std <= 0.0
+        if np.any(zeroStd):
+            probability[zeroStd] = value[zeroStd] > self.threshold
+        return ScaledArray(probability, arrays[0].dimHelper,
+                           arrays[0].interpolation)
+
+    def confidence_mask(self, keys, confidence):
+        """Pixels where the cloud presence probability is above confidence
+        (boolean ScaledArray)."""
+        probability = self[keys]
+        return ScaledArray(probability.data > confidence,
+                           probability.dimHelper, probability.interpolation)
+
+    def contours(self, keys, confidence):
+        """Contour polylines of the cloud presence probability at
+        confidence (2D slices only, see compute_contours)."""
+        probability = self[keys]
+        return compute_contours(probability.data, confidence,
+                                probability.dimHelper)
+
+    def resolution(self):
+        return self.valueMap.resolution()
+
+    def get_arrays(self, keys):
+        return self.value_and_std(self.valueMap, self.stdMap, keys)
@@ -15,7 +15,7 @@ class StdMap(MapInterface):
         self.gpr.set_compute_std(True)
 
     def at_locations(self, locations):
-        return self.gpr.at_locations[1]
+        return self.gpr.at_locations(locations)[1]
 
     def shape(self):
         return (None, None, None, None)
@@ -34,3 +34,9 @@ class StdMap(MapInterface):
     
     def __getitem__(self, keys):
         return self.gpr.get_std(keys)
+
+    def get_many(self, keysList):
+        return self.gpr.get_stds(keysList)
+
+    def get_maps(self, keys):
+        return self.gpr.get_maps(keys)
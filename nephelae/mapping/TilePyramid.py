@@ -0,0 +1,285 @@
+import threading
+import numpy as np
+
+from nephelae.array import ScaledArray
+from nephelae.array import DimensionHelper
+from nephelae.types import Bounds
+
+from .MapCache import MapCache
+
+
+class TilePyramid:
+
+    """
+    TilePyramid
+
+    Serves a map as a quad-tree pyramid of square horizontal (x,y) tiles, for
+    interactive browsing (pan and zoom) of large areas.
+
+    Level 0 is the finest level. Its pixel size is the map resolution (or
+    baseResolution). Each level up halves the resolution, so a tile of level
+    L covers the area of 2x2 tiles of level L-1 with the same number of
+    pixels. Tile (i,j) of level L covers
+        [origin[0] + i*tile_span(L), origin[0] + (i+1)*tile_span(L)] x
+        [origin[1] + j*tile_span(L), origin[1] + (j+1)*tile_span(L)]
+    and pixel values are point samples of the map taken at the lower corner
+    of each pixel, at every level.
+
+    With corner sampling, the samples of a tile of level L are every other
+    sample of its four children of level L-1. A coarse tile is then always
+    assembled from its children : a cached child is subsampled, and a
+    missing child is itself assembled from its own children, down to the
+    areas of level 0 tiles where self.map is evaluated only at the samples
+    of the requested tile. The map is then never evaluated over an area
+    larger than a level 0 tile (a GPR based map is fitted on the samples of
+    a small area, whatever the level), and a tile does not depend on the
+    cache state. Coarse tiles are computed directly over their whole area
+    only if tileSize cannot be divided further (see self.compute_samples).
+
+    Tiles are cached in a MapCache and invalidated independently : a new
+    sample only invalidates the tiles computed from a region containing it.
+    (If the map is based on a GprPredictor, this region is the tile area
+    enlarged by the kernel span, and the pyramid is registered to the
+    predictor dataview to be notified of new samples).
+
+    Attributes
+    ----------
+    map : nephelae.mapping.MapInterface
+        Map from which tiles are computed.
+
+    origin : numpy.array (2)
+        (x,y) location of the corner of tile (0,0) of every level.
+
+    tileSize : int
+        Number of pixels on each side of a tile.
+
+    baseResolution : numpy.array (2)
+        (x,y) pixel size of level 0.
+
+    nbLevels : int
+        Number of levels of the pyramid.
+
+    cache : nephelae.mapping.MapCache
+        Computed tiles keyed by (t, level, i, j, z).
+
+    stats : dict({str:int})
+        Number of tiles or parts of tiles evaluated with self.map
+        ('computed'), of coarse tiles assembled from their children
+        ('subsampled') and of cached tiles reused while assembling a coarse
+        tile ('reused').
+
+    Methods
+    -------
+    get_tile(t, z, level, i, j) -> ScaledArray:
+        Returns a tile (computed if not in the cache).
+
+    tiles_in_region(level, xBounds, yBounds) -> list((int,int),...):
+        Indexes of the tiles of a level intersecting a region.
+
+    level_for_resolution(resolution) -> int:
+        Finest level with a pixel size coarser than resolution.
+    """
+
+    def __init__(self, map, origin=(0.0, 0.0), tileSize=128,
+                 baseResolution=None, nbLevels=6, cacheSize=256,
+                 cacheTolerance=None):
+
+        """
+        Parameters
+        ----------
+        map : nephelae.mapping.MapInterface
+            Map from which tiles are computed.
+
+        origin : (float, float)
+            (x,y) location of the corner of tile (0,0).
+
+        tileSize : int
+            Number of pixels on each side of a tile.
+
+        baseResolution : (float, float) or None
+            (x,y) pixel size of level 0. If None, the (x,y) resolution of the
+            map is used.
+
+        nbLevels : int
+            Number of levels of the pyramid.
+
+        cacheSize : int
+            Maximum number of tiles kept in cache (all levels).
+
+        cacheTolerance : tuple(float,...) or None
+            Tolerance on (t, level, i, j, z) for cached tiles reuse (see
+            MapCache). For example (1.0,0,0,0,0) allows to reuse tiles
+            computed less than a second ago.
+        """
+        self.map      = map
+        self.origin   = np.array(origin, dtype=float)
+        self.tileSize = tileSize
+        if baseResolution is None:
+            baseResolution = map.resolution()[1:3]
+        self.baseResolution = np.array(baseResolution, dtype=float)
+        self.nbLevels = nbLevels
+        self.cache    = MapCache(cacheSize, cacheTolerance)
+        self.lock     = threading.Lock()
+        self.stats    = {'computed':0, 'subsampled':0, 'reused':0}
+
+        # Getting notified of new samples for tiles invalidation
+        gpr = getattr(self.map, 'gpr', None)
+        if gpr is not None and hasattr(gpr.dataview, 'attach_observer'):
+            gpr.dataview.attach_observer(self)
+
+
+    def pixel_size(self, level):
+        return self.baseResolution * 2**level
+
+
+    def tile_span(self, level):
+        return self.pixel_size(level) * self.tileSize
+
+
+    def tile_bounds(self, level, i, j):
+        """(x,y) Bounds of the area covered by a tile"""
+        span = self.tile_span(level)
+        x0, y0 = self.origin + np.array([i, j])*span
+        return [Bounds(x0, x0 + span[0]), Bounds(y0, y0 + span[1])]
+
+
+    def tiles_in_region(self, level, xBounds, yBounds):
+        """Indexes (i,j) of the tiles of level intersecting the region
+        xBounds x yBounds."""
+        span = self.tile_span(level)
+        i0, j0 = np.floor((np.array([xBounds.min, yBounds.min]) - self.origin)
+                          / span).astype(int)
+        i1, j1 = np.ceil((np.array([xBounds.max, yBounds.max]) - self.origin)
+                         / span).astype(int)
+        return [(i, j) for i in range(i0, max(i1, i0 + 1))
+                       for j in range(j0, max(j1, j0 + 1))]
+
+
+    def level_for_resolution(self, resolution):
+        """Finest level whose pixel size is larger or equal to resolution
+        (for example the size of a screen pixel in meters)."""
+        ratio = resolution / np.min(self.baseResolution)
+        if ratio <= 1.0:
+            return 0
+        return int(min(np.floor(np.log2(ratio)), self.nbLevels - 1))
+
+
+    def pixel_locations(self, level, i, j, stride=1):
+        """x and y sampling locations of a tile (lower corner of each
+        pixel), keeping one pixel every stride pixels."""
+        pixel = self.pixel_size(level)
+        x0, y0 = self.origin + np.array([i, j])*self.tile_span(level)
+        offsets = np.arange(0, self.tileSize, stride)
+        return x0 + offsets*pixel[0], y0 + offsets*pixel[1]
+
+
+    def tile_dimensions(self, level, i, j):
+        x, y = self.pixel_locations(level, i, j)
+        dims = DimensionHelper()
+        dims.add_dimension([x[0], x[-1]], 'linear', self.tileSize)
+        dims.add_dimension([y[0], y[-1]], 'linear', self.tileSize)
+        return dims
+
+
+    def dependency_bounds(self, t, z, level, i, j):
+        """Region of space-time a tile depends on. A new sample inside this
+        region invalidates the tile."""
+        xBounds, yBounds = self.tile_bounds(level, i, j)
+        bounds = [Bounds(t, t), xBounds, yBounds, Bounds(z, z)]
+        gpr = getattr(self.map, 'gpr', None)
+        if gpr is not None:
+            span = gpr.kernel.span()
+            bounds = [Bounds(b.min - s, b.max + s)
+                      for b, s in zip(bounds, span)]
+        return bounds
+
+
+    def get_tile(self, t, z, level, i, j):
+
+        """Returns a tile of the pyramid at time t and altitude z.
+
+        Parameters
+        ----------
+        t, z : float
+            Time and altitude of the horizontal slice.
+
+        level : int
+            Level of the tile (0 is the finest level).
+
+        i, j : int
+            Index of the tile along x and y in the level.
+
+        Returns
+        -------
+        nephelae.array.ScaledArray
+            (tileSize x tileSize (x M)) map values at the sampling locations
+            of the tile (see self.pixel_locations).
+        """
+        if not 0 <= level < self.nbLevels:
+            raise ValueError("Invalid tile level : " + str(level))
+        keys = (t, level, i, j, z)
+        tile = self.cache.get(keys)
+        if tile is not None:
+            return tile
+
+        version = self.cache.version
+        if level == 0:
+            data = self.compute_tile(t, z, level, i, j)
+        else:
+            data = self.compute_samples(t, z, level, i, j, 1)
+            with self.lock:
+                self.stats['subsampled'] += 1
+        tile = ScaledArray(data, self.tile_dimensions(level, i, j))
+        self.cache.insert(keys, tile,
+                          self.dependency_bounds(t, z, level, i, j), version)
+        return tile
+
+
+    def compute_tile(self, t, z, level, i, j, stride=1):
+        """Computes the samples of a tile (one pixel every stride pixels)
+        directly from self.map, over the whole area of the tile."""
+        x, y = self.pixel_locations(level, i, j, stride)
+        locations = np.empty((len(x)*len(y), 4))
+        locations[:,0] = t
+        locations[:,1] = np.repeat(x, len(y))
+        locations[:,2] = np.tile(y, len(x))
+        locations[:,3] = z
+        values = np.asarray(self.map.at_locations(locations))
+        with self.lock:
+            self.stats['computed'] += 1
+        values = values.reshape((len(x), len(y), -1))
+        if values.shape[2] == 1:
+            values = values[:,:,0]
+        return values
+
+
+    def compute_samples(self, t, z, level, i, j, stride):
+        """
+        Samples of a tile (one pixel every stride pixels) assembled from its
+        4 children tiles (every other sample of the children, so one sample
+        every 2*stride pixels of the children).
+
+        Cached children are subsampled, missing children are recursively
+        assembled from their own children. The samples of areas of level 0
+        tiles which are not cached are computed with self.compute_tile.
+        """
+        if stride > 1:
+            tile = self.cache.get((t, level, i, j, z))
+            if tile is not None:
+                with self.lock:
+                    self.stats['reused'] += 1
+                return tile.data[::stride, ::stride]
+        if level == 0 or self.tileSize % (2*stride) != 0:
+            return self.compute_tile(t, z, level, i, j, stride)
+        children = [[self.compute_samples(t, z, level - 1, 2*i + di, 2*j + dj,
+                                          2*stride)
+                     for dj in (0, 1)] for di in (0, 1)]
+        return np.ascontiguousarray(np.concatenate(
+            [np.concatenate(row, axis=1) for row in children], axis=0))
+
+
+    def add_sample(self, sample):
+        """Callback called by the map dataview on a new sample.
+        Invalidates the tiles depending on this sample."""
+        self.cache.invalidate((sample.position.t, sample.position.x,
+                               sample.position.y, sample.position.z))
@@ -37,3 +37,8 @@ class ValueMap(MapInterface):
     def __getitem__(self, keys):
         return self.gpr.get_value(keys)
 
+    def get_many(self, keysList):
+        return self.gpr.get_values(keysList)
+
+    def get_maps(self, keys):
+        return self.gpr.get_maps(keys)
@@ -1,12 +1,10 @@
+import threading
 import numpy as np
-from sklearn.gaussian_process import kernels as gpk
 
 from nephelae.types import Bounds
 from nephelae.types import MultiObserverSubject
 
 from .MapInterface import MapInterface
-from .GprPredictor import GprPredictor
-from .GprKernel    import WindKernel
 
 class WindMapConstant(MapInterface, MultiObserverSubject):
 
@@ -27,7 +25,7 @@ class WindMapConstant(MapInterface, MultiObserverSubject):
 
 
     def at_locations(self, locations):
-        return np.array([self.wind]*locations.shape[0])
+        return np.tile(self.wind, (locations.shape[0], 1))
 
 
     def shape(self):
@@ -52,6 +50,11 @@ class WindMapConstant(MapInterface, MultiObserverSubject):
     def get_wind(self):
         return self.wind
 
+    def get_wind_deviation(self):
+        """Maximum difference between the wind at any location and
+        self.get_wind() on each wind component (zero for a uniform wind)."""
+        return np.zeros(len(self.wind))
+
     def set_wind(self, wind):
         self.wind = np.array(wind)
         self.send_new_wind(self.wind.tolist())
@@ -71,46 +74,109 @@ class WindObserverMap(WindMapConstant):
     is computed from received data from Observable objects such as PprzUav
     or a database.
 
-    In the absence of data, default 
+    The wind is estimated in O(1) per sample, either as the average of the
+    last maxSamples samples (ring buffer with running sums, mode='window')
+    or as an exponential moving average (mode='exponential'). The published
+    wind (self.wind, the one seen by WindKernel users) is updated and
+    observers are notified only when the estimate changed by more than
+    changeThreshold, and at most once every minNotifyPeriod seconds (in
+    samples time). Small fluctuations of the estimate do not trigger
+    recomputations downstream.
+
+    In the absence of data, defaultWindValue is used. The first received
+    sample is published immediately.
 
     Attritubes
     ----------
     wind : np.array (shape=(2,)), inherited from WindMapConstant
-        Current wind value, average of fetched wind samples. (Default is [0,0])
-    
+        Published wind value (Default is [0,0])
+
+    estimate : np.array (shape=(2,))
+        Current wind estimation (updated on each sample).
+
     sampleName : str
         Name of the sample to be kept when add_sample is called. (add_sample
         will receive all kinds of sample types. This is to filter the samples)
         Default is str(['UT','VT'])
 
-    windSamples : list(np.array,...)
-        List of wind measurements. Will be averaged to give a single wind
-        value for all space.
+    mode : str
+        'window' (sliding window average) or 'exponential' (exponential
+        moving average).
+
+    windSamples : np.array (maxSamples x 2)
+        Ring buffer of the last wind measurements (mode='window' only).
 
     maxSamples : int
-        Maximum number of samples to be kept in self.windSamples. When reached,
-        oldest samples will be deleted until len(self.windSamples) equals
-        self.minSamples.
+        Length of the sliding window. In 'exponential' mode, the smoothing
+        factor is 2 / (maxSamples + 1) (same average age of samples).
 
     minSamples : int
-        Length at which windSample will be set when self.maxSamples is reached
+        Same meaning as before streaming estimation : number of samples kept
+        after a publication. Without minNotifyPeriod and changeThreshold,
+        the estimate is published every maxSamples - minSamples samples
+        once maxSamples samples were received (the first sample is always
+        published).
+
+    minPublishSamples : int
+        Number of samples received before the estimate is published (the
+        first sample is always published). Defaults to maxSamples.
+
+    trackVariance : bool
+        If True, the variance of the samples is estimated along with the
+        average (see self.get_wind_variance).
+
+    minNotifyPeriod : float or None
+        Minimum time between two publications (in samples time).
+
+    changeThreshold : float or None
+        Minimum difference (norm) between the published wind and the
+        estimate to trigger a publication.
+
+    If minNotifyPeriod or changeThreshold is set, publications are rate
+    limited by them (at most once every minNotifyPeriod, only when the
+    estimate moved by more than changeThreshold) instead of happening every
+    maxSamples - minSamples samples.
 
     Methods
     -------
     add_sample(nephelae.types.SensorSample):
         Callback function to be registered in a publisher.
+
+    get_wind_variance() -> np.array (2):
+        Variance of the samples on each wind component (None if
+        trackVariance is False).
     """
 
     def __init__(self, name, sampleName=str(['UT','VT']),
                  defaultWindValue=np.array([0.0,0.0]),
-                 maxSamples=30, minSamples=5,
+                 maxSamples=30, minSamples=5, mode='window',
+                 trackVariance=True, minPublishSamples=None,
+                 minNotifyPeriod=None, changeThreshold=None,
                  resolution=[50.0,50.0,50.0,50.0], threshold=0):
         super().__init__(name, defaultWindValue, resolution, threshold=threshold)
 
-        self.sampleName  = sampleName
-        self.windSamples = []
-        self.maxSamples  = maxSamples
-        self.minSamples  = minSamples
+        if mode not in ('window', 'exponential'):
+            raise ValueError("Invalid WindObserverMap mode : " + str(mode))
+        self.sampleName      = sampleName
+        self.mode            = mode
+        self.maxSamples      = maxSamples
+        self.minSamples      = minSamples
+        self.minPublishSamples = maxSamples if minPublishSamples is None \
+                                 else minPublishSamples
+        self.trackVariance   = trackVariance
+        self.minNotifyPeriod = minNotifyPeriod
+        self.changeThreshold = changeThreshold
+        self.smoothing       = 2.0 / (maxSamples + 1)
+
+        self.windSamples = np.zeros((maxSamples, len(self.wind)))
+        self.sampleCount = 0
+        self.bufferIndex = 0
+        self.windSum     = np.zeros(len(self.wind))
+        self.windSqSum   = np.zeros(len(self.wind))
+        self.estimate    = np.array(self.wind, dtype=float)
+        self.variance    = np.zeros(len(self.wind))
+        self.lastNotify  = None
+        self.lock        = threading.Lock()
 
 
     def add_sample(self, sample):
@@ -118,49 +184,455 @@ class WindObserverMap(WindMapConstant):
         if sample.variableName != self.sampleName:
             return
 
-        if not self.windSamples:
-            # If wind sample is empty, this is the first sample we receive.
-            # Setting self.wind to this value is better than default.
-            self.set_wind(sample.data[0])
+        value = np.array(sample.data[0], dtype=float)[:len(self.wind)]
+        with self.lock:
+            if self.mode == 'window':
+                self.update_window(value)
+            else:
+                self.update_exponential(value)
+            self.sampleCount = self.sampleCount + 1
+
+            t = sample.position.t
+            if self.sampleCount == 1:
+                # First sample we receive. Better than default.
+                publish = True
+            elif self.sampleCount < self.minPublishSamples:
+                publish = False
+            elif self.minNotifyPeriod is None and \
+                 self.changeThreshold is None:
+                # Publication every maxSamples - minSamples samples
+                publish = (self.sampleCount - self.maxSamples) % \
+                    max(self.maxSamples - self.minSamples, 1) == 0
+            else:
+                publish = (self.minNotifyPeriod is None or
+                           t - self.lastNotify >= self.minNotifyPeriod) and\
+                          (self.changeThreshold is None or
+                           np.linalg.norm(self.estimate - self.wind)
+                           > self.changeThreshold)
+            if publish:
+                self.lastNotify = t
+                wind = self.estimate.copy()
+        if publish:
+            self.set_wind(wind)
+
+
+    def update_window(self, value):
+        """Sliding window average (running sums on a ring buffer).
+        /!\ self.lock must be held."""
+        if self.sampleCount >= self.maxSamples:
+            old = self.windSamples[self.bufferIndex]
+            self.windSum -= old
+            if self.trackVariance:
+                self.windSqSum -= old**2
+        self.windSamples[self.bufferIndex] = value
+        self.windSum += value
+        if self.trackVariance:
+            self.windSqSum += value**2
+        self.bufferIndex = (self.bufferIndex + 1) % self.maxSamples
+
+        if self.bufferIndex == 0:
+            # Periodic exact recomputation of the running sums to prevent
+            # the accumulation of rounding errors (amortized O(1)).
+            self.windSum = self.windSamples.sum(axis=0)
+            if self.trackVariance:
+                self.windSqSum = (self.windSamples**2).sum(axis=0)
+
+        n = min(self.sampleCount + 1, self.maxSamples)
+        self.estimate = self.windSum / n
+        if self.trackVariance:
+            self.variance = np.maximum(self.windSqSum / n - self.estimate**2,
+                                       0.0)
+
+
+    def update_exponential(self, value):
+        """Exponential moving average (and variance).
+        /!\ self.lock must be held."""
+        if self.sampleCount == 0:
+            self.estimate = value.copy()
+            return
+        diff = value - self.estimate
+        self.estimate = self.estimate + self.smoothing*diff
+        if self.trackVariance:
+            self.variance = (1.0 - self.smoothing) \
+                          * (self.variance + self.smoothing*diff**2)
+
+
+    def get_wind_variance(self):
+        if not self.trackVariance:
+            return None
+        return self.variance
 
-        self.windSamples.append(sample.data[0])
-        if len(self.windSamples) >= self.maxSamples:
-            # Updating wind only when maxSamples is reached
-            # To update at each sample, set maxSamples-minSamples=1
-            self.set_wind(np.array(self.windSamples).mean(axis=0))
-            # Removing old data
-            self.windSamples[0:len(self.windSamples) - self.minSamples] = []
 
+class WindMapGrid(WindMapConstant):
 
-class WindMapUav(GprPredictor):
+    """
+    WindMapGrid
+
+    Spatially varying wind backed by a precomputed regular grid. The wind at
+    any location is given by a vectorized multilinear interpolation
+    (trilinear on a (x,y,z) grid) of the grid nodes. Locations outside the
+    grid get the wind of the closest border.
+
+    Cheap enough to be used in a WindKernel on each covariance evaluation.
+    The grid can be built from any wind map (for example the history of a
+    WindObserverMap or a GPR estimated wind, see WindMapGrid.from_wind_map)
+    or from MesoNH fields (see WindMapGrid.from_scaled_arrays).
+
+    Attributes
+    ----------
+    wind : np.array (shape=(2,)), inherited from WindMapConstant
+        Average of the wind over the grid.
 
-    """WindMapUav
-    /!\ NOT FULLY IMPLEMENTED. DO NOT USE THIS.
-    Derived from nephelae.mapping.MapInterface.
+    grid : numpy.array (shape=(n_0,...,n_D-1,2))
+        Wind value at each node of the grid.
 
-    Returns a predicted wind value based on measure fetch from a database and
-    GPR prediction.
+    dimensions : tuple(int,...)
+        Dimensions of the (t,x,y,z) space covered by the grid. For example
+        (1,2,3) for a (x,y,z) grid constant over time.
 
-    /!\ NOT FULLY IMPLEMENTED. DO NOT USE THIS.
+    origin : numpy.array (D)
+        Location of the first grid node in each grid dimension.
+
+    step : numpy.array (D)
+        Distance between two grid nodes in each grid dimension.
     """
 
-    # def __init__(self, dataServer, lengthScales=[60.0, 300.0, 300.0, 30.0],
-    def __init__(self, dataServer, lengthScales=[60.0, 300.0, 300.0, 30.0],
-                 variance=5.0**2, noiseVariance=1.0):
-        raise NotImplemented("I told you not to use this !!! (WindMapUav")
-        super().__init__("H_Wind", dataServer, str(['UT','VT']),
-            WindKernel(lengthScales, variance, noiseVariance, WindMapConstant('CH_Wind')),
-            computesStddev=False, updateRange=False)
+    def __init__(self, name, grid, gridBounds, dimensions=(1,2,3),
+                 resolution=[50.0,50.0,50.0,50.0], threshold=0):
+
+        """
+        Parameters
+        ----------
+        grid : numpy.array (shape=(n_0,...,n_D-1,2))
+            Wind values on grid nodes.
+
+        gridBounds : list(nephelae.types.Bounds,...)
+            Location of the first and last nodes in each grid dimension.
+
+        dimensions : tuple(int,...)
+            Dimensions of the (t,x,y,z) space covered by the grid.
+        """
+        super().__init__(name, [0.0,0.0], resolution, threshold=threshold)
+        self.dimensions = tuple(dimensions)
+        self.origin = np.array([b.min for b in gridBounds], dtype=float)
+        self.gridBounds = gridBounds
+        self.set_grid(grid)
+
+
+    def from_scaled_arrays(name, uArray, vArray, dimensions=(1,2,3), **kwargs):
+        """Builds a WindMapGrid from two ScaledArrays holding each wind
+        component (for example MesoNH UT and VT variables). ScaledArrays
+        must have affine dimensions."""
+        return WindMapGrid(name, np.stack([uArray.data, vArray.data], axis=-1),
+                           uArray.bounds, dimensions, **kwargs)
+
+
+    def from_wind_map(name, windMap, gridBounds, shape, dimensions=(1,2,3),
+                      fixedLocation=(0.0,0.0,0.0,0.0), **kwargs):
+        """Builds a WindMapGrid by sampling windMap (any MapInterface
+        returning a wind vector) on a regular grid.
+
+        Parameters
+        ----------
+        gridBounds : list(nephelae.types.Bounds,...)
+            Bounds of the grid in each grid dimension.
+
+        shape : tuple(int,...)
+            Number of nodes in each grid dimension.
+
+        fixedLocation : tuple(float,...)
+            (t,x,y,z) location used for the dimensions not in the grid (for
+            example the time at which the grid is computed).
+        """
+        axes = [np.linspace(b.min, b.max, n) for b, n in zip(gridBounds, shape)]
+        nodes = np.meshgrid(*axes, indexing='ij')
+        locations = np.tile(np.array(fixedLocation, dtype=float),
+                            (nodes[0].size, 1))
+        for dim, node in zip(dimensions, nodes):
+            locations[:,dim] = node.ravel()
+        grid = np.asarray(windMap.at_locations(locations))[:,:2]
+        return WindMapGrid(name, grid.reshape(tuple(shape) + (2,)),
+                           gridBounds, dimensions, **kwargs)
+
+
+    def set_grid(self, grid):
+        """Replaces grid values (grid shape and bounds unchanged) and notifies
+        observers with the new average wind."""
+        grid  = np.asarray(grid, dtype=float)
+        shape = np.array(grid.shape[:-1])
+        span  = np.array([b.max - b.min for b in self.gridBounds], dtype=float)
+        self.step = np.where(shape > 1, span / np.maximum(shape - 1, 1), 1.0)
+        self.grid = grid
+        # Flattened version for fast lookup, and flat strides of each dim
+        self.flatGrid = grid.reshape(-1, grid.shape[-1])
+        self.strides  = np.array([int(np.prod(grid.shape[d+1:-1]))
+                                  for d in range(len(self.dimensions))])
+        self.set_wind(self.flatGrid.mean(axis=0))
+
+
+    def interpolation_weights(self, locations):
+
+        """Grid nodes and weights of the multilinear interpolation at
+        locations (vectorized).
+
+        Parameters
+        ----------
+        locations : numpy.array (N x 4)
+            (t,x,y,z) locations.
+
+        Returns
+        -------
+        (numpy.array (N x 2^D) of int, numpy.array (N x 2^D))
+            Flat indexes (in self.flatGrid) of the nodes surrounding each
+            location and their interpolation weights.
+        """
+        locations = np.asarray(locations)
+        shape = self.grid.shape[:-1]
+        nbCorners = 2**len(self.dimensions)
+        indexes = np.zeros((locations.shape[0], nbCorners), dtype=int)
+        weights = np.ones((locations.shape[0], nbCorners))
+        for d, dim in enumerate(self.dimensions):
+            u = np.clip((locations[:,dim] - self.origin[d]) / self.step[d],
+                        0.0, shape[d] - 1)
+            i0 = np.minimum(u.astype(int), max(shape[d] - 2, 0))
+            w1 = u - i0
+            for corner in range(nbCorners):
+                if (corner >> d) & 1:
+                    if shape[d] < 2:
+                        weights[:,corner] = 0.0
+                        continue
+                    indexes[:,corner] += (i0 + 1)*self.strides[d]
+                    weights[:,corner] *= w1
+                else:
+                    indexes[:,corner] += i0*self.strides[d]
+                    weights[:,corner] *= 1.0 - w1
+        return indexes, weights
 
 
     def at_locations(self, locations):
-        res = super().at_locations(locations).mean(axis=0)
-        print("Horizontal wind :", res)
-        return np.array([res]*len(locations))
+        """Multilinear interpolation of the grid at locations (vectorized)"""
+        indexes, weights = self.interpolation_weights(locations)
+        return np.einsum('nc,ncw->nw', weights, self.flatGrid[indexes])
+
+
+    def shape(self):
+        return tuple(self.grid.shape[:-1])
+
+
+    def bounds(self):
+        res = [None, None, None, None]
+        for dim, b in zip(self.dimensions, self.gridBounds):
+            res[dim] = b
+        return tuple(res)
 
 
-    def __deepcopy__(self, memo):
-        # find a better way ! This is to prevent scikit-lear to deepcppy the whole database
-        # print("WindMapUav was deepcopied !\n\n\n\n\n\n")
-        return self
-        
+    def get_wind_deviation(self):
+        return np.max(np.abs(self.flatGrid - self.wind), axis=0)
+
+
+class WindMapUav(WindMapGrid):
+
+    """
+    WindMapUav
+
+    Spatially varying horizontal wind estimated from the wind measurements
+    of the UAVs (['UT','VT'] samples of a NephelaeDataServer).
+
+    The wind field is estimated on the nodes of a regular grid (see
+    WindMapGrid) with a recursive Gaussian Process regression (a Kalman
+    filter on grid node values). Each sample is a noisy observation of the
+    multilinear interpolation of the grid at its location and is processed
+    once on reception in O(n^2) (n being the number of grid nodes). Both
+    wind components share the same covariance. Between two samples the
+    estimate relaxes towards the average measured wind with a time constant
+    timeScale (Ornstein-Uhlenbeck process), so old measurements are
+    progressively forgotten.
+
+    Since the estimate is stored on a grid, self.at_locations is a cheap
+    vectorized interpolation which can be called by a WindKernel on each
+    covariance evaluation.
+
+    Attributes
+    ----------
+    sampleName : str
+        Name of the samples to be used (add_sample receives all kinds of
+        samples). Default is str(['UT','VT']).
+
+    lengthScales : numpy.array (D)
+        Length scales of the prior covariance of the wind field in each grid
+        dimension.
+
+    variance : float
+        Prior variance of each wind component.
+
+    noiseVariance : float
+        Variance of the measurement noise.
+
+    timeScale : float
+        Time constant of the relaxation of the estimate towards self.priorMean
+        (in seconds).
+
+    priorMean : numpy.array (2)
+        Average of the received wind samples (moving average over the last
+        meanWindow samples).
+
+    priorCovariance : numpy.array (n x n)
+        Prior covariance of the wind on grid nodes.
+
+    covariance : numpy.array (n x n)
+        Current covariance of the estimation error on grid nodes.
+
+    lastTime : float or None
+        Time of the last processed sample.
+
+    notifyPeriod : float
+        Minimum time between two notifications of wind observers (in samples
+        time).
+
+    Methods
+    -------
+    add_sample(nephelae.types.SensorSample):
+        Callback function to be registered in a publisher (see
+        NephelaeDataServer.add_sensor_observer).
+
+    get_std(locations) -> numpy.array (N):
+        Standard deviation of the wind estimate at locations.
+    """
+
+    def __init__(self, name, gridBounds, shape, dimensions=(1,2,3),
+                 lengthScales=[300.0,300.0,100.0], variance=4.0,
+                 noiseVariance=0.25, timeScale=600.0,
+                 sampleName=str(['UT','VT']),
+                 defaultWindValue=np.array([0.0,0.0]), notifyPeriod=1.0,
+                 meanWindow=100, resolution=[50.0,50.0,50.0,50.0],
+                 threshold=0):
+
+        """
+        Parameters
+        ----------
+        gridBounds : list(nephelae.types.Bounds,...)
+            Bounds of the estimation grid in each grid dimension.
+
+        shape : tuple(int,...)
+            Number of grid nodes in each grid dimension. The update cost is
+            quadratic with the total number of nodes.
+
+        dimensions : tuple(int,...)
+            Dimensions of the (t,x,y,z) space covered by the grid.
+
+        lengthScales, variance, noiseVariance, timeScale :
+            Estimation parameters (see class documentation).
+
+        defaultWindValue : numpy.array (2)
+            Wind value in the absence of measurements.
+        """
+        defaultWindValue = np.array(defaultWindValue, dtype=float)
+        super().__init__(name,
+            np.tile(defaultWindValue, tuple(shape) + (1,)),
+            gridBounds, dimensions, resolution, threshold)
+        self.sampleName    = sampleName
+        self.lengthScales  = np.array(lengthScales, dtype=float)
+        self.variance      = variance
+        self.noiseVariance = noiseVariance
+        self.timeScale     = timeScale
+        self.notifyPeriod  = notifyPeriod
+        self.meanWindow    = meanWindow
+        self.priorMean     = defaultWindValue
+        self.sampleCount   = 0
+        self.lastTime      = None
+        self.lastNotify    = None
+        self.lock          = threading.Lock()
+
+        axes  = [np.linspace(b.min, b.max, n) for b, n in zip(gridBounds, shape)]
+        nodes = np.stack([n.ravel() for n in
+                          np.meshgrid(*axes, indexing='ij')], axis=-1)
+        nodes = nodes / self.lengthScales
+        sqDists = np.zeros((nodes.shape[0], nodes.shape[0]))
+        for d in range(nodes.shape[1]):
+            sqDists += np.subtract.outer(nodes[:,d], nodes[:,d])**2
+        self.priorCovariance = self.variance*np.exp(-0.5*sqDists)
+        self.covariance      = self.priorCovariance.copy()
+
+
+    def add_sample(self, sample):
+        """Callback function to be registered in a publisher."""
+        if sample.variableName != self.sampleName:
+            return
+        p = sample.position
+        location = np.array([[p.t, p.x, p.y, p.z]], dtype=float)
+        value = np.array(sample.data[0], dtype=float)[:2]
+
+        with self.lock:
+            self.update_prior_mean(value)
+            self.relax(p.t)
+
+            indexes, weights = self.interpolation_weights(location)
+            indexes, weights = indexes[0], weights[0]
+            Ph   = self.covariance[:, indexes] @ weights
+            gain = Ph / (weights @ Ph[indexes] + self.noiseVariance)
+            innovation = value - weights @ self.flatGrid[indexes]
+
+            # New covariance and grid are built before replacing the
+            # references, so readers calling self.get_std or
+            # self.at_locations from other threads without the lock always
+            # see a consistent state.
+            self.covariance = self.covariance - np.outer(Ph, gain)
+            flatGrid = self.flatGrid + np.outer(gain, innovation)
+            self.grid     = flatGrid.reshape(self.grid.shape)
+            self.flatGrid = flatGrid
+            self.wind     = flatGrid.mean(axis=0)
+
+            if self.lastNotify is None \
+               or p.t - self.lastNotify >= self.notifyPeriod:
+                self.lastNotify = p.t
+                notify = True
+            else:
+                notify = False
+        if notify:
+            self.send_new_wind(self.wind.tolist())
+
+
+    def update_prior_mean(self, value):
+        """Moving average of the received samples.
+        /!\ self.lock must be held."""
+        self.sampleCount = self.sampleCount + 1
+        if self.sampleCount == 1:
+            # First sample. Better than the default value.
+            self.priorMean = value.copy()
+            self.flatGrid  = np.tile(value, (self.flatGrid.shape[0], 1))
+            self.grid      = self.flatGrid.reshape(self.grid.shape)
+            return
+        self.priorMean = self.priorMean + (value - self.priorMean) \
+                       / min(self.sampleCount, self.meanWindow)
+
+
+    def relax(self, t):
+        """Time update of the estimation from self.lastTime to t.
+        /!\ self.lock must be held."""
+        if self.lastTime is None or t <= self.lastTime:
+            # Samples slightly out of order are processed without time
+            # update.
+            if self.lastTime is None:
+                self.lastTime = t
+            return
+        a = np.exp(-(t - self.lastTime) / self.timeScale)
+        self.lastTime = t
+        self.flatGrid = a*self.flatGrid + (1.0 - a)*self.priorMean
+        self.grid     = self.flatGrid.reshape(self.grid.shape)
+        # (new matrix, see self.add_sample)
+        covariance  = a*a*self.covariance
+        covariance += (1.0 - a*a)*self.priorCovariance
+        self.covariance = covariance
+
+
+    def get_std(self, locations):
+        """Standard deviation of the estimation of each wind component at
+        locations (measurements are assumed up to date). Can be called from
+        any thread (self.covariance is replaced, never modified in
+        place)."""
+        indexes, weights = self.interpolation_weights(locations)
+        covariance = self.covariance
+        variance = np.einsum('nc,ncd,nd->n', weights,
+            covariance[indexes[:,:,np.newaxis], indexes[:,np.newaxis,:]],
+            weights)
+        return np.sqrt(np.maximum(variance, 0.0))
@@ -1,9 +1,14 @@
 from .MapInterface         import MapInterface
+from .MapCache             import MapCache
 from .MapServer            import MapServer
+from .MapScheduler         import MapScheduler
+from .TilePyramid          import TilePyramid
 
+from .CholeskyGpr          import CholeskyGpr
 from .GprPredictor         import GprPredictor
 from .GprKernel            import NephKernel, WindKernel
-from .WindMaps             import WindMapConstant, WindObserverMap
+from .KernelOptimizer      import KernelOptimizer
+from .WindMaps             import WindMapConstant, WindObserverMap, WindMapGrid, WindMapUav
 
 from .StdMap               import StdMap
 from .ValueMap             import ValueMap
@@ -11,13 +16,25 @@ from .ValueMap             import ValueMap
 from .FactoryBorder        import FactoryBorder
 from .BorderIncertitude    import BorderIncertitude
 from .BorderRaw            import BorderRaw
+from .ProbabilityMap       import ProbabilityMap
 
 from .MacroscopicFunctions import compute_com
 from .MacroscopicFunctions import compute_cross_section_border
+from .MacroscopicFunctions import compute_border_masks
+from .MacroscopicFunctions import compute_contour_segments
+from .MacroscopicFunctions import compute_contours
 from .MacroscopicFunctions import compute_cloud_volume
 from .MacroscopicFunctions import compute_bounding_box
 from .MacroscopicFunctions import get_number_of_elements
 from .MacroscopicFunctions import compute_list_of_coms
 from .MacroscopicFunctions import compute_selected_element_volume
+from .MacroscopicFunctions import compute_cloud_features
+from .MacroscopicFunctions import compute_label_features
+from .MacroscopicFunctions import compute_cloud_features_chunked
+from .MacroscopicFunctions import map_chunks
+from .MacroscopicFunctions import compute_cloud_metrics_adaptive
+from .MacroscopicFunctions import label_stack
+from .MacroscopicFunctions import compute_stack_features
 
 from .MapComparator import MapComparator
+from .CloudTracker  import CloudTracker
@@ -28,6 +28,9 @@ class Bounds:
         Set min and max attributes to None. (Next update, min and max
         attributes will be equal to value).
 
+    overlaps(other) -> bool:
+        Checks if [self.min, self.max] and [other.min, other.max] intersect.
+
 
     Class methods
     -------------
@@ -148,7 +151,15 @@ class Bounds:
             return True
 
 
-
-
-
-
+    def overlaps(self, other):
+        """
+        Checks if [self.min, self.max] and [other.min, other.max] intersect.
+        A None bound is considered infinite.
+        """
+        if self.min is not None and other.max is not None:
+            if other.max < self.min:
+                return False
+        if self.max is not None and other.min is not None:
+            if other.min > self.max:
+                return False
+        return True
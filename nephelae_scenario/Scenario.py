@@ -16,9 +16,9 @@ from nephelae_paparazzi         import Aircraft
 from nephelae_paparazzi.plugins import WindSimulation
 from nephelae_paparazzi.plugins.loaders import load_plugins
 
-from nephelae.mapping import WindMapConstant, WindObserverMap
+from nephelae.mapping import WindMapConstant, WindObserverMap, WindMapUav
 from nephelae.mapping import GprPredictor, ValueMap, StdMap
-from nephelae.mapping import BorderIncertitude, BorderRaw
+from nephelae.mapping import BorderIncertitude, BorderRaw, ProbabilityMap
 
 from nephelae_mesonh import MesonhDataset, MesonhMap
 
@@ -194,8 +194,8 @@ class Scenario(Pluginable):
 
     def load_wind_map(self, config):
         """
-        Instanciate WindMaps objects. These objects includes WindMapConstant and
-        WindObserverMap.
+        Instanciate WindMaps objects. These objects includes WindMapConstant,
+        WindObserverMap and WindMapUav.
         """
         config = ensure_dictionary(config)
         keys = config.keys()
@@ -219,6 +219,10 @@ class Scenario(Pluginable):
                 params['maxSamples'] = config['maxSamples']
             if 'minSamples' in keys:
                 params['minSamples'] = config['minSamples']
+            for key in ['mode', 'trackVariance', 'minPublishSamples',
+                        'minNotifyPeriod', 'changeThreshold']:
+                if key in keys:
+                    params[key] = config[key]
             if 'resolution' in keys:
                 params['resolution'] = config['resolution']
             if 'threshold' in keys:
@@ -226,6 +230,21 @@ class Scenario(Pluginable):
 
             self.windMap = WindObserverMap(**params)
             self.database.add_sensor_observer(self.windMap)
+        elif config['type'] == 'WindMapUav':
+            params['gridBounds'] = [Bounds(b[0], b[1]) for b in config['bounds']]
+            params['shape'] = config['shape']
+            for key in ['dimensions', 'lengthScales', 'variance',
+                        'noiseVariance', 'timeScale', 'notifyPeriod',
+                        'resolution', 'threshold']:
+                if key in keys:
+                    params[key] = config[key]
+            if 'sampleName' in keys:
+                params['sampleName'] = str(config['sampleName'])
+            if 'wind' in keys:
+                params['defaultWindValue'] = config['wind']
+
+            self.windMap = WindMapUav(**params)
+            self.database.add_sensor_observer(self.windMap)
         else:
             raise ValueError(config['type'] + " is not a valid map type. "+
                      "Cannot instanciate '" + config['name'] + "'.")
@@ -381,10 +400,24 @@ class Scenario(Pluginable):
                 if mapId+'_std' in self.maps.keys():
                     self.maps[mapId+'_border'] = BorderIncertitude(
                             config['border_map'], self.maps[mapId],
-                            self.maps[mapId+'_std'])
+                            self.maps[mapId+'_std'],
+                            contours=config.get('border_contours', False))
                 else:
                     self.maps[mapId+'_border'] = BorderRaw(config['border_map'],
-                            self.maps[mapId])
+                            self.maps[mapId],
+                            contours=config.get('border_contours', False))
+
+        if 'probability_map' in config.keys():
+            if mapId+'_probability' in self.maps.keys():
+                warn("The map '"+mapId+"_probability' id is already defined. "+
+                     "Cannot instanciate '"+config['probability_map']+"' map.")
+            elif mapId+'_std' not in self.maps.keys():
+                warn("Cannot instanciate '"+config['probability_map']+"' map "+
+                     "without a std_map.")
+            else:
+                self.maps[mapId+'_probability'] = ProbabilityMap(
+                        config['probability_map'], self.maps[mapId],
+                        self.maps[mapId+'_std'])
 
     def load_kernels(self, config):
         """
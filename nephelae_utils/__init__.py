@@ -1,3 +1,2 @@
 from . import analysis
-
-
+from . import benchmark
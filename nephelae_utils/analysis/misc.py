@@ -1,5 +1,4 @@
 import numpy as np
-from PIL import Image
 import matplotlib.pyplot as plt
 
 from .TimedData import TimedData
@@ -112,6 +111,8 @@ def display_scaled_array(array, axes=None, resample=None, rng=None):
     data = array.data.squeeze().T
 
     if resample is not None:
+        # pillow is optional (pip install nephelae[analysis])
+        from PIL import Image
         newShape = (data.shape[0]*resample, data.shape[1]*resample)
         data = np.array(Image.fromarray(data).resize(newShape, Image.BICUBIC))
 
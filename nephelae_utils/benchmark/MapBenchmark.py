@@ -0,0 +1,306 @@
+import json
+import time
+import threading
+import tracemalloc
+import numpy as np
+
+from nephelae.types    import Position, SensorSample
+from nephelae.database import NephelaeDataServer, SpatializedDatabase
+from nephelae.mapping  import MapServer, MapComparator
+
+
+def loiter_track(times, center, radius=200.0, period=40.0, altitude=1000.0,
+                 wind=(0.0, 0.0)):
+    """
+    (T x 4) positions of an aircraft loitering on a circle drifting with the
+    wind (to follow a cloud).
+    """
+    times = np.asarray(times, dtype=float)
+    angle = 2.0*np.pi*(times - times[0]) / period
+    track = np.empty((len(times), 4))
+    track[:,0] = times
+    track[:,1] = center[0] + wind[0]*(times - times[0]) + radius*np.cos(angle)
+    track[:,2] = center[1] + wind[1]*(times - times[0]) + radius*np.sin(angle)
+    track[:,3] = altitude
+    return track
+
+
+def simulate_database(referenceMap, tracks, noiseStd=0.0, variableName='RCT',
+                      seed=None):
+    """
+    Builds a NephelaeDataServer filled with samples of referenceMap taken
+    along aircraft tracks.
+
+    Parameters
+    ----------
+    referenceMap : MapInterface
+        Map sampled by the aircrafts (for example a SyntheticCloudMap).
+
+    tracks : dict({str:numpy.array (T x 4)})
+        (t,x,y,z) positions of the samples of each aircraft.
+
+    noiseStd : float
+        Standard deviation of the gaussian measurement noise.
+
+    variableName : str
+        Name of the sampled variable.
+    """
+    rng = np.random.RandomState(seed)
+    database = NephelaeDataServer()
+    for aircraft, track in tracks.items():
+        values = referenceMap.at_locations(track)
+        values = values + noiseStd*rng.normal(0.0, 1.0, values.shape)
+        for p, v in zip(track, values):
+            database.add_sample(SensorSample(variableName, str(aircraft), p[0],
+                                Position(p[0], p[1], p[2], p[3]), [v]))
+    return database
+
+
+class MapBenchmark:
+
+    """
+    MapBenchmark
+
+    Evaluates the speed and the accuracy of a mapping pipeline over a whole
+    mission, so that changes of its parameters (kernel span, resolution,
+    sample windows...) or implementation can be compared objectively.
+
+    The samples of a source database (a saved mission, or samples simulated
+    with simulate_database) are replayed in time order in a fresh database.
+    At each scheduled time, the samples up to this time are inserted and
+    the scheduled map slices are requested concurrently through a MapServer.
+    Each slice is then compared to the reference map (MesonhMap or
+    SyntheticCloudMap) with a MapComparator.
+
+    The report records throughput (requests per second of request
+    processing), request latencies, peak memory allocated during the run
+    (tracemalloc, numpy allocations included, measured in a separate
+    untimed replay) and error metrics (RMSE, bias and IoU of the thresholded
+    clouds, see MapComparator.compare_many), and can be saved as JSON (see
+    self.save_report).
+
+    Attributes
+    ----------
+    referenceMap : MapInterface
+        Ground truth.
+
+    mapBuilder : callable(NephelaeDataServer) -> MapInterface
+        Builds the evaluated map on the replay database (for example a
+        ValueMap on a GprPredictor reading the database).
+
+    schedule : list((float, list(tuple)))
+        Request times and keys of the slices requested at each time.
+
+    source : SpatializedDatabase
+        Database whose samples are replayed.
+
+    parameters : dict
+        Free description of the evaluated configuration, copied in the
+        report.
+
+    report : dict or None
+        Report of the last run.
+
+    Methods
+    -------
+    run(measureMemory=True) -> dict:
+        Replays the mission and returns the report.
+
+    replay(threshold) -> dict:
+        Replays the mission once (used by self.run).
+
+    save_report(path):
+        Writes the report of the last run as JSON.
+    """
+
+    def __init__(self, referenceMap, mapBuilder, schedule, source,
+                 mapId='map', threshold=None, maxConcurrency=2,
+                 parameters={}):
+
+        """
+        Parameters
+        ----------
+        referenceMap, mapBuilder, schedule, parameters :
+            See class attributes.
+
+        source : SpatializedDatabase or str
+            Database to replay, or path of a saved database.
+
+        mapId : str
+            Name of the evaluated map in the MapServer.
+
+        threshold : float or None
+            Cloud threshold of the IoU metric (referenceMap.threshold if
+            None).
+
+        maxConcurrency : int
+            Number of concurrent map computations in the MapServer.
+        """
+        if isinstance(source, str):
+            source = SpatializedDatabase.load(source)
+        self.referenceMap   = referenceMap
+        self.mapBuilder     = mapBuilder
+        self.schedule       = sorted(schedule, key=lambda s: s[0])
+        self.source         = source
+        self.mapId          = mapId
+        self.threshold      = threshold
+        self.maxConcurrency = maxConcurrency
+        self.parameters     = dict(parameters)
+        self.report         = None
+
+
+    def replay_until(self, database, entries, t):
+        """Inserts in database the replayed entries up to time t. Returns
+        the number of inserted entries."""
+        count = 0
+        while self.replayIndex < len(entries) and \
+              entries[self.replayIndex].index <= t:
+            entry = entries[self.replayIndex].data
+            if 'SAMPLE' in entry.tags:
+                database.add_sample(entry.data)
+            elif 'GPS' in entry.tags:
+                database.add_gps(entry.data)
+            self.replayIndex += 1
+            count += 1
+        return count
+
+
+    def replay(self, threshold):
+        """
+        Replays the mission once on a fresh database, map and MapServer.
+
+        Returns
+        -------
+        dict
+            'steps' (per-step records of the report), 'latencies',
+            'processingTime', 'references' and 'results' (compared slices),
+            'comparator', 'resolution' and 'server' (MapServer statistics).
+        """
+        database  = NephelaeDataServer()
+        estimated = self.mapBuilder(database)
+        server    = MapServer(mapSet={self.mapId: estimated},
+                              maxConcurrency=self.maxConcurrency)
+        comparator = MapComparator(self.referenceMap, estimated)
+        entries = self.source.taggedData['ALL'].tSorted
+        self.replayIndex = 0
+
+        steps       = []
+        latencies   = []
+        slices1     = []
+        slices2     = []
+        processing  = 0.0
+        try:
+            for t, keysList in self.schedule:
+                inserted = self.replay_until(database, entries, t)
+                references = [self.referenceMap[keys] for keys in keysList]
+                keys2 = [comparator.aligned_keys(keys, s1)[0]
+                         for keys, s1 in zip(keysList, references)]
+
+                t0 = time.perf_counter()
+                doneTimes = {}
+                lock = threading.Lock()
+                def done(index):
+                    def callback(future):
+                        with lock:
+                            doneTimes[index] = time.perf_counter()
+                    return callback
+                futures = []
+                for i, keys in enumerate(keys2):
+                    futures.append(server.submit(self.mapId, keys))
+                    futures[-1].add_done_callback(done(i))
+                results = [f.result() for f in futures]
+                t1 = time.perf_counter()
+                processing += t1 - t0
+                stepLatencies = [doneTimes.get(i, t1) - t0
+                                 for i in range(len(futures))]
+                latencies.extend(stepLatencies)
+
+                metrics = comparator.compare_slices(references, results,
+                                                    threshold)
+                slices1.extend(references)
+                slices2.extend(results)
+                steps.append({'t'         : float(t),
+                              'samples'   : inserted,
+                              'latencies' : stepLatencies,
+                              'rmse'      : metrics['rmse'].tolist(),
+                              'bias'      : metrics['bias'].tolist(),
+                              'iou'       : metrics['iou'].tolist()})
+        finally:
+            server.shutdown()
+
+        return {'steps'          : steps,
+                'latencies'      : latencies,
+                'processingTime' : processing,
+                'references'     : slices1,
+                'results'        : slices2,
+                'comparator'     : comparator,
+                'resolution'     : [float(r) for r in estimated.resolution()],
+                'server'         : dict(server.stats)}
+
+
+    def run(self, measureMemory=True):
+        """
+        Replays the mission, requests and evaluates the scheduled maps.
+        Returns the report (also kept in self.report).
+
+        Timings and metrics come from a replay without memory tracing.
+        If measureMemory is True, the mission is replayed a second time
+        with tracemalloc running to measure the peak memory (tracemalloc
+        slows allocations down, so this pass is not timed). Otherwise
+        'peakMemory' is None in the report.
+        """
+        threshold = self.threshold
+        if threshold is None:
+            threshold = self.referenceMap.threshold
+
+        timed = self.replay(threshold)
+
+        peakMemory = None
+        if measureMemory:
+            tracemalloc.start()
+            try:
+                self.replay(threshold)
+                peakMemory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        total = timed['comparator'].compare_slices(timed['references'],
+                                                   timed['results'], threshold)
+        latencies  = np.array(timed['latencies'])
+        processing = timed['processingTime']
+        self.report = {
+            'parameters'  : self.parameters,
+            'resolution'  : timed['resolution'],
+            'nbRequests'  : len(latencies),
+            'processingTime' : processing,
+            'throughput'  : len(latencies) / processing if processing > 0.0
+                            else None,
+            'latency'     : {'mean'   : float(np.mean(latencies)),
+                             'median' : float(np.median(latencies)),
+                             'p95'    : float(np.percentile(latencies, 95)),
+                             'max'    : float(np.max(latencies))}
+                            if len(latencies) > 0 else None,
+            'peakMemory'  : peakMemory,
+            'metrics'     : {'rmse' : float(total['rmseTotal']),
+                             'bias' : float(total['biasTotal']),
+                             'iou'  : float(total['iouTotal'])},
+            'server'      : timed['server'],
+            'steps'       : timed['steps']}
+        return self.report
+
+
+    def save_report(self, path):
+        """Writes the report of the last run as JSON (NaN metrics, for
+        example the IoU of slices without cloud, are written as null)."""
+        def clean(value):
+            if isinstance(value, dict):
+                return {k: clean(v) for k, v in value.items()}
+            if isinstance(value, (list, tuple)):
+                return [clean(v) for v in value]
+            if isinstance(value, (float, np.floating)):
+                return None if np.isnan(value) else float(value)
+            if isinstance(value, np.integer):
+                return int(value)
+            return value
+        with open(path, 'w') as f:
+            json.dump(clean(self.report), f, indent=4)
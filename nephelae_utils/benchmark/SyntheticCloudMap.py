@@ -0,0 +1,132 @@
+import numpy as np
+
+from nephelae.types   import Bounds
+from nephelae.mapping import MapInterface
+
+
+class SyntheticCloudMap(MapInterface):
+
+    """
+    SyntheticCloudMap
+
+    Analytic cloud field used as a MesoNH-like reference when no MesoNH
+    dataset is available (benchmarks, tests). The field is a sum of cloud
+    cells drifting with a constant wind. Each cell has a gaussian shape
+    (horizontal radius, vertical thickness around its altitude), a life
+    cycle (growth and dissipation over its lifetime) and a small scale
+    modulation of its liquid water content.
+
+    The field can be evaluated at any location (see self.at_locations), so
+    slices can be requested at any resolution.
+
+    Attributes
+    ----------
+    cells : numpy.array (structured)
+        Parameters of the cloud cells ('x', 'y', 'z' : location at time
+        'birth', 'radius', 'thickness', 'lwc' : max liquid water content,
+        'lifetime', 'k' : modulation wave vector, 'phase').
+
+    wind : numpy.array (2)
+        Horizontal drift of the cells.
+    """
+
+    def __init__(self, name, bounds, nbCells=20, wind=(5.0, 1.0),
+                 resolution=(1.0, 25.0, 25.0, 25.0), lwc=1.0e-3,
+                 radius=(100.0, 250.0), thickness=(80.0, 200.0),
+                 lifetime=(300.0, 900.0), threshold=2.0e-4, seed=None):
+
+        """
+        Parameters
+        ----------
+        name : str
+            Name of the map.
+
+        bounds : list(nephelae.types.Bounds) (t,x,y,z)
+            Space-time domain where cells are created (cells are born in the
+            domain and may drift outside of it).
+
+        nbCells : int
+            Number of cloud cells.
+
+        wind : (float, float)
+            Horizontal drift of the cells (m/s).
+
+        resolution : (float, float, float, float)
+            Resolution returned by self.resolution (the field is analytic,
+            this only sets the default sampling of the slices).
+
+        lwc : float
+            Maximum liquid water content of the cells.
+
+        radius, thickness, lifetime : (float, float)
+            Ranges of the cell parameters (uniformly drawn).
+
+        threshold : float
+            Cloud threshold of the map.
+
+        seed : int or None
+            Seed of the random cell generation.
+        """
+        super().__init__(name, threshold=threshold)
+        self.domain = bounds
+        self.wind   = np.array(wind, dtype=float)
+        self.res    = np.array(resolution, dtype=float)
+
+        rng = np.random.RandomState(seed)
+        self.cells = np.zeros(nbCells, dtype=[
+            ('birth', float), ('x', float), ('y', float), ('z', float),
+            ('radius', float), ('thickness', float), ('lwc', float),
+            ('lifetime', float), ('k', float, (2,)), ('phase', float)])
+        uniform = lambda b, n: rng.uniform(b[0], b[1], n)
+        self.cells['lifetime']  = uniform(lifetime, nbCells)
+        self.cells['birth']     = uniform((bounds[0].min - 0.5*lifetime[1],
+                                           bounds[0].max), nbCells)
+        self.cells['x']         = uniform((bounds[1].min, bounds[1].max), nbCells)
+        self.cells['y']         = uniform((bounds[2].min, bounds[2].max), nbCells)
+        self.cells['z']         = uniform((bounds[3].min, bounds[3].max), nbCells)
+        self.cells['radius']    = uniform(radius, nbCells)
+        self.cells['thickness'] = uniform(thickness, nbCells)
+        self.cells['lwc']       = lwc*uniform((0.5, 1.0), nbCells)
+        self.cells['k']         = rng.normal(0.0, 1.0, (nbCells, 2)) \
+                                / self.cells['radius'][:,np.newaxis]
+        self.cells['phase']     = uniform((0.0, 2.0*np.pi), nbCells)
+
+
+    def at_locations(self, locations):
+        locations = np.asarray(locations, dtype=float)
+        t, x, y, z = (locations[:,i] for i in range(4))
+        res = np.zeros(locations.shape[0])
+        for cell in self.cells:
+            age = (t - cell['birth']) / cell['lifetime']
+            alive = (age > 0.0) & (age < 1.0)
+            if not np.any(alive):
+                continue
+            dx = x[alive] - cell['x'] - self.wind[0]*(t[alive] - cell['birth'])
+            dy = y[alive] - cell['y'] - self.wind[1]*(t[alive] - cell['birth'])
+            dz = z[alive] - cell['z']
+            res[alive] += cell['lwc']*np.sin(np.pi*age[alive]) \
+                * np.exp(-0.5*(dx*dx + dy*dy) / cell['radius']**2
+                         -0.5*dz*dz / cell['thickness']**2) \
+                * (1.0 + 0.3*np.sin(cell['k'][0]*dx + cell['k'][1]*dy
+                                    + cell['phase']))
+        return res
+
+
+    def shape(self):
+        return (None, None, None, None)
+
+
+    def span(self):
+        return tuple(b.max - b.min for b in self.domain)
+
+
+    def bounds(self):
+        return tuple(Bounds(b.min, b.max) for b in self.domain)
+
+
+    def resolution(self):
+        return self.res
+
+
+    def sample_size(self):
+        return 1
@@ -0,0 +1,2 @@
+from .SyntheticCloudMap import SyntheticCloudMap
+from .MapBenchmark      import MapBenchmark, simulate_database, loiter_track
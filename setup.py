@@ -16,9 +16,11 @@ setup(name='nephelae',
         'matplotlib',
         'scikit-learn',
         'sh',
-        'PyYAML',
-        'pillow'
+        'PyYAML'
       ],
+      # pillow is only used for bicubic resampling in nephelae_utils.analysis
+      # display helpers and in examples (MapComparator uses scipy).
+      extras_require={'analysis': ['pillow']},
       zip_safe=False)
 
 
@@ -0,0 +1,70 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.mapping         import ValueMap, StdMap, BorderIncertitude, GprPredictor, WindKernel, WindMapConstant
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# Value, std and border maps computed from a single GPR fit, and reuse of
+# derived maps computed from cached parents.
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 600):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+valueMap = ValueMap('RCT', gpr)
+stdMap   = StdMap('RCT_std', gpr)
+border   = BorderIncertitude('RCT_border', valueMap, stdMap)
+gpr.threshold = border.threshold = 2.0e-4
+
+fits = []
+fit = gpr.compute_predictions
+def counted_fit(*args, **kwargs):
+    fits.append(1)
+    return fit(*args, **kwargs)
+gpr.compute_predictions = counted_fit
+
+keys0 = (1200.0, slice(1000.0, 2500.0), slice(200.0, 1200.0), 1000.0)
+keys1 = (1200.0, slice(1000.0, 2500.0), slice(200.0, 1200.0), 1050.0)
+
+value = valueMap[keys0]
+print("Value request :", len(fits), "fit(s)")
+inner, outer = border[keys1]
+print("Border request at other keys :", len(fits), "fit(s) (one more expected)")
+value, std = valueMap.get_maps(keys1)
+print("Value and std after border :", len(fits), "fit(s) (no new fit expected)")
+
+t0 = time.time()
+inner2, outer2 = border[keys1]
+print("Border request with cached parents : {:.5f}s, reused : {}".format(
+      time.time() - t0, inner2 is inner))
+
+database.add_sample(SensorSample('RCT', '7', 1200.0,
+                    Position(1200.0, 1700.0, 700.0, 1050.0), [1.0e-3]))
+inner3, outer3 = border[keys1]
+print("Border after new sample :", len(fits), "fit(s), recomputed :",
+      inner3 is not inner)
+print("Inner/outer border pixels :", inner3.data.sum(), outer3.data.sum())
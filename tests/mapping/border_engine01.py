@@ -0,0 +1,78 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+sys.path.append('../')
+import numpy as np
+import time
+from scipy import ndimage
+
+from nephelae.array   import ScaledArray, DimensionHelper
+from nephelae.mapping import compute_border_masks, compute_contour_segments
+from nephelae.mapping import compute_contours
+
+from helpers.helpers import *
+
+# Single pass inner/raw/outer borders against one binary erosion per mask,
+# and contour segments against the raster border.
+
+np.random.seed(4)
+shape = (600, 600)
+value = ndimage.gaussian_filter(np.random.normal(0.0, 1.0, shape), 4.0) * 1.0e-2
+std   = np.abs(ndimage.gaussian_filter(np.random.normal(0.0, 1.0, shape), 8.0)) * 2.0e-3
+threshold = 2e-4
+
+def erosion_borders(value, std, threshold):
+    res = []
+    for data in (value - std, value, value + std):
+        mask = (data > threshold).astype(np.int32)
+        eroded = ndimage.binary_erosion(mask).astype(mask.dtype)
+        res.append(np.bitwise_xor(mask, eroded))
+    return res
+
+t0 = time.time()
+reference = erosion_borders(value, std, threshold)
+t1 = time.time()
+borders = compute_border_masks(value, std, threshold)
+t2 = time.time()
+print("Borders : 3 binary erosions {:.4f}s, single pass {:.4f}s".format(
+      t1 - t0, t2 - t1))
+print("Same inner/raw/outer borders :",
+      [np.array_equal(r.astype(bool), b) for r, b in zip(reference, borders)])
+print("Same raw border alone        :",
+      np.array_equal(compute_border_masks(value, threshold=threshold),
+                     reference[1].astype(bool)))
+
+dims = DimensionHelper()
+dims.add_dimension([0.0, 5990.0], 'linear', shape[0])
+dims.add_dimension([0.0, 5990.0], 'linear', shape[1])
+t0 = time.time()
+segments = compute_contour_segments(value, threshold, dims)
+t1 = time.time()
+polylines = compute_contours(value, threshold, dims)
+t2 = time.time()
+polylinesSize = sum(p.nbytes for p in polylines)
+print("{} contour segments in {:.4f}s ({} bytes)".format(
+      len(segments), t1 - t0, segments.nbytes))
+print("{} contour polylines in {:.4f}s ({} bytes, raster border : {} bytes)".format(
+      len(polylines), t2 - t1, polylinesSize, borders[1].nbytes))
+assert all(p.dtype == np.float32 for p in polylines)
+assert sum(len(p) - 1 for p in polylines) == len(segments)
+assert polylinesSize < borders[1].nbytes
+assert polylinesSize < segments.nbytes / 3
+
+# Segment end points are on the contour and close to border pixels
+indexes = compute_contour_segments(value, threshold).reshape(-1,2)
+interpolated = ndimage.map_coordinates(value, indexes.T, order=1)
+print("Max |value - threshold| at segment end points :",
+      np.abs(interpolated - threshold).max())
+nearest = np.round(indexes).astype(int)
+print("End points next to a raw border pixel :", np.mean(
+      ndimage.binary_dilation(borders[1])[nearest[:,0], nearest[:,1]]))
+
+# Polylines vertices are the segments end points, each stored once
+vertices = np.concatenate(compute_contours(value, threshold))
+print("Polyline vertices on the contour :", np.abs(ndimage.map_coordinates(
+      value, vertices.T.astype(float), order=1) - threshold).max() < 1.0e-3*threshold)
+closed = sum(np.array_equal(p[0], p[-1]) for p in polylines)
+print("Closed polylines : {} / {}".format(closed, len(polylines)))
@@ -0,0 +1,73 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+from sklearn.gaussian_process import GaussianProcessRegressor
+
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+from nephelae.mapping         import CholeskyGpr, GprPredictor, WindKernel, WindMapConstant
+
+# Comparing CholeskyGpr with scikit-learn GaussianProcessRegressor.
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 1500):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+
+keys = (1150.0, slice(800.0, 2000.0), slice(200.0, 1400.0), 1000.0)
+locations, dims, shape = gpr.compute_locations(keys)
+X, Y = gpr.fetch_samples(gpr.location_bounds(locations))
+print("Training samples :", X.shape[0], ", predicted locations :", locations.shape[0])
+
+t0 = time.time()
+skGpr = GaussianProcessRegressor(gpr.kernel, alpha=0.0, optimizer=None,
+                                 copy_X_train=False).fit(X, Y)
+skMean, skStd = skGpr.predict(locations, return_std=True)
+t1 = time.time()
+engine = CholeskyGpr(gpr.kernel).fit(X, Y)
+mean, std = engine.predict(locations, return_std=True)
+t2 = time.time()
+
+print("scikit-learn : {:.3f}s, CholeskyGpr : {:.3f}s".format(t1 - t0, t2 - t1))
+print("Max mean difference : {:.3e}".format(np.abs(mean - skMean.reshape(mean.shape)).max()))
+print("Max std difference  : {:.3e}".format(np.abs(std - skStd.reshape(std.shape)).max()))
+
+# Non-zero process mean : far from samples, prediction must go to the mean
+gpr.kernel.mean = 1.0e-4
+engine.fit(X, Y)
+print("Prediction far from samples :", engine.predict(np.array([[1150.0, -5000.0, -5000.0, 1000.0]])),
+      "(mean : {})".format(gpr.kernel.mean))
+
+# Std maps cost : variance is computed blockwise in place (no P x P matrix).
+import tracemalloc
+keys = (1150.0, slice(0.0, 3000.0), slice(0.0, 2000.0), 1000.0)
+locations, dims, shape = gpr.compute_locations(keys)
+for returnStd in [False, True]:
+    tracemalloc.start()
+    t0 = time.time()
+    engine.predict(locations, return_std=returnStd)
+    print("return_std={} : {:.3f}s, peak memory {:.1f}MB".format(returnStd,
+          time.time() - t0, tracemalloc.get_traced_memory()[1] / 1.0e6))
+    tracemalloc.stop()
@@ -0,0 +1,62 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+sys.path.append('../')
+import numpy as np
+import time
+from scipy import ndimage
+
+from nephelae.array   import ScaledArray, DimensionHelper
+from nephelae.mapping import compute_cloud_features, compute_list_of_coms
+from nephelae.mapping import compute_bounding_box, get_number_of_elements
+
+from helpers.helpers import *
+
+# Checking single pass cloud features against the former per-cloud loops
+# (one full scan of the array per cloud).
+
+def loop_coms_and_boxes(scaledArr, threshold):
+    data_labeled, number_of_elements = get_number_of_elements(scaledArr,
+                                                              threshold)
+    coms, boxes = [], []
+    for i in range(1, number_of_elements + 1):
+        locations = np.array(np.where(data_labeled == i))
+        data = scaledArr.data[tuple(locations)].ravel()
+        coms.append(scaledArr.dimHelper.to_unit(
+            np.sum(locations*data, axis=1) / np.sum(data)))
+        boxes.append((scaledArr.dimHelper.to_unit(np.amin(locations, axis=1).tolist()),
+                      scaledArr.dimHelper.to_unit(np.amax(locations, axis=1).tolist())))
+    return coms, boxes
+
+# Random cloud field with many cells
+np.random.seed(0)
+shape = (400, 400)
+field = ndimage.gaussian_filter(np.random.normal(0.0, 1.0, shape), 3.0)
+field = np.maximum(field - 0.05, 0.0) * 1.0e-2
+
+dims = DimensionHelper()
+dims.add_dimension([-5000.0, 5000.0], 'linear', shape[0])
+dims.add_dimension([0.0, 4000.0], 'linear', shape[1])
+scaledArr = ScaledArray(field, dims)
+threshold = 2e-4
+
+t0 = time.time()
+features = compute_cloud_features(scaledArr, threshold)
+t1 = time.time()
+coms, boxes = loop_coms_and_boxes(scaledArr, threshold)
+t2 = time.time()
+print("{} clouds, single pass : {:.4f}s, per cloud loops : {:.4f}s".format(
+      len(features), t1 - t0, t2 - t1))
+
+print("Max com difference    :",
+      np.abs(features['com'] - np.array(coms)).max())
+print("Max box difference    :",
+      max(np.abs(features['boxMin'] - np.array([b[0] for b in boxes])).max(),
+          np.abs(features['boxMax'] - np.array([b[1] for b in boxes])).max()))
+print("compute_list_of_coms  :", len(compute_list_of_coms(scaledArr, threshold)))
+print("compute_bounding_box  :", compute_bounding_box(scaledArr, threshold)[0])
+biggest = features[np.argmax(features['volume'])]
+print("Biggest cloud : volume {}, com {}, max value {:.3e}, total {:.3e}".format(
+      biggest['volume'], biggest['com'], biggest['maxValue'],
+      biggest['totalValue']))
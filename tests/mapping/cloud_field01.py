@@ -0,0 +1,51 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+sys.path.append('../')
+import numpy as np
+import time
+from scipy import ndimage
+
+from nephelae.array    import ScaledArray, DimensionHelper
+from nephelae.database import CloudData, CloudField
+
+from helpers.helpers import *
+
+# Extracting all clouds of an array with CloudField (single labeling) and
+# checking CloudData views against per-cloud full array scans.
+
+np.random.seed(1)
+shape = (500, 500)
+field = ndimage.gaussian_filter(np.random.normal(0.0, 1.0, shape), 3.0)
+field = np.maximum(field - 0.05, 0.0) * 1.0e-2
+
+dims = DimensionHelper()
+dims.add_dimension([-5000.0, 5000.0], 'linear', shape[0])
+dims.add_dimension([0.0, 5000.0], 'linear', shape[1])
+scaledArr = ScaledArray(field, dims)
+
+t0 = time.time()
+clouds = CloudData.from_scaledArray(scaledArr)
+coms = [c.get_com() for c in clouds]
+surfaces = [c.get_surface() for c in clouds]
+boxes = [c.get_bounding_box() for c in clouds]
+t1 = time.time()
+
+cloudField = clouds[0].get_field()
+fullScans = [CloudData(scaledArr, cloudField.dataLabeled, c.get_index())
+             for c in clouds]
+fullComs = [c.get_com() for c in fullScans]
+fullSurfaces = [c.get_surface() for c in fullScans]
+t2 = time.time()
+print("{} clouds ({} touching borders) : CloudField {:.4f}s, full scans {:.4f}s".format(
+      len(clouds), len(cloudField.borderLabels), t1 - t0, t2 - t1))
+print("Max com difference :", np.abs(np.array(coms) - np.array(fullComs)).max())
+print("Same surfaces      :", surfaces == fullSurfaces)
+print("Same locations     :", all(np.array_equal(c.get_locations(), f.get_locations())
+                                  for c, f in zip(clouds[:20], fullScans[:20])))
+print("No border cloud    :", not any(cloudField.touches_border(c.get_index())
+                                      for c in clouds))
+
+coords = tuple(np.argwhere(cloudField.dataLabeled > 0)[0])
+print("Cloud at", coords, ":", cloudField.cloud_at(coords).get_bounding_box())
@@ -0,0 +1,86 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+
+from nephelae.mapping         import ValueMap, GprPredictor, WindKernel, WindMapConstant
+from nephelae.mapping         import compute_cloud_features, compute_cloud_metrics_adaptive
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# Cloud metrics computed from the GPR posterior with adaptive refinement of
+# the cloud border against the metrics of the dense map.
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 600):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+valueMap = ValueMap('RCT', gpr)
+threshold = 2.0e-4
+
+keys = (1200.0, slice(1000.0, 2500.0), slice(200.0, 1200.0), 1000.0)
+
+t0 = time.time()
+dense = valueMap[keys]
+features = compute_cloud_features(dense, threshold)
+t1 = time.time()
+# Pixel measure of the grid of the map request
+steps = np.array([gpr.slice_grid(k, r)[1]
+                  for k, r in zip(keys[1:3], gpr.resolution()[1:3])])
+denseCount  = np.sum(features['volume'])
+denseVolume = denseCount*np.prod(steps)
+denseTotal  = np.sum(features['totalValue'])*np.prod(steps)
+denseCom    = np.sum(features['com']*features['totalValue'][:,np.newaxis],
+                     axis=0) / np.sum(features['totalValue'])
+print("Dense    : volume {:.0f}, total {:.4e}, com {}, {} pixels ({:.3f}s)".format(
+      denseVolume, denseTotal, denseCom, dense.data.size, t1 - t0))
+
+# The cloud spans about 20 x 16 nodes : levels are limited so that coarse
+# cells (2**levels nodes wide) are smaller than the cloud (see the docstring
+# of compute_cloud_metrics_adaptive).
+for levels in [0, 1, 2, 3]:
+    t0 = time.time()
+    metrics = compute_cloud_metrics_adaptive(gpr, keys, threshold, levels)
+    t1 = time.time()
+    print("levels {} : volume {:.0f}, total {:.4e}, com {}, {} evaluations ({:.3f}s)".format(
+          levels, metrics['volume'], metrics['totalValue'],
+          np.array(metrics['com']), metrics['nbEvaluations'], t1 - t0))
+    assert metrics['denseEvaluations'] == dense.data.size
+    if levels == 0:
+        # Same grid and same posterior as the dense map
+        assert metrics['nbEvaluations'] == dense.data.size
+        assert metrics['nbPixels'] == denseCount
+        assert np.isclose(metrics['totalValue'], denseTotal, rtol=1e-6)
+        assert np.allclose(metrics['com'], denseCom, atol=1e-3)
+    else:
+        assert metrics['nbEvaluations'] < dense.data.size
+        assert abs(metrics['nbPixels'] - denseCount) <= 0.01*denseCount
+        assert abs(metrics['totalValue'] - denseTotal) < 0.01*denseTotal
+        assert np.linalg.norm(np.array(metrics['com']) - denseCom) < 0.1*np.min(steps)
+
+# Region without cloud
+metrics = compute_cloud_metrics_adaptive(gpr,
+    (1200.0, slice(3000.0, 4000.0), slice(3000.0, 4000.0), 1000.0), threshold)
+assert metrics['volume'] == 0.0 and metrics['com'] is None
+print("Ok")
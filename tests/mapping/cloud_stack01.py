@@ -0,0 +1,67 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+sys.path.append('../')
+import numpy as np
+import time
+from scipy import ndimage
+
+from nephelae.array   import ScaledArray, DimensionHelper
+from nephelae.mapping import compute_cloud_features, compute_stack_features
+from nephelae.mapping import label_stack
+
+from helpers.helpers import *
+
+# Labeling of a (T,X,Y) stack of frames in one call against a frame by frame
+# labeling loop.
+
+np.random.seed(5)
+shape = (400, 120, 120)
+stack = ndimage.gaussian_filter(np.random.normal(0.0, 1.0, shape), (1.5, 2.5, 2.5))
+stack = np.maximum(stack - 0.05, 0.0) * 1.0e-2
+dims = DimensionHelper()
+dims.add_dimension([1000.0, 1000.0 + 10.0*(shape[0] - 1)], 'linear', shape[0])
+dims.add_dimension([0.0, 25.0*(shape[1] - 1)], 'linear', shape[1])
+dims.add_dimension([0.0, 25.0*(shape[2] - 1)], 'linear', shape[2])
+stackArr = ScaledArray(stack, dims)
+
+for connectivity in [1, 2]:
+    t0 = time.time()
+    frames = []
+    for i in range(shape[0]):
+        frameDims = DimensionHelper()
+        frameDims.add_dimension([0.0, 25.0*(shape[1] - 1)], 'linear', shape[1])
+        frameDims.add_dimension([0.0, 25.0*(shape[2] - 1)], 'linear', shape[2])
+        frames.append(compute_cloud_features(ScaledArray(stack[i], frameDims),
+                                             connectivity=connectivity))
+    t1 = time.time()
+    features = compute_stack_features(stackArr, connectivity=connectivity)
+    t2 = time.time()
+    print("connectivity {} : {} clouds, frame loop {:.3f}s, stack {:.3f}s".format(
+          connectivity, len(features), t1 - t0, t2 - t1))
+
+    assert np.all(features['firstFrame'] == features['lastFrame'])
+    assert np.all(np.diff(features['firstFrame']) >= 0)
+    offsets = np.searchsorted(features['firstFrame'], np.arange(shape[0] + 1))
+    for i, f in enumerate(frames):
+        fs = features[offsets[i]:offsets[i+1]]
+        assert len(fs) == len(f)
+        assert np.all(fs['volume'] == f['volume'])
+        assert np.allclose(fs['totalValue'], f['totalValue'])
+        assert np.allclose(fs['com'][:,1:], f['com'])
+        assert np.allclose(fs['com'][:,0], dims.dims[0].toUnit(i))
+        assert np.allclose(fs['boxMin'][:,1:], f['boxMin'])
+
+# Space time volume : same as a 3D labeling
+labeled, n = label_stack(stack, spaceTime=True)
+reference, nRef = ndimage.label(stack > 2.0e-4)
+assert n == nRef and np.all(labeled == reference)
+features = compute_stack_features(stackArr, spaceTime=True)
+objects = ndimage.find_objects(reference)
+assert np.all(features['firstFrame'] == [obj[0].start for obj in objects])
+assert np.all(features['lastFrame'] == [obj[0].stop - 1 for obj in objects])
+durations = features['lastFrame'] - features['firstFrame'] + 1
+print("space time : {} clouds, mean lifetime {:.1f} frames".format(
+      len(features), np.mean(durations)))
+print("Ok")
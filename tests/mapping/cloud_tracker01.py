@@ -0,0 +1,97 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+sys.path.append('../')
+import numpy as np
+import time
+
+from nephelae.array   import ScaledArray, DimensionHelper
+from nephelae.mapping import CloudTracker, WindMapConstant
+
+from helpers.helpers import *
+
+# Tracking synthetic clouds advected by a constant wind over successive
+# frames, with the distance and the overlap association costs.
+
+wind = np.array([8.0, 2.0])
+shape = (300, 200)
+dims = DimensionHelper()
+dims.add_dimension([0.0, 6000.0], 'linear', shape[0])
+dims.add_dimension([0.0, 4000.0], 'linear', shape[1])
+x, y = np.meshgrid(np.linspace(0.0, 6000.0, shape[0]),
+                   np.linspace(0.0, 4000.0, shape[1]), indexing='ij')
+
+np.random.seed(2)
+nbClouds = 12
+centers = np.random.uniform([500.0, 500.0], [3000.0, 3500.0], (nbClouds, 2))
+radii   = np.random.uniform(60.0, 100.0, nbClouds)
+# Some clouds appear late and some dissipate early
+births  = np.random.randint(0, 10, nbClouds)
+deaths  = np.random.randint(20, 40, nbClouds)
+
+def frame(t):
+    data = np.zeros(shape)
+    for c, r, b, d in zip(centers, radii, births, deaths):
+        if b <= t / 10.0 < d:
+            cx, cy = c + wind*t
+            data += 1.0e-3*np.exp(-((x - cx)**2 + (y - cy)**2) / (2.0*r**2))
+    return ScaledArray(data, dims)
+
+frames = [(t, frame(t)) for t in np.arange(0.0, 400.0, 10.0)]
+for mode in ['distance', 'overlap']:
+    tracker = CloudTracker(windMap=WindMapConstant('Wind', wind),
+                           threshold=2e-4, mode=mode, maxDistance=150.0)
+    t0 = time.time()
+    for t, f in frames:
+        tracker.add_frame(t, f)
+    t1 = time.time()
+    lengths = [len(tracker.get_track(i)['t']) for i in tracker.tracks]
+    velocities = [np.diff(tr['com'], axis=0) / np.diff(tr['t'])[:,np.newaxis]
+                  for tr in [tracker.get_track(i) for i in tracker.tracks]
+                  if len(tr['t']) > 1]
+    print("{:8} : {:.4f}s per frame, {} tracks for {} clouds (lengths {})".format(
+          mode, (t1 - t0) / len(frames), len(tracker.tracks), nbClouds,
+          sorted(lengths)))
+    print("           mean cloud velocity :", np.mean(np.concatenate(velocities), axis=0),
+          "wind :", wind)
+
+# Checks on simple scenes : blobs defined by their (x,y) centers and radius
+# at each frame, no wind.
+def blobs(centers, radius=80.0):
+    data = np.zeros(shape)
+    for cx, cy in centers:
+        data += 1.0e-3*np.exp(-((x - cx)**2 + (y - cy)**2) / (2.0*radius**2))
+    return ScaledArray(data, dims)
+
+for mode in ['distance', 'overlap']:
+    # A shifted blob keeps its track id, a blob appearing far away gets a
+    # new one.
+    tracker = CloudTracker(threshold=2e-4, mode=mode, maxDistance=300.0)
+    ids = [tracker.add_frame(t, blobs([(1000.0 + 10.0*t, 2000.0)]))
+           for t in range(0, 50, 10)]
+    assert all(len(i) == 1 and i[0] == ids[0][0] for i in ids)
+    assert len(tracker.get_track(ids[0][0])['t']) == 5
+    ids = tracker.add_frame(50.0, blobs([(1500.0, 2000.0), (5000.0, 500.0)]))
+    assert ids[0] == 0 and ids[1] == 1
+    assert tracker.get_track(1)['splitFrom'] is None
+
+    # Split : an elongated cloud breaks in two parts
+    tracker = CloudTracker(threshold=2e-4, mode=mode, maxDistance=300.0)
+    parent = tracker.add_frame(0.0, blobs([(1960.0, 2000.0), (2140.0, 2000.0)]))
+    parts  = tracker.add_frame(10.0, blobs([(1850.0, 2000.0), (2250.0, 2000.0)]))
+    assert len(parent) == 1 and len(parts) == 2
+    assert parent[0] in parts
+    child = [i for i in parts if i != parent[0]][0]
+    assert tracker.get_track(child)['splitFrom'] == parent[0]
+
+    # Merge : two clouds join, one track continues, the other is closed
+    tracker = CloudTracker(threshold=2e-4, mode=mode, maxDistance=300.0,
+                           maxMissedFrames=2)
+    before = tracker.add_frame(0.0, blobs([(1850.0, 2000.0), (2250.0, 2000.0)]))
+    after  = tracker.add_frame(10.0, blobs([(1960.0, 2000.0), (2140.0, 2000.0)]))
+    assert len(before) == 2 and len(after) == 1 and after[0] in before
+    merged = [i for i in before if i != after[0]][0]
+    track = tracker.get_track(merged)
+    assert track['mergedInto'] == after[0] and track['closed']
+    print("{:8} : same track across frames, new track, split, merge : ok".format(mode))
@@ -0,0 +1,116 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+from scipy import ndimage
+
+from nephelae.array           import ScaledArray, DimensionHelper
+from nephelae.mapping         import ValueMap, GprPredictor, WindKernel, WindMapConstant
+from nephelae.mapping         import compute_cloud_features, compute_cloud_features_chunked
+from nephelae.mapping         import map_chunks
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# 3D connected components : whole volume labeling against slab by slab
+# labeling with merging of the labels across slabs.
+
+def array_chunks(scaledArr, axis, chunkSize):
+    """Slabs of an array along axis (as if requested one by one)"""
+    bounds = scaledArr.dimHelper.bounds()
+    for start in range(0, scaledArr.shape[axis], chunkSize):
+        stop = min(start + chunkSize, scaledArr.shape[axis])
+        keys = [slice(None)]*scaledArr.data.ndim
+        keys[axis] = slice(start, stop)
+        dims = DimensionHelper()
+        for d, b in enumerate(bounds):
+            size = scaledArr.shape[d]
+            unit = np.linspace(b.min, b.max, size)
+            if d == axis:
+                dims.add_dimension([unit[start], unit[stop - 1]], 'linear', stop - start)
+            else:
+                dims.add_dimension([b.min, b.max], 'linear', size)
+        yield ScaledArray(scaledArr.data[tuple(keys)], dims)
+
+def sort_features(f):
+    return f[np.lexsort(np.round(f['com'].T, 6))]
+
+np.random.seed(3)
+shape = (160, 160, 60)
+volume = ndimage.gaussian_filter(np.random.normal(0.0, 1.0, shape), 2.5)
+volume = np.maximum(volume - 0.04, 0.0) * 1.0e-2
+dims = DimensionHelper()
+dims.add_dimension([0.0, 3975.0], 'linear', shape[0])
+dims.add_dimension([0.0, 3975.0], 'linear', shape[1])
+dims.add_dimension([500.0, 1975.0], 'linear', shape[2])
+scaledArr = ScaledArray(volume, dims)
+
+for connectivity in [1, 3]:
+    t0 = time.time()
+    whole = sort_features(compute_cloud_features(scaledArr, 2e-4, connectivity,
+                                                 altitudeDim=2))
+    t1 = time.time()
+    chunked = sort_features(compute_cloud_features_chunked(
+        array_chunks(scaledArr, 2, 7), 2, 2e-4, connectivity, altitudeDim=2))
+    t2 = time.time()
+    print("Connectivity {} : {} clouds (whole, {:.3f}s), {} clouds (chunked, {:.3f}s)".format(
+          connectivity, len(whole), t1 - t0, len(chunked), t2 - t1))
+    if len(whole) == len(chunked):
+        print("    max com difference    :", np.abs(whole['com'] - chunked['com']).max())
+        print("    same volumes          :", np.array_equal(whole['volume'], chunked['volume']))
+        print("    max base/top difference :", max(np.abs(whole['base'] - chunked['base']).max(),
+                                                   np.abs(whole['top'] - chunked['top']).max()))
+
+# Slabs requested from a map (only one slab computed at a time). Slabs are
+# cut on the grid of the whole slice, so results are the same.
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 600):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+valueMap = ValueMap('RCT', gpr)
+keys = (1150.0, slice(800.0, 1600.0), slice(400.0, 1000.0), slice(850.0, 1150.0))
+wholeArr = valueMap[keys]
+slabs = list(map_chunks(valueMap, keys, 3, 75.0))
+print("Slab planes : {} (whole slice : {})".format(
+      [s.shape[2] for s in slabs], wholeArr.shape[2]))
+assert sum(s.shape[2] for s in slabs) == wholeArr.shape[2]
+assert np.allclose(np.concatenate([s.data for s in slabs], axis=2), wholeArr.data,
+                   rtol=1.0e-6, atol=1.0e-12)
+for s, z in zip(slabs, np.cumsum([0] + [s.shape[2] for s in slabs])):
+    assert np.allclose(s.dimHelper.to_unit([0, 0, 0]), wholeArr.dimHelper.to_unit([0, 0, int(z)]))
+
+for connectivity in [1, 3]:
+    whole = sort_features(compute_cloud_features(wholeArr, 2e-4, connectivity,
+                                                 altitudeDim=2))
+    chunked = sort_features(compute_cloud_features_chunked(
+        map_chunks(valueMap, keys, 3, 75.0), 2, 2e-4, connectivity, altitudeDim=2))
+    print("Map volume (connectivity {}) : {} cloud(s) (whole), {} cloud(s) (chunked)".format(
+          connectivity, len(whole), len(chunked)))
+    i = np.argmax(whole['volume'])
+    print("    biggest : volume {}, com {}, base {:.1f}, top {:.1f}".format(
+          whole['volume'][i], whole['com'][i], whole['base'][i], whole['top'][i]))
+    assert len(whole) == len(chunked)
+    assert np.array_equal(whole['volume'], chunked['volume'])
+    assert np.allclose(whole['com'], chunked['com'])
+    assert np.allclose(whole['base'], chunked['base'])
+    assert np.allclose(whole['top'], chunked['top'])
@@ -0,0 +1,82 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+
+from nephelae.mapping         import ValueMap, StdMap, GprPredictor, WindKernel, WindMapConstant
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# Comparing map by map requests with a batch request (single training data
+# fetch and GPR fit for all requests).
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 600):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+valueMap = ValueMap('RCT_value', gpr)
+stdMap   = StdMap('RCT_std', gpr)
+
+keys  = (1150.0, slice(800.0, 2000.0), slice(200.0, 1400.0), 1000.0)
+times = np.linspace(1100.0, 1200.0, 20)
+
+t0 = time.time()
+single = [valueMap[(t,) + keys[1:]].data.copy() for t in times]
+t1 = time.time()
+gpr.cache.clear() # Single map requests were cached
+batch  = valueMap.get_time_series(keys, times)
+t2 = time.time()
+
+print("Map by map : {:.3f}s, batch : {:.3f}s".format(t1 - t0, t2 - t1))
+print("Max difference :", max([np.abs(m0 - m1.data).max()
+                               for m0, m1 in zip(single, batch)]))
+
+stds = stdMap.get_time_series(keys, times)
+print("Std maps :", len(stds), stds[0].shape)
+
+# Groups are bounded : a long time series is fitted in several windows.
+windows = []
+computePredictions = gpr.compute_predictions
+def recording_predictions(locations, locBounds, computeStd=None):
+    windows.append(locBounds)
+    return computePredictions(locations, locBounds, computeStd)
+gpr.compute_predictions = recording_predictions
+gpr.cache.clear()
+longTimes = np.linspace(1000.0, 1300.0, 61)
+valueMap.get_time_series(keys, longTimes)
+del gpr.compute_predictions
+first = gpr.location_bounds(gpr.compute_locations((longTimes[0],) + keys[1:])[0])
+print("Long series : {} requests fitted in {} groups".format(len(longTimes), len(windows)))
+assert len(windows) >= len(longTimes) / gpr.maxBatchSize
+for window in windows:
+    for b, b0 in zip(window, first):
+        assert b.max - b.min <= gpr.maxBatchSpan*(b0.max - b0.min) + 1.0e-6
+
+# Std time series are computed even if the predictor does not compute stds
+# by default.
+gpr.set_compute_std(False)
+gpr.cache.clear()
+stds = gpr.get_stds([(t,) + keys[1:] for t in times[:3]])
+assert all(std is not None for std in stds)
+gpr.set_compute_std(True)
@@ -0,0 +1,63 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+from nephelae.mapping         import GprPredictor, WindKernel, WindMapConstant
+
+# Multi-output GPR of a (UT,VT) wind field with one variance per channel,
+# compared to one single-output GPR per channel.
+
+def wind_field(t, x, y, z):
+    return np.array([5.0 + 2.0*np.sin(x / 200.0), 1.0 + 0.5*np.cos(y / 150.0)])
+
+windName = str(['UT','VT'])
+databases = {name : NephelaeDataServer() for name in [windName, 'UT', 'VT']}
+for t in np.linspace(1000.0, 1300.0, 1500):
+    x = 500.0 + 400.0*np.cos(t / 20.0) + 5.0*(t - 1000.0)
+    y = 500.0 + 400.0*np.sin(t / 31.0) + 1.0*(t - 1000.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    wind = wind_field(t, x, y, z) + np.random.normal(0.0, 0.1, 2)
+    position = Position(t, x, y, z)
+    databases[windName].add_sample(SensorSample(windName, '7', t, position, [wind]))
+    databases['UT'].add_sample(SensorSample('UT', '7', t, position, [wind[0]]))
+    databases['VT'].add_sample(SensorSample('VT', '7', t, position, [wind[1]]))
+
+# Kernel advected by the mean wind, one (or one per channel) variance
+windMap = WindMapConstant('Wind', [5.0, 1.0])
+def wind_gpr(name, variance, noiseVariance):
+    kernel = WindKernel([60.0, 80.0, 80.0, 60.0], variance, noiseVariance,
+                        shallowParameters=DeepcopyGuard(windMap=windMap))
+    return GprPredictor(name, DatabaseView(name, databases[name], [name]), kernel)
+
+keys = (1200.0, slice(0.0, 2500.0), slice(0.0, 1500.0), 1000.0)
+for noiseVariance in [[0.04, 0.01], [0.01, 0.01]]:
+    variance = [4.0, 1.0]
+    gprs = [wind_gpr(name, v, n)
+            for name, v, n in zip(['UT', 'VT'], variance, noiseVariance)]
+    gprMulti = wind_gpr(windName, np.array(variance), np.array(noiseVariance))
+    for gpr in gprs + [gprMulti]:
+        gpr.prefilterSamples = False
+
+    t0 = time.time()
+    single = [gpr.get_maps(keys) for gpr in gprs]
+    t1 = time.time()
+    multi = gprMulti.get_maps(keys)
+    t2 = time.time()
+
+    print("noiseVariance {} : {} factorization(s)".format(
+          noiseVariance, len(gprMulti.gprProc.factors)))
+    print("    per channel GPRs : {:.3f}s, multi-output GPR : {:.3f}s".format(
+          t1 - t0, t2 - t1))
+    print("    value shape {}, std shape {}".format(multi[0].shape, multi[1].shape))
+    for c in range(2):
+        print("    channel {} : max value difference {:.3e}, max std difference {:.3e}".format(
+              c, np.abs(multi[0].data[...,c] - single[c][0].data).max(),
+              np.abs(multi[1].data[...,c] - single[c][1].data).max()))
+    print("    std range (channel 0) : {:.3f} - {:.3f}".format(
+          multi[1].data[...,0].min(), multi[1].data[...,0].max()))
@@ -0,0 +1,58 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+
+from nephelae.mapping         import ValueMap, GprPredictor, WindKernel, WindMapConstant
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# Comparing map computation with and without the k-d tree selection of
+# training samples and query locations.
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1600.0, 3000):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+valueMap = ValueMap('RCT_value', gpr)
+
+keys = (1300.0, slice(1000.0, 2500.0), slice(400.0, 1400.0), 1000.0)
+
+gpr.prefilterSamples = False
+t0 = time.time()
+reference = valueMap[keys].data.copy()
+t1 = time.time()
+
+gpr.cache.clear()
+gpr.prefilterSamples = True
+t2 = time.time()
+filtered = valueMap[keys].data
+t3 = time.time()
+
+print("Without prefilter : {:.3f}s".format(t1 - t0))
+print("With prefilter    : {:.3f}s (measured speedup : {:.1f})".format(
+      t3 - t2, (t1 - t0) / (t3 - t2)))
+print("Selection stats   :", gpr.prefilterStats)
+print("Max difference    : {:.3e} (max value {:.3e})".format(
+      np.abs(reference - filtered).max(), reference.max()))
@@ -0,0 +1,84 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+from scipy.optimize import check_grad
+
+from nephelae.mapping                 import KernelOptimizer, ValueMap, GprPredictor, WindKernel, WindMapConstant
+from nephelae.mapping.KernelOptimizer import negative_log_marginal_likelihood
+from nephelae.mapping.KernelOptimizer import optimize_kernel_parameters
+from nephelae.types                   import Position, SensorSample, DeepcopyGuard
+from nephelae.database                import NephelaeDataServer
+from nephelae.dataviews.types         import DatabaseView
+
+# Background kernel hyperparameter optimization on synthetic data.
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 600):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([200.0, 300.0, 300.0, 200.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+valueMap = ValueMap('RCT_value', gpr)
+
+# Checking analytic gradient of the marginal likelihood
+samples = gpr.fetch_samples(gpr.location_bounds(np.array([[1100.0, 1000.0, 600.0, 1000.0]])))
+X, Y = samples[0][::10], samples[1][::10] / 1.0e-3
+theta = np.log([60.0, 80.0, 80.0, 60.0, 1.0, 1.0e-3])
+print("Gradient error :", check_grad(
+      lambda t: negative_log_marginal_likelihood(t, X, Y, np.array([5.0, 1.0]))[0],
+      lambda t: negative_log_marginal_likelihood(t, X, Y, np.array([5.0, 1.0]))[1],
+      theta))
+
+optimizer = KernelOptimizer(gpr, window=300.0, maxSamples=300)
+print("Initial length scales :", gpr.kernel.lengthScales)
+future = optimizer.submit(1300.0) # no sample notified yet, giving end of window
+
+# Maps are still computed while optimizing
+keys = (1150.0, slice(800.0, 2000.0), slice(200.0, 1400.0), 1000.0)
+t0 = time.time()
+valueMap[keys]
+print("Map computed during optimization in {:.3f}s".format(time.time() - t0))
+
+future.result()
+time.sleep(0.1) # waiting for publication callback
+print("Optimization result :", optimizer.lastResult)
+print("Published length scales :", gpr.kernel.lengthScales)
+optimizer.executor.shutdown()
+
+# Multi-output kernel : one variance and noise variance per channel
+Y2 = np.concatenate([Y, 0.5*Y + np.random.normal(0.0, 0.05, Y.shape)], axis=1)
+theta2 = np.log([60.0, 80.0, 80.0, 60.0, 1.0, 0.5, 1.0e-3, 1.0e-2])
+print("Multi-output gradient error :", check_grad(
+      lambda t: negative_log_marginal_likelihood(t, X, Y2, np.array([5.0, 1.0]), 2)[0],
+      lambda t: negative_log_marginal_likelihood(t, X, Y2, np.array([5.0, 1.0]), 2)[1],
+      theta2))
+nll2 = negative_log_marginal_likelihood(theta2, X, Y2, np.array([5.0, 1.0]), 2)[0]
+nllChannels = [negative_log_marginal_likelihood(theta2[[0,1,2,3,4+c,6+c]],
+               X, Y2[:,c:c+1], np.array([5.0, 1.0]))[0] for c in range(2)]
+assert np.isclose(nll2, sum(nllChannels))
+
+result = optimize_kernel_parameters(X, Y2, [60.0, 80.0, 80.0, 60.0],
+                                    np.array([1.0, 0.5]), np.array([1.0e-3, 1.0e-2]),
+                                    wind=np.array([5.0, 1.0]))
+print("Multi-output optimization :", result)
+assert len(result['variance']) == 2 and len(result['noiseVariance']) == 2
+assert result['nll'] <= result['initialNll']
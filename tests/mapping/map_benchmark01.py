@@ -0,0 +1,59 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import os
+import json
+import tempfile
+import numpy as np
+
+from nephelae.types           import Bounds, DeepcopyGuard
+from nephelae.dataviews.types import DatabaseView
+from nephelae.mapping         import ValueMap, GprPredictor, WindKernel, WindMapConstant
+from nephelae_utils.benchmark import SyntheticCloudMap, MapBenchmark
+from nephelae_utils.benchmark import simulate_database, loiter_track
+
+# Benchmark of GPR maps against a synthetic reference field, over a
+# simulated mission, for two kernel configurations.
+
+wind = (5.0, 1.0)
+reference = SyntheticCloudMap('RCT_reference',
+    [Bounds(1000.0, 1400.0), Bounds(0.0, 2000.0), Bounds(0.0, 1500.0),
+     Bounds(950.0, 1050.0)], nbCells=8, wind=wind, seed=5)
+
+times = np.arange(1000.0, 1400.0, 1.0)
+tracks = {'7' : loiter_track(times, (800.0, 600.0), 250.0, 50.0, 1000.0, wind),
+          '8' : loiter_track(times, (1200.0, 900.0), 350.0, 70.0, 1000.0, wind)}
+source = simulate_database(reference, tracks, noiseStd=1.0e-5, seed=6)
+
+schedule = [(t, [(t, slice(500.0 + wind[0]*(t - 1000.0), 1900.0 + wind[0]*(t - 1000.0)),
+                    slice(200.0, 1400.0), 1000.0)])
+            for t in np.arange(1050.0, 1400.0, 50.0)]
+
+reportPath = os.path.join(tempfile.gettempdir(), 'map_benchmark01.json')
+for lengthScales in [[60.0, 80.0, 80.0, 60.0], [60.0, 140.0, 140.0, 60.0]]:
+    def builder(database, lengthScales=lengthScales):
+        kernel = WindKernel(lengthScales, 1.0e-6, 1.0e-9,
+            shallowParameters=DeepcopyGuard(windMap=WindMapConstant('Wind', list(wind))))
+        return ValueMap('RCT', GprPredictor('RCT',
+                        DatabaseView('RCT', database, ['RCT']), kernel))
+    benchmark = MapBenchmark(reference, builder, schedule, source, mapId='RCT',
+                             parameters={'lengthScales': lengthScales})
+    report = benchmark.run()
+    benchmark.save_report(reportPath)
+    print("Length scales {} :".format(lengthScales))
+    print("    {} requests, {:.1f} req/s, latency median {:.3f}s, p95 {:.3f}s".format(
+          report['nbRequests'], report['throughput'],
+          report['latency']['median'], report['latency']['p95']))
+    print("    peak memory {:.1f} MB, RMSE {:.2e}, bias {:.2e}, IoU {:.3f}".format(
+          report['peakMemory'] / 1.0e6, report['metrics']['rmse'],
+          report['metrics']['bias'], report['metrics']['iou']))
+
+# Timings come from an untraced replay : the memory pass is optional and
+# does not change the evaluated maps.
+untraced = benchmark.run(measureMemory=False)
+assert untraced['peakMemory'] is None and report['peakMemory'] > 0
+assert untraced['metrics'] == report['metrics']
+assert untraced['nbRequests'] == report['nbRequests']
+
+print("Saved report keys :", list(json.load(open(reportPath)).keys()))
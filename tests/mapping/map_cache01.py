@@ -0,0 +1,61 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.mapping         import ValueMap, StdMap, GprPredictor, WindKernel, WindMapConstant
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# Checking GprPredictor map cache behavior (two alternated requests should
+# not trigger a recomputation, new samples should invalidate only the maps
+# depending on them).
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 600):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+valueMap = ValueMap('RCT_value', gpr)
+stdMap   = StdMap('RCT_std', gpr)
+
+keys0 = (1150.0, slice(800.0, 2000.0), slice(200.0, 1400.0), 1000.0)
+keys1 = (1150.0, slice(800.0, 2000.0), slice(200.0, 1400.0), 1300.0)
+
+for keys in [keys0, keys1, keys0, keys1]:
+    t0 = time.time()
+    value, std = valueMap[keys], stdMap[keys]
+    print("Request at z={} : {:.4f}s, cache size : {}".format(
+          keys[3], time.time() - t0, len(gpr.cache)))
+
+# New sample close to keys1 only
+database.add_sample(SensorSample('RCT', '7', 1150.0,
+                    Position(1150.0, 1000.0, 500.0, 1400.0), [1.0e-3]))
+print("Cache size after a new sample close to keys1 :", len(gpr.cache),
+      "(keys0 cached :", gpr.check_cache(keys0), ")")
+
+# Nearly identical keys
+gpr.cache.tolerance = (1.0, 5.0, 5.0, 1.0)
+t0 = time.time()
+value = valueMap[(1150.5, slice(801.0, 2001.0), slice(199.0, 1399.0), 1000.0)]
+print("Nearly identical keys request : {:.4f}s".format(time.time() - t0))
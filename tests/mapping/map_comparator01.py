@@ -0,0 +1,74 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+
+from nephelae.mapping         import ValueMap, MapComparator, GprPredictor, WindKernel, WindMapConstant
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# Comparing two GPR maps of different resolutions (2D slices, 3D volumes and
+# a batch over a time series).
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 600):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+# Same samples, same wind, two kernel length scales (map resolutions)
+windMap = WindMapConstant('Wind', list(wind))
+def cloud_map(name, lengthScales):
+    kernel = WindKernel(lengthScales, 1.0e-6, 1.0e-9,
+                        shallowParameters=DeepcopyGuard(windMap=windMap))
+    return ValueMap(name, GprPredictor('RCT',
+                    DatabaseView('RCT', database, ['RCT']), kernel))
+fineMap   = cloud_map('RCT_fine',   [60.0, 80.0, 80.0, 60.0])
+coarseMap = cloud_map('RCT_coarse', [90.0, 140.0, 140.0, 90.0])
+fineMap.threshold = coarseMap.threshold = 2.0e-4
+print("Resolutions :", coarseMap.resolution(), fineMap.resolution())
+
+comparator = MapComparator(coarseMap, fineMap)
+keys = (1200.0, slice(1000.0, 2500.0), slice(200.0, 1200.0), 1000.0)
+data1, data2, resampled = comparator[keys]
+print("2D slice : {} resampled to {}, rms difference {:.3e}".format(
+      data2.shape, resampled.shape, np.sqrt(np.mean((resampled - data1)**2))))
+try:
+    from PIL import Image
+    pil = np.array(Image.fromarray(data2.T).resize(data1.shape, Image.BICUBIC)).T
+    print("    max difference with PIL bicubic : {:.3e} (max value {:.3e})".format(
+          np.abs(pil - resampled).max(), np.abs(resampled).max()))
+except ImportError:
+    pass
+
+keys3d = (1200.0, slice(1000.0, 2500.0), slice(200.0, 1200.0), slice(900.0, 1100.0))
+data1, data2, resampled = comparator[keys3d]
+print("3D volume : {} resampled to {}".format(data2.shape, resampled.shape))
+
+keysList = [(t, slice(1000.0, 2000.0), slice(300.0, 1000.0), 1000.0)
+            for t in np.arange(1100.0, 1300.0, 10.0)]
+bounds = comparator.bounds
+t0 = time.time()
+metrics = comparator.compare_many(keysList)
+t1 = time.time()
+# compare_many does not change the state of the last comparator[keys] call
+assert comparator.bounds is bounds
+print("{} slices compared in {:.3f}s".format(len(keysList), t1 - t0))
+print("    RMSE total {:.3e}, bias total {:.3e}, IoU total {:.3f}".format(
+      metrics['rmseTotal'], metrics['biasTotal'], metrics['iouTotal']))
+print("    IoU per slice :", np.round(metrics['iou'], 2))
@@ -0,0 +1,59 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+sys.path.append('../')
+import numpy as np
+import time
+
+from nephelae.mapping import WindMapConstant
+
+from helpers.helpers import *
+
+# Checking the cached location grids of MapInterface.compute_locations
+# against a direct meshgrid construction.
+
+def reference_locations(keys, resolution):
+    params = []
+    for key, res in zip(keys, resolution):
+        if isinstance(key, slice):
+            params.append(np.linspace(key.start, key.stop,
+                                      int((key.stop - key.start) / res + 0.5)))
+        else:
+            params.append(np.array([key]))
+    grids = np.meshgrid(*params, indexing='ij')
+    return np.stack([g.ravel() for g in grids], axis=-1), grids[0].shape
+
+windMap = WindMapConstant('Wind', [5.0, 1.0], resolution=[10.0, 10.0, 10.0, 10.0])
+
+for keys in [(100.0, slice(-500.0, 1500.0), slice(0.0, 1000.0), 600.0),
+             (slice(100.0, 200.0), slice(-500.0, 1500.0), 20.0, 600.0),
+             (100.0, 0.0, slice(0.0, 1000.0), slice(500.0, 1500.0))]:
+    locations, dims, shape = windMap.compute_locations(keys)
+    reference, referenceShape = reference_locations(keys, windMap.resolution())
+    print("Shapes :", shape, referenceShape, ", max difference :",
+          np.abs(locations - reference).max())
+    print("    output shape :", windMap[keys].shape,
+          ", bounds :", windMap[keys].bounds)
+
+# Same request shape at another location : the grid is reused.
+keys0 = (100.0, slice(-500.0, 1500.0), slice(0.0, 1000.0), 600.0)
+keys1 = (130.0, slice(-300.0, 1700.0), slice(200.0, 1200.0), 700.0)
+windMap.compute_locations(keys0)
+N = 200
+t0 = time.time()
+for i in range(N):
+    windMap.compute_locations(keys1)
+t1 = time.time()
+for i in range(N):
+    reference_locations(keys1, windMap.resolution())
+t2 = time.time()
+print("compute_locations : {:.3f} ms per call (meshgrid : {:.3f} ms)".format(
+      1000.0*(t1 - t0) / N, 1000.0*(t2 - t1) / N))
+print("Cached grids :", len(windMap.locationTemplates))
+
+pred = np.random.rand(20000, 1)
+locations, dims, shape = windMap.compute_locations(keys0)
+array = windMap.compute_scaled_array(shape, pred, dims)
+print("ScaledArray data shares prediction memory :",
+      np.shares_memory(array.data, pred))
@@ -0,0 +1,86 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+
+from nephelae.mapping         import ValueMap, StdMap, MapServer, GprPredictor, WindKernel, WindMapConstant
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# Background precomputation of maps around a moving point of interest.
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 600):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+server   = MapServer(mapSet={'RCT'     : ValueMap('RCT', gpr),
+                             'RCT_std' : StdMap('RCT_std', gpr)})
+
+t0 = time.time()
+def keys_around_cloud():
+    # Following the synthetic cloud center (moving with the wind)
+    t = 1100.0 + 10.0*(time.time() - t0)
+    x = 500.0 + 5.0*(t - 1000.0)
+    y = 500.0 + 1.0*(t - 1000.0)
+    return (t, slice(x - 600.0, x + 600.0), slice(y - 600.0, y + 600.0), 1000.0)
+
+server.add_precomputed_region('cloud',     'RCT',     keys_around_cloud, period=0.5, priority=1)
+server.add_precomputed_region('cloud_std', 'RCT_std', keys_around_cloud, period=0.5)
+server.add_precomputed_region('fixed',     'RCT', (1150.0, slice(0.0, 1500.0),
+                              slice(0.0, 1500.0), 1000.0), period=2.0, deadline=0.5)
+server.scheduler.start()
+try:
+    for i in range(6):
+        time.sleep(0.5)
+        for regionId in ['cloud', 'cloud_std', 'fixed']:
+            res = server.get_precomputed(regionId)
+            if res is None:
+                print(regionId, ": not computed yet")
+            else:
+                print(regionId, ": t={:.1f}, age={:.3f}s, max={:.2e}".format(
+                      res[0][0], time.time() - res[2], res[1].data.max()))
+finally:
+    server.scheduler.stop()
+print("Stats :", server.scheduler.stats)
+
+# Keys callbacks are called without the scheduler lock : a callback calling
+# back into the scheduler does not block the workers.
+scheduler = server.scheduler
+fixedKeys = (1150.0, slice(0.0, 1000.0), slice(0.0, 1000.0), 1000.0)
+def reentrant_keys():
+    scheduler.add_region('added', 'RCT', fixedKeys, period=10.0)
+    return fixedKeys
+scheduler.add_region('reentrant', 'RCT', reentrant_keys, period=10.0)
+scheduler.start()
+try:
+    scheduler.request('reentrant')
+    for i in range(100):
+        time.sleep(0.1)
+        if scheduler.get('reentrant') is not None:
+            break
+finally:
+    scheduler.stop()
+assert scheduler.get('reentrant') is not None
+assert 'added' in scheduler.regions
+print("Re-entrant keys callback : ok")
@@ -0,0 +1,165 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+import asyncio
+import threading
+
+from nephelae.types           import Bounds, Position, SensorSample, DeepcopyGuard
+from nephelae.array           import ScaledArray, DimensionHelper
+from nephelae.mapping         import ValueMap, StdMap, MapServer, MapInterface, GprPredictor, WindKernel, WindMapConstant
+from nephelae.mapping         import MapCache
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# MapServer request routing : concurrent clients, de-duplication of
+# identical requests, timeouts and asyncio access.
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 1500):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+server   = MapServer(mapSet={'RCT'     : ValueMap('RCT', gpr),
+                             'RCT_std' : StdMap('RCT_std', gpr)},
+                     maxConcurrency={'RCT':2, 'RCT_std':1})
+
+keys = [(1100.0 + 20.0*i, slice(0.0, 2500.0), slice(0.0, 1500.0), 1000.0)
+        for i in range(6)]
+
+# Sequential reference
+t0 = time.time()
+reference = [gpr.compute_predictions(*(lambda l: (l, gpr.location_bounds(l)))(
+             gpr.compute_locations(k)[0]))[0] for k in keys]
+t1 = time.time()
+print("Sequential computation : {:.3f}s".format(t1 - t0))
+
+# Concurrent requests (each submitted twice by two "clients")
+t0 = time.time()
+futures = [server.submit('RCT', k) for k in keys] + \
+          [server.submit('RCT', k) for k in keys]
+results = [f.result() for f in futures]
+t1 = time.time()
+print("Concurrent requests : {:.3f}s, stats : {}".format(t1 - t0, server.stats))
+print("Max difference with sequential computation :",
+      max(np.abs(r.data.ravel() - ref.ravel()).max()
+          for r, ref in zip(results[:6], reference)))
+
+# Timeout
+gpr.cache.clear()
+try:
+    server.request('RCT_std', keys[0], timeout=1.0e-3)
+    print("No timeout (unexpected)")
+except Exception as e:
+    print("Request timed out :", type(e).__name__)
+print("Timed out computation is still shared :",
+      server.request('RCT_std', keys[0]).shape, server.stats)
+
+# asyncio clients
+async def client(name, mapId, keys):
+    t0 = time.time()
+    res = await server.get(mapId, keys)
+    print("    client {} got {} {} after {:.3f}s".format(
+          name, mapId, res.shape, time.time() - t0))
+
+async def main():
+    gpr.cache.clear()
+    await asyncio.gather(client('gui', 'RCT', keys[1]),
+                         client('mission', 'RCT_std', keys[2]),
+                         client('analysis', 'RCT', keys[1]))
+asyncio.run(main())
+print("Final stats :", server.stats)
+server.shutdown()
+
+# Batch requests are routed through the worker pools : split among the
+# workers of the map, and de-duplicated against requests in flight.
+server = MapServer(mapSet={'RCT' : ValueMap('RCT', gpr)}, maxConcurrency=2)
+intervals = []
+intervalsLock = threading.Lock()
+getMany = server.maps['RCT'].get_many
+def recording_get_many(keysList):
+    t0 = time.time()
+    res = getMany(keysList)
+    with intervalsLock:
+        intervals.append((t0, time.time(), len(keysList)))
+    return res
+server.maps['RCT'].get_many = recording_get_many
+
+seriesKeys = [(1100.0 + 10.0*i, slice(0.0, 2500.0), slice(0.0, 1500.0), 1000.0)
+              for i in range(12)]
+gpr.cache.clear()
+results = {}
+clients = [threading.Thread(target=lambda n=n: results.__setitem__(n,
+           server['RCT'].get_many(seriesKeys))) for n in range(2)]
+t0 = time.time()
+for c in clients:
+    c.start()
+for c in clients:
+    c.join()
+print("Two clients requesting the same series : {:.3f}s, stats : {}".format(
+      time.time() - t0, server.stats))
+print("    batches (start, stop, size) :",
+      [(round(a - t0, 3), round(b - t0, 3), n) for a, b, n in intervals])
+assert server.stats['submitted'] == len(seriesKeys)
+assert server.stats['shared'] == len(seriesKeys)
+assert len(intervals) == 2
+assert max(a for a, b, n in intervals) < min(b for a, b, n in intervals)
+assert all(r0 is r1 for r0, r1 in zip(results[0], results[1]))
+server.shutdown()
+
+# Open slices (map or dimension without bounds) are routed and de-duplicated
+# as other keys.
+class ArrayMap(MapInterface):
+    def __init__(self, name, array):
+        super().__init__(name)
+        self.array = array
+        self.ready = threading.Event()
+    def __getitem__(self, keys):
+        self.ready.wait()
+        return self.array[keys]
+    def at_locations(self, locations):
+        raise NotImplementedError()
+    def shape(self):
+        return self.array.shape
+    def span(self):
+        return self.array.span()
+    def bounds(self):
+        return self.array.bounds
+    def resolution(self):
+        return self.array.dimHelper.resolution()
+    def sample_size(self):
+        return 1
+
+dims = DimensionHelper()
+dims.add_dimension([0.0, 100.0], 'linear', 11)
+dims.add_dimension([0.0, 50.0], 'linear', 6)
+arrayMap = ArrayMap('array', ScaledArray(np.arange(66.0).reshape(11, 6), dims))
+assert MapCache.normalize_keys((slice(None), 0.0)) == ((None, None), 0.0)
+server = MapServer(mapSet={'array': arrayMap})
+openKeys = (slice(None), slice(20.0, None))
+futures = [server.submit('array', openKeys) for n in range(2)]
+arrayMap.ready.set()
+assert futures[0] is futures[1]
+assert server.stats['shared'] == 1
+assert np.array_equal(futures[0].result().data, arrayMap[openKeys].data)
+print("Open slice request :", futures[0].result().shape, server.stats)
+server.shutdown()
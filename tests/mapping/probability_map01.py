@@ -0,0 +1,77 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+from scipy.special import ndtr
+
+from nephelae.mapping         import ValueMap, StdMap, BorderIncertitude, ProbabilityMap, GprPredictor, WindKernel, WindMapConstant
+from nephelae.mapping         import compute_border_masks
+from nephelae.types           import Position, SensorSample, DeepcopyGuard
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# Cloud presence probability from a single GPR fit, and confidence regions
+# at any level without new fit.
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 600):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+valueMap = ValueMap('RCT', gpr)
+stdMap   = StdMap('RCT_std', gpr)
+gpr.threshold = 2.0e-4
+probability = ProbabilityMap('RCT_probability', valueMap, stdMap, 2.0e-4)
+border      = BorderIncertitude('RCT_border', valueMap, stdMap)
+
+fits = []
+fit = gpr.compute_predictions
+def counted_fit(*args, **kwargs):
+    fits.append(1)
+    return fit(*args, **kwargs)
+gpr.compute_predictions = counted_fit
+
+keys = (1200.0, slice(1000.0, 2500.0), slice(200.0, 1200.0), 1000.0)
+t0 = time.time()
+prob = probability[keys]
+t1 = time.time()
+print("Probability map : {:.4f}s, {} fit(s), range [{:.3f}, {:.3f}]".format(
+      t1 - t0, len(fits), prob.data.min(), prob.data.max()))
+
+t0 = time.time()
+masks = [probability.confidence_mask(keys, c) for c in np.linspace(0.05, 0.95, 19)]
+contours = [probability.contours(keys, c) for c in (0.1, 0.5, 0.9)]
+t1 = time.time()
+print("19 confidence masks and 3 contours : {:.4f}s, {} fit(s) (no new fit expected)".format(
+      t1 - t0, len(fits)))
+print("Cloud area at 5% / 50% / 95% confidence :",
+      masks[0].data.sum(), masks[9].data.sum(), masks[-1].data.sum())
+
+# P > Phi(1) is the inside of the inner border, P > Phi(-1) the inside of the
+# outer border.
+value, std = gpr.get_maps(keys)
+inner = (value.data - std.data > 2.0e-4)
+outer = (value.data + std.data > 2.0e-4)
+print("Same regions as BorderIncertitude masks :",
+      np.array_equal(prob.data > ndtr(1.0), inner),
+      np.array_equal(prob.data > ndtr(-1.0), outer))
+print("Fits after border request :", len(border[keys]) and len(fits))
@@ -0,0 +1,109 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+import numpy as np
+import time
+
+from nephelae.types           import Bounds, Position, SensorSample, DeepcopyGuard
+from nephelae.mapping         import ValueMap, StdMap, MapServer, GprPredictor, WindKernel, WindMapConstant
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+
+# Browsing a GPR map through a tile pyramid (zoomed-out levels, extraction
+# of coarse tiles from cached tiles and per-tile invalidation).
+
+# Samples of a gaussian cloud (radius 150m, thickness 100m) drifting with
+# the wind, taken by an aircraft loitering around it at a varying distance.
+wind = (5.0, 1.0)
+def cloud_lwc(t, x, y, z):
+    xc = 500.0 + wind[0]*(t - 1000.0)
+    yc = 500.0 + wind[1]*(t - 1000.0)
+    return 1.0e-3*np.exp(-0.5*((x - xc)**2 + (y - yc)**2) / 150.0**2
+                         -0.5*(z - 1000.0)**2 / 100.0**2)
+
+database = NephelaeDataServer()
+for t in np.linspace(1000.0, 1300.0, 600):
+    r = 200.0*(1.0 + 0.75*np.sin(t / 43.0))
+    x = 500.0 + wind[0]*(t - 1000.0) + r*np.cos(t / 20.0)
+    y = 500.0 + wind[1]*(t - 1000.0) + r*np.sin(t / 20.0)
+    z = 1000.0 + 20.0*np.sin(t / 7.0)
+    database.add_sample(SensorSample('RCT', '7', t, Position(t, x, y, z),
+                                     [cloud_lwc(t, x, y, z)]))
+
+windMap = WindMapConstant('Wind', list(wind))
+kernel  = WindKernel([60.0, 80.0, 80.0, 60.0], 1.0e-6, 1.0e-9,
+                     shallowParameters=DeepcopyGuard(windMap=windMap))
+gpr = GprPredictor('RCT', DatabaseView('RCT', database, ['RCT']), kernel)
+server   = MapServer(mapSet={'RCT'     : ValueMap('RCT', gpr),
+                             'RCT_std' : StdMap('RCT_std', gpr)},
+                     mapBounds=(None, Bounds(0.0, 4000.0), Bounds(-1000.0, 3000.0), None))
+pyramid  = server.add_tile_pyramid('RCT', tileSize=64, nbLevels=4)
+server.add_tile_pyramid('RCT_std', tileSize=64, nbLevels=4)
+
+t, z = 1200.0, 1000.0
+xBounds, yBounds = Bounds(0.0, 4000.0), Bounds(-1000.0, 3000.0)
+
+# Zoomed-out view of the whole area
+level = pyramid.level_for_resolution(4000.0 / 48)
+t0 = time.time()
+tiles = [server.get_tile('RCT', t, z, level, i, j)
+         for i, j in pyramid.tiles_in_region(level, xBounds, yBounds)]
+t1 = time.time()
+print("Level {} view : {} tiles in {:.3f}s".format(level, len(tiles), t1 - t0))
+
+t0 = time.time()
+fullResolution = server['RCT'][t, slice(0.0, 4000.0), slice(-1000.0, 3000.0), z]
+t1 = time.time()
+print("Full resolution slice {} : {:.3f}s".format(fullResolution.shape, t1 - t0))
+
+# Comparing a coarse tile with the full resolution map at tile pixels
+tile = tiles[0]
+x = np.linspace(tile.bounds[0].min, tile.bounds[0].max, tile.shape[0])
+y = np.linspace(tile.bounds[1].min, tile.bounds[1].max, tile.shape[1])
+x = x[(x >= xBounds.min) & (x <= xBounds.max)]
+y = y[(y >= yBounds.min) & (y <= yBounds.max)]
+print("Max difference with full resolution :",
+      max(abs(tile[xi, yi] - fullResolution[xi, yi]) for xi in x[::8] for yi in y[::8]),
+      "(max value {:.3e})".format(fullResolution.data.max()))
+
+# Parent tile of 4 cached tiles is extracted from them, and is the same as
+# the parent tile computed directly.
+direct = pyramid.compute_tile(t, z, 1, 4, 11)
+for i in range(2):
+    for j in range(2):
+        server.get_tile('RCT', t, z, 0, 8 + i, 22 + j)
+stats = dict(pyramid.stats)
+t0 = time.time()
+parent = server.get_tile('RCT', t, z, 1, 4, 11)
+print("Subsampled parent tile : {:.4f}s, stats : {}".format(
+      time.time() - t0, pyramid.stats))
+assert pyramid.stats['reused'] - stats['reused'] == 4
+assert pyramid.stats['computed'] == stats['computed']
+print("Max difference with direct computation :", np.abs(parent.data - direct).max())
+assert np.allclose(parent.data, direct, rtol=1.0e-5, atol=1.0e-9)
+
+# A coarse tile without cached children is assembled from the areas of its
+# level 0 descendants (the map is never evaluated over the whole coarse
+# area), and is the same as the tile computed directly.
+stats = dict(pyramid.stats)
+t0 = time.time()
+coarse = server.get_tile('RCT', t, z, 2, 5, 1)
+t1 = time.time()
+direct = pyramid.compute_tile(t, z, 2, 5, 1)
+t2 = time.time()
+print("Coarse tile from level 0 areas : {:.4f}s (direct : {:.4f}s)".format(
+      t1 - t0, t2 - t1))
+assert pyramid.stats['computed'] - stats['computed'] == 16 + 1
+assert pyramid.stats['subsampled'] - stats['subsampled'] == 1
+print("Max difference with direct computation :", np.abs(coarse.data - direct).max())
+assert np.allclose(coarse.data, direct, rtol=1.0e-5, atol=1.0e-9)
+
+std = server.get_tile('RCT_std', t, z, level, 0, 0)
+print("Std tile range :", std.data.min(), std.data.max())
+
+# A new sample only invalidates neighbouring tiles
+nbTiles = len(pyramid.cache)
+database.add_sample(SensorSample('RCT', '7', t, Position(t, 3800.0, 2800.0, z), [1.0e-3]))
+print("Cached tiles before/after a new sample in a corner :",
+      nbTiles, len(pyramid.cache))
@@ -0,0 +1,90 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+sys.path.append('../')
+import numpy as np
+import time
+
+from nephelae.types           import Bounds, DeepcopyGuard
+from nephelae.database        import NephelaeDataServer
+from nephelae.dataviews.types import DatabaseView
+from nephelae.mapping         import WindMapConstant, WindMapGrid, WindKernel
+from nephelae.mapping         import GprPredictor
+
+from helpers.helpers import *
+
+# Checking WindMapGrid interpolation and WindKernel with a spatially varying
+# wind.
+
+gridBounds = [Bounds(0.0, 2000.0), Bounds(0.0, 2000.0), Bounds(500.0, 1500.0)]
+shape = (21, 21, 11)
+
+# Linear wind field : exactly reproduced by the trilinear interpolation.
+x, y, z = np.meshgrid(*[np.linspace(b.min, b.max, n)
+                        for b, n in zip(gridBounds, shape)], indexing='ij')
+grid = np.stack([5.0 + 1.0e-3*x + 2.0e-3*z, 1.0 - 1.0e-3*y], axis=-1)
+windGrid = WindMapGrid('Wind', grid, gridBounds)
+
+locations = np.random.uniform([0,0,0,500], [600,2000,2000,1500], (10000,4))
+expected = np.stack([5.0 + 1.0e-3*locations[:,1] + 2.0e-3*locations[:,3],
+                     1.0 - 1.0e-3*locations[:,2]], axis=-1)
+t0 = time.time()
+interpolated = windGrid.at_locations(locations)
+t1 = time.time()
+print("Interpolation of {} locations : {:.4f}s".format(len(locations), t1 - t0))
+print("Max interpolation error :", np.abs(interpolated - expected).max())
+print("Average wind :", windGrid.get_wind(),
+      ", deviation :", windGrid.get_wind_deviation())
+
+# Locations out of the grid are clamped to the grid border.
+print("Out of grid wind :", windGrid.at_locations(np.array([[0.0,-500.0,-500.0,0.0]])),
+      "expected :", grid[0,0,0])
+
+# A uniform grid must give the same kernel as a constant wind.
+uniformGrid = WindMapGrid.from_wind_map('Wind', WindMapConstant('Wind', [5.0,1.0]),
+                                        gridBounds, (3,3,3))
+kernelConstant = WindKernel([60.0,80.0,80.0,60.0], 1.0e-6, 1.0e-9,
+    shallowParameters=DeepcopyGuard(windMap=WindMapConstant('Wind', [5.0,1.0])))
+kernelGrid = WindKernel([60.0,80.0,80.0,60.0], 1.0e-6, 1.0e-9,
+    shallowParameters=DeepcopyGuard(windMap=uniformGrid))
+X = locations[:2000]
+Y = locations[2000:3000]
+print("Uniform grid kernel difference :",
+      np.abs(kernelConstant(X, Y) - kernelGrid(X, Y)).max())
+
+# Kernel evaluation time with a varying wind (one wind lookup per call).
+kernelGrid.windMap = windGrid
+t0 = time.time()
+K = kernelGrid(X)
+t1 = time.time()
+# Pairs are advected with the average of the winds at both locations : the
+# covariance must stay symmetric and positive semi-definite.
+asymmetry = np.abs(K - K.T).max() / K.max()
+print("Kernel ({}x{}) with grid wind : {:.4f}s, max asymmetry : {:.3e}".format(
+      K.shape[0], K.shape[1], t1 - t0, asymmetry))
+assert np.allclose(K, K.T)
+assert np.allclose(kernelGrid(X, Y), kernelGrid(Y, X).T)
+# (samples along an aircraft track, strongly correlated)
+t = np.linspace(0.0, 300.0, 600)
+track = np.stack([t, 1000.0 + 400.0*np.cos(t / 20.0), 1000.0 + 400.0*np.sin(t / 20.0),
+                  1000.0 + 20.0*np.sin(t / 7.0)], axis=-1)
+C = kernelGrid.correlation(track)
+assert np.allclose(C, C.T)
+eigenValues = np.linalg.eigvalsh(C)
+print("Min eigenvalue of the correlation : {:.3e}".format(eigenValues.min()))
+assert eigenValues.min() > -1.0e-8*eigenValues.max()
+print("Normalized span (constant / grid) : {:.2f} / {:.2f}".format(
+      kernelConstant.normalized_span(), kernelGrid.normalized_span()))
+
+# Both selections of the query locations (k-d tree and bounding box) use the
+# kernel normalized space and span : every location selected by the k-d tree
+# is in the bounding box.
+gpr = GprPredictor('RCT', DatabaseView('RCT', NephelaeDataServer(), ['RCT']),
+                   kernelGrid)
+queries = np.random.uniform([0,0,0,900], [300,2000,2000,1100], (20000,4))
+kdSelected  = gpr.select_samples(track, np.zeros((len(track), 1)), queries)[2]
+boxSelected = gpr.select_locations_in_bounding_box(track, queries)
+print("Selected query locations (k-d tree / bounding box) : {} / {}".format(
+      len(kdSelected), len(boxSelected)))
+assert np.all(np.isin(kdSelected, boxSelected))
@@ -0,0 +1,73 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+sys.path.append('../')
+import numpy as np
+import time
+
+from nephelae.types   import Position, SensorSample
+from nephelae.mapping import WindObserverMap
+
+from helpers.helpers import *
+
+# Streaming wind estimation and rate-limited notifications of
+# WindObserverMap.
+
+class WindListener:
+    def __init__(self):
+        self.winds = []
+    def send_new_wind(self, wind):
+        self.winds.append(wind)
+
+nSamples = 20000
+t = 1000.0 + 0.1*np.arange(nSamples)
+trueWind = np.stack([5.0 + 0.5*np.sin(t / 300.0), np.full(nSamples, 1.0)], axis=-1)
+samples = [SensorSample(str(['UT','VT']), '7', ti, Position(ti, 0.0, 0.0, 1000.0),
+                        [w + np.random.normal(0.0, 0.5, 2)])
+           for ti, w in zip(t, trueWind)]
+
+for mode in ['window', 'exponential']:
+    windMap  = WindObserverMap('Wind', maxSamples=100, mode=mode,
+                               minNotifyPeriod=1.0, changeThreshold=0.05)
+    listener = WindListener()
+    windMap.add_wind_observer(listener)
+    t0 = time.time()
+    for sample in samples:
+        windMap.add_sample(sample)
+    t1 = time.time()
+    print(mode, ": {:.2f} us per sample, {} notifications for {} samples".format(
+          1.0e6*(t1 - t0) / nSamples, len(listener.winds), nSamples))
+    print("    estimate :", windMap.estimate, ", published :", windMap.get_wind(),
+          ", true :", trueWind[-1], ", variance :", windMap.get_wind_variance())
+
+windMap = WindObserverMap('Wind', maxSamples=100)
+for sample in samples[:1234]:
+    windMap.add_sample(sample)
+print("Window average error :", np.abs(windMap.estimate -
+      np.array([s.data[0] for s in samples[1134:1234]]).mean(axis=0)).max())
+
+# Default parameters reproduce the historical behaviour : the average of the
+# last maxSamples samples is published every maxSamples - minSamples samples.
+def legacy_publications(samples, maxSamples, minSamples):
+    published, windSamples = [], []
+    for sample in samples:
+        if not windSamples:
+            published.append(np.array(sample.data[0]))
+        windSamples.append(sample.data[0])
+        if len(windSamples) >= maxSamples:
+            published.append(np.array(windSamples).mean(axis=0))
+            windSamples[0:len(windSamples) - minSamples] = []
+    return published
+
+for maxSamples, minSamples in [(30, 5), (100, 99)]:
+    windMap  = WindObserverMap('Wind', maxSamples=maxSamples, minSamples=minSamples)
+    listener = WindListener()
+    windMap.add_wind_observer(listener)
+    for sample in samples[:3000]:
+        windMap.add_sample(sample)
+    expected = legacy_publications(samples[:3000], maxSamples, minSamples)
+    print("Legacy ({}, {}) : {} publications, expected {}".format(
+          maxSamples, minSamples, len(listener.winds), len(expected)))
+    assert len(listener.winds) == len(expected)
+    assert np.allclose(np.array(listener.winds), np.array(expected))
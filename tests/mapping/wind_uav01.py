@@ -0,0 +1,61 @@
+#! /usr/bin/python3
+
+import sys
+sys.path.append('../../')
+sys.path.append('../')
+import numpy as np
+import time
+
+from nephelae.types   import Bounds, Position, SensorSample
+from nephelae.mapping import WindMapUav
+
+from helpers.helpers import *
+
+# Estimation of a spatially varying wind field from simulated UAV wind
+# measurements.
+
+def true_wind(x, y, z):
+    return np.stack([5.0 + 2.0*np.sin(x / 700.0) + 1.0e-3*z,
+                     1.0 + 1.5*np.cos(y / 900.0)], axis=-1)
+
+gridBounds = [Bounds(0.0, 2000.0), Bounds(0.0, 2000.0), Bounds(500.0, 1500.0)]
+windMap = WindMapUav('Wind', gridBounds, (11,11,6),
+                     lengthScales=[400.0,400.0,300.0], variance=4.0,
+                     noiseVariance=0.25, timeScale=900.0)
+
+# Two UAVs flying lawnmower-like trajectories, 1 sample per second each.
+nSamples = 1200
+t = 1000.0 + np.arange(nSamples, dtype=float)
+tracks = [np.stack([1000.0 + 900.0*np.sin(t / 97.0),
+                    1000.0 + 900.0*np.sin(t / 61.0),
+                    900.0 + 300.0*np.sin(t / 211.0)], axis=-1),
+          np.stack([1000.0 + 900.0*np.cos(t / 83.0),
+                    1000.0 + 900.0*np.sin(t / 113.0),
+                    1100.0 + 300.0*np.cos(t / 173.0)], axis=-1)]
+
+noise = np.random.normal(0.0, 0.5, (2, nSamples, 2))
+t0 = time.time()
+for i in range(nSamples):
+    for uav, track in enumerate(tracks):
+        x, y, z = track[i]
+        windMap.add_sample(SensorSample(str(['UT','VT']), str(uav), t[i],
+            Position(t[i], x, y, z), [true_wind(x, y, z) + noise[uav,i]]))
+t1 = time.time()
+print("Update time : {:.3f} ms per sample ({} grid nodes)".format(
+      1000.0*(t1 - t0) / (2*nSamples), windMap.flatGrid.shape[0]))
+
+locations = np.random.uniform([2200,200,200,600], [2200,1800,1800,1400], (20000,4))
+t0 = time.time()
+estimated = windMap.at_locations(locations)
+t1 = time.time()
+print("at_locations on {} locations : {:.4f}s".format(len(locations), t1 - t0))
+
+expected = true_wind(locations[:,1], locations[:,2], locations[:,3])
+error = np.sqrt(np.mean((estimated - expected)**2, axis=0))
+constantError = np.sqrt(np.mean((windMap.get_wind() - expected)**2, axis=0))
+print("RMS error (u,v)               :", error)
+print("RMS error of the average wind :", constantError)
+print("Average wind :", windMap.get_wind(),
+      ", deviation :", windMap.get_wind_deviation())
+print("Estimation std (min/max) :", windMap.get_std(locations).min(),
+      windMap.get_std(locations).max())